@@ -1,11 +1,23 @@
 import { NextResponse } from 'next/server';
-import { promises as fs } from 'fs';
+import { promises as fs, createReadStream } from 'fs';
+import { Readable } from 'stream';
 import path from 'path';
 import { v4 as uuidv4 } from 'uuid';
-import AdmZip from 'adm-zip';
 import xml2js from 'xml2js';
-import { spawn } from 'child_process';
-import dbService from '@/lib/database.js';
+import dbService, { formatLogEntry } from '@/lib/database.js';
+import jobQueue from '@/lib/job-queue.js';
+import jobEvents from '@/lib/job-events.js';
+import artifactCache from '@/lib/artifact-cache.js';
+import { receiveApkUpload, UploadError } from '@/lib/multipart-upload.js';
+import { ApkArchive, rewriteApk } from '@/lib/apk-archive.js';
+import apkSigner, { isJarSignatureEntry } from '@/lib/apk-signer.js';
+import { isBinaryXml, setElementAttributes, compileXml } from '@/lib/binary-xml.js';
+import { transformTextManifest, binaryAttributeEdits } from '@/lib/manifest-transformer.js';
+import { addResources } from '@/lib/resource-table.js';
+import { Pipeline } from '@/lib/pipeline.js';
+import metrics from '@/lib/metrics.js';
+import janitor from '@/lib/janitor.js';
+import readiness from '@/lib/readiness.js';
 
 // Ensure temp directories exist
 const tempDir = path.join(process.cwd(), 'temp');
@@ -27,6 +39,16 @@ async function ensureTempDirs() {
 // Initialize temp directories
 ensureTempDirs();
 
+// Load the debug signing key once, generating it on first start
+apkSigner.loadKey(keystoreDir).catch((error) => {
+  console.error('Error loading debug signing key:', error);
+});
+
+// Bump whenever the conversion output changes so cached artifacts are not reused
+const PIPELINE_VERSION = '5';
+
+const MAX_UPLOAD_BYTES = 100 * 1024 * 1024; // 100MB limit
+
 async function updateJobProgress(jobId, progress, currentStep, logs = []) {
   await dbService.updateJobProgress(jobId, progress, currentStep, logs);
 }
@@ -35,125 +57,6 @@ async function addJobLog(jobId, message) {
   await dbService.addJobLog(jobId, message);
 }
 
-async function executeCommand(command, args, workingDir = null) {
-  return new Promise((resolve, reject) => {
-    const child = spawn(command, args, { 
-      cwd: workingDir,
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    child.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
-    
-    child.stderr.on('data', (data) => {
-      stderr += data.toString();
-    });
-    
-    child.on('close', (code) => {
-      if (code === 0) {
-        resolve({ stdout, stderr });
-      } else {
-        reject(new Error(`Command failed with code ${code}: ${stderr}`));
-      }
-    });
-    
-    child.on('error', (error) => {
-      reject(error);
-    });
-  });
-}
-
-async function createDebugKeystore(keystorePath, password = 'debugpass') {
-  try {
-    // Check if keystore already exists
-    try {
-      await fs.access(keystorePath);
-      return true; // Keystore exists
-    } catch (error) {
-      // Keystore doesn't exist, create it
-    }
-    
-    const keytoolArgs = [
-      '-genkeypair',
-      '-keystore', keystorePath,
-      '-alias', 'debugkey',
-      '-storepass', password,
-      '-keypass', password,
-      '-keyalg', 'RSA',
-      '-keysize', '2048',
-      '-validity', '365',
-      '-dname', 'CN=Debug, OU=Debug, O=Debug, L=Debug, ST=Debug, C=US'
-    ];
-    
-    await executeCommand('keytool', keytoolArgs);
-    return true;
-  } catch (error) {
-    console.error('Error creating debug keystore:', error);
-    return false;
-  }
-}
-
-async function signApk(apkPath, keystorePath, password = 'debugpass') {
-  try {
-    const jarsignerArgs = [
-      '-verbose',
-      '-keystore', keystorePath,
-      '-storepass', password,
-      '-keypass', password,
-      apkPath,
-      'debugkey'
-    ];
-    
-    await executeCommand('jarsigner', jarsignerArgs);
-    return true;
-  } catch (error) {
-    console.error('Error signing APK:', error);
-    return false;
-  }
-}
-
-async function alignApk(inputApkPath, outputApkPath, jobId) {
-  try {
-    await addJobLog(jobId, 'Aligning APK for optimal installation performance...');
-    
-    const zipalignArgs = [
-      '-f', // force overwrite
-      '-v', // verbose output
-      '4',  // 4-byte alignment (required for Android)
-      inputApkPath,
-      outputApkPath
-    ];
-    
-    const result = await executeCommand('zipalign', zipalignArgs);
-    await addJobLog(jobId, 'APK alignment completed successfully');
-    
-    // Verify alignment
-    const verifyArgs = ['-c', '-v', '4', outputApkPath];
-    await executeCommand('zipalign', verifyArgs);
-    await addJobLog(jobId, 'APK alignment verification passed');
-    
-    return true;
-  } catch (error) {
-    await addJobLog(jobId, `Error aligning APK: ${error.message}`);
-    return false;
-  }
-}
-
-async function verifyApkSignature(apkPath) {
-  try {
-    const jarsignerArgs = ['-verify', '-verbose', apkPath];
-    const result = await executeCommand('jarsigner', jarsignerArgs);
-    return result.stdout.includes('jar verified');
-  } catch (error) {
-    console.error('Error verifying APK signature:', error);
-    return false;
-  }
-}
-
 function createNetworkSecurityConfig() {
   return `<?xml version="1.0" encoding="utf-8"?>
 <network-security-config>
@@ -177,187 +80,164 @@ function createNetworkSecurityConfig() {
 </network-security-config>`;
 }
 
-function createDebugPermissions() {
-  return `<uses-permission android:name="android.permission.INTERNET" />
-<uses-permission android:name="android.permission.ACCESS_NETWORK_STATE" />
-<uses-permission android:name="android.permission.WRITE_EXTERNAL_STORAGE" />
-<uses-permission android:name="android.permission.READ_EXTERNAL_STORAGE" />`;
+// Debug values with unique names to avoid conflicts with the app's own resources
+const DEBUG_VALUES = [
+  { type: 'bool', name: 'apk_debug_mode_enabled', kind: 'bool', value: true },
+  { type: 'string', name: 'apk_debug_network_config', kind: 'string', value: 'network_security_config' },
+  { type: 'string', name: 'apk_debug_info', kind: 'string', value: 'Debug mode enabled by APK Debug Converter' },
+  { type: 'string', name: 'apk_debug_version', kind: 'string', value: '1.0' }
+];
+
+// Compiled APKs get the config under its own name so an app's existing config file is not overwritten
+const DEBUG_NETWORK_CONFIG_NAME = 'apk_debug_network_security_config';
+const DEBUG_NETWORK_CONFIG_PATH = `res/xml/${DEBUG_NETWORK_CONFIG_NAME}.xml`;
+
+function createDebugValuesXml() {
+  const values = DEBUG_VALUES.map(value => `    <${value.type} name="${value.name}">${value.value}</${value.type}>`);
+  return `<?xml version="1.0" encoding="utf-8"?>
+<resources>
+${values.join('\n')}
+</resources>`;
 }
 
-async function improveManifestHandling(manifestPath, jobId) {
+// Returns the patched manifest as a Buffer, or null when it should be copied unchanged
+async function improveManifestHandling(manifestBuffer, jobId, networkSecurityConfigId = null) {
   try {
     await addJobLog(jobId, 'Analyzing AndroidManifest.xml structure...');
     
-    const manifestContent = await fs.readFile(manifestPath, 'utf8');
+    const manifestContent = manifestBuffer.toString('utf8');
     
     // Check if it's a text-based manifest (not binary)
     if (manifestContent.includes('<?xml') && manifestContent.includes('<manifest')) {
       await addJobLog(jobId, 'Found text-based AndroidManifest.xml - applying safe modifications');
       
-      let modifiedManifest = manifestContent;
-      let modificationsCount = 0;
-      
-      // 1. Add debug permissions if not present
-      if (!modifiedManifest.includes('android.permission.INTERNET')) {
-        const permissionsToAdd = createDebugPermissions();
-        modifiedManifest = modifiedManifest.replace(
-          /<manifest([^>]*)>/,
-          `<manifest$1>\n${permissionsToAdd}`
-        );
-        modificationsCount++;
-      }
-      
-      // 2. Add debuggable attribute to application tag
-      if (!modifiedManifest.includes('android:debuggable')) {
-        modifiedManifest = modifiedManifest.replace(
-          /<application([^>]*)>/,
-          '<application$1 android:debuggable="true">'
-        );
-        modificationsCount++;
-      }
-      
-      // 3. Add cleartext traffic permission
-      if (!modifiedManifest.includes('android:usesCleartextTraffic')) {
-        modifiedManifest = modifiedManifest.replace(
-          /<application([^>]*)>/,
-          '<application$1 android:usesCleartextTraffic="true">'
-        );
-        modificationsCount++;
-      }
-      
-      // 4. Add network security config reference
-      if (!modifiedManifest.includes('android:networkSecurityConfig')) {
-        modifiedManifest = modifiedManifest.replace(
-          /<application([^>]*)>/,
-          '<application$1 android:networkSecurityConfig="@xml/network_security_config">'
-        );
-        modificationsCount++;
-      }
+      // Single tokenizing pass driven by the shared edit table
+      const { text, applied } = transformTextManifest(manifestContent, {
+        references: { 'xml/network_security_config': '@xml/network_security_config' }
+      });
       
-      // 5. Add testOnly attribute for debug builds
-      if (!modifiedManifest.includes('android:testOnly')) {
-        modifiedManifest = modifiedManifest.replace(
-          /<application([^>]*)>/,
-          '<application$1 android:testOnly="true">'
-        );
-        modificationsCount++;
+      if (applied.length > 0) {
+        await addJobLog(jobId, `Applied ${applied.length} debug modifications to AndroidManifest.xml`);
+        return Buffer.from(text, 'utf8');
+      } else {
+        await addJobLog(jobId, 'AndroidManifest.xml already contains all debug attributes');
+        return null;
       }
+    } else if (isBinaryXml(manifestBuffer)) {
+      await addJobLog(jobId, 'Found binary AndroidManifest.xml - patching <application> attributes');
       
-      // Clean up any duplicate attributes that might have been created
-      modifiedManifest = modifiedManifest.replace(/android:debuggable="true"\s*android:debuggable="true"/g, 'android:debuggable="true"');
-      modifiedManifest = modifiedManifest.replace(/android:usesCleartextTraffic="true"\s*android:usesCleartextTraffic="true"/g, 'android:usesCleartextTraffic="true"');
-      modifiedManifest = modifiedManifest.replace(/android:networkSecurityConfig="@xml\/network_security_config"\s*android:networkSecurityConfig="@xml\/network_security_config"/g, 'android:networkSecurityConfig="@xml/network_security_config"');
-      modifiedManifest = modifiedManifest.replace(/android:testOnly="true"\s*android:testOnly="true"/g, 'android:testOnly="true"');
-      
-      if (modificationsCount > 0) {
-        await fs.writeFile(manifestPath, modifiedManifest);
-        await addJobLog(jobId, `Applied ${modificationsCount} debug modifications to AndroidManifest.xml`);
-        return true;
-      } else {
+      const edits = binaryAttributeEdits('application', {
+        resourceIds: { 'xml/network_security_config': networkSecurityConfigId }
+      });
+      const { buffer, applied } = setElementAttributes(manifestBuffer, 'application', edits);
+      if (!buffer) {
         await addJobLog(jobId, 'AndroidManifest.xml already contains all debug attributes');
-        return true;
+        return null;
       }
+      
+      await addJobLog(jobId, `Applied ${applied.length} debug modifications to binary AndroidManifest.xml (${applied.join(', ')})`);
+      return buffer;
     } else {
-      await addJobLog(jobId, 'AndroidManifest.xml is in binary format - preserving as-is to avoid corruption');
-      return true;
+      await addJobLog(jobId, 'AndroidManifest.xml format not recognized - preserving as-is to avoid corruption');
+      return null;
     }
   } catch (error) {
     await addJobLog(jobId, `Error processing AndroidManifest.xml: ${error.message}`);
-    return false;
+    return null;
+  }
+}
+
+// Adds the compiled network security config and debug values to resources.arsc.
+// Returns the config's resource ID, or null if the table could not be patched.
+async function addCompiledDebugResources(archive, replacedEntries, addedEntries, jobId) {
+  try {
+    const { buffer, ids } = addResources(await archive.read('resources.arsc'), [
+      { type: 'xml', name: DEBUG_NETWORK_CONFIG_NAME, kind: 'string', value: DEBUG_NETWORK_CONFIG_PATH },
+      ...DEBUG_VALUES.map(value => (
+        value.name === 'apk_debug_network_config' ? { ...value, value: DEBUG_NETWORK_CONFIG_NAME } : value
+      ))
+    ]);
+    
+    replacedEntries.set('resources.arsc', buffer);
+    addedEntries.set(DEBUG_NETWORK_CONFIG_PATH, compileXml(createNetworkSecurityConfig()));
+    
+    const networkSecurityConfigId = ids.get(`xml/${DEBUG_NETWORK_CONFIG_NAME}`);
+    await addJobLog(jobId, `Added compiled network security config to resources.arsc (@xml/${DEBUG_NETWORK_CONFIG_NAME} = 0x${networkSecurityConfigId.toString(16)})`);
+    await addJobLog(jobId, `Added ${DEBUG_VALUES.length} debug values to resources.arsc for runtime detection`);
+    return networkSecurityConfigId;
+  } catch (error) {
+    await addJobLog(jobId, `Error patching resources.arsc, network security config not added: ${error.message}`);
+    return null;
   }
 }
 
-async function createOptimizedZip(sourceDir, outputPath, jobId) {
+async function createOptimizedZip(archive, outputPath, changes, jobId) {
   try {
     await addJobLog(jobId, 'Creating optimized APK structure...');
     
-    const zip = new AdmZip();
-    
-    // Add files with proper compression settings
-    const addDirectoryToZip = async (dirPath, zipPath = '') => {
-      const items = await fs.readdir(dirPath);
-      
-      for (const item of items) {
-        const itemPath = path.join(dirPath, item);
-        const stats = await fs.stat(itemPath);
-        const relativePath = zipPath ? path.join(zipPath, item) : item;
-        
-        if (stats.isDirectory()) {
-          await addDirectoryToZip(itemPath, relativePath);
-        } else {
-          const content = await fs.readFile(itemPath);
-          // Use forward slashes for ZIP entries (cross-platform compatibility)
-          const zipEntryPath = relativePath.replace(/\\/g, '/');
-          
-          // Set compression level based on file type
-          const entry = zip.addFile(zipEntryPath, content);
-          if (item.endsWith('.dex') || item.endsWith('.so') || item.endsWith('.png')) {
-            // Don't compress already compressed files
-            entry.header.method = 0; // Store method (no compression)
-          } else {
-            // Compress other files
-            entry.header.method = 8; // Deflate method
-          }
-        }
-      }
-    };
-    
-    await addDirectoryToZip(sourceDir);
-    
-    // Write the optimized APK
-    zip.writeZip(outputPath);
+    // Untouched entries are copied as raw compressed bytes straight from the input
+    const stats = await rewriteApk(archive, outputPath, changes);
     
+    await addJobLog(jobId, `Copied ${stats.copied} entries without recompression, rewrote ${stats.rewritten}, added ${stats.added}`);
     await addJobLog(jobId, 'APK structure optimized successfully');
-    return true;
+    return stats;
   } catch (error) {
     await addJobLog(jobId, `Error creating optimized ZIP: ${error.message}`);
-    return false;
+    return null;
   }
 }
 
-async function processApkToDebugMode(apkPath, outputPath, jobId) {
-  try {
-    await updateJobProgress(jobId, 5, 'Initializing APK Processing...');
-    await addJobLog(jobId, 'Starting comprehensive APK debug conversion');
-    
-    // Create debug keystore
-    const keystorePath = path.join(keystoreDir, 'debug.keystore');
-    await updateJobProgress(jobId, 8, 'Creating Debug Keystore...');
-    const keystoreCreated = await createDebugKeystore(keystorePath);
-    if (!keystoreCreated) {
-      throw new Error('Failed to create debug keystore');
-    }
-    await addJobLog(jobId, 'Debug keystore created successfully');
-    
-    await updateJobProgress(jobId, 10, 'Validating APK Structure...');
+// Conversion stages. Each declares the context keys it reads and writes; the
+// pipeline starts a stage once its inputs exist, so independent stages (key
+// loading and validation, signature stripping and extraction) overlap.
+const debugPipeline = new Pipeline();
+
+debugPipeline.register({
+  name: 'load-key',
+  outputs: ['signingKeyLoaded'],
+  progress: 8,
+  label: 'Loading Debug Signing Key...',
+  async run({ jobId }) {
+    // Debug signing key is loaded once per process and reused for every job
+    await apkSigner.loadKey(keystoreDir);
+    await addJobLog(jobId, 'Debug signing key loaded');
+    return { signingKeyLoaded: true };
+  }
+});
+
+debugPipeline.register({
+  name: 'validate',
+  inputs: ['apkPath'],
+  outputs: ['archive'],
+  progress: 10,
+  label: 'Validating APK Structure...',
+  async run({ apkPath, jobId }, meter) {
     await addJobLog(jobId, 'Starting APK validation');
     
-    // Read and validate APK
-    const apkBuffer = await fs.readFile(apkPath);
-    const zip = new AdmZip(apkBuffer);
-    const entries = zip.getEntries();
+    // Read and validate APK (only the central directory is loaded)
+    const archive = await ApkArchive.open(apkPath);
+    meter.bytes += archive.fileSize - archive.centralDirectoryOffset;
     
     // Check if it's a valid APK
-    const hasManifest = entries.some(entry => entry.entryName === 'AndroidManifest.xml');
-    if (!hasManifest) {
+    if (archive.getEntry('AndroidManifest.xml') === null) {
+      await archive.close();
       throw new Error('Invalid APK: AndroidManifest.xml not found');
     }
-    
-    await updateJobProgress(jobId, 15, 'Extracting APK Contents...');
-    await addJobLog(jobId, 'Extracting APK contents');
-    
-    // Create working directory
-    const workDir = path.join(tempDir, `work_${jobId}`);
-    await fs.mkdir(workDir, { recursive: true });
-    
-    // Extract APK
-    zip.extractAllTo(workDir, true);
-    
-    await updateJobProgress(jobId, 20, 'Analyzing APK Structure...');
+    return { archive };
+  }
+});
+
+debugPipeline.register({
+  name: 'extract',
+  inputs: ['archive'],
+  outputs: ['manifestBuffer', 'hasResources'],
+  progress: 20,
+  label: 'Analyzing APK Structure...',
+  async run({ archive, jobId }, meter) {
     await addJobLog(jobId, 'Analyzing original APK structure');
     
     // Check what files exist in the original APK
-    const originalFiles = entries.map(entry => entry.entryName);
+    const originalFiles = archive.entries.map(entry => entry.name);
     await addJobLog(jobId, `Found ${originalFiles.length} files in original APK`);
     
     // Log important components
@@ -369,117 +249,179 @@ async function processApkToDebugMode(apkPath, outputPath, jobId) {
     if (hasResources) await addJobLog(jobId, 'Found resources.arsc (compiled resources)');
     if (hasNativeLibs) await addJobLog(jobId, 'Found native libraries');
     
-    await updateJobProgress(jobId, 25, 'Removing Original Signatures...');
+    // Only the manifest is inflated; everything else is copied raw when packing
+    const manifestBuffer = await archive.read('AndroidManifest.xml');
+    meter.bytes += manifestBuffer.length;
+    return { manifestBuffer, hasResources };
+  }
+});
+
+debugPipeline.register({
+  name: 'strip-signatures',
+  inputs: ['archive'],
+  outputs: ['dropEntry'],
+  progress: 25,
+  label: 'Removing Original Signatures...',
+  async run({ archive, jobId }) {
     await addJobLog(jobId, 'Removing original APK signatures');
     
-    // Remove META-INF directory to avoid signature conflicts
-    const metaInfPath = path.join(workDir, 'META-INF');
-    try {
-      await fs.rm(metaInfPath, { recursive: true, force: true });
-      await addJobLog(jobId, 'Original signatures removed successfully');
-    } catch (error) {
+    // Original signature files are dropped while packing to avoid signature conflicts
+    const signatureEntries = archive.entries.filter(entry => isJarSignatureEntry(entry.name));
+    if (signatureEntries.length > 0) {
+      await addJobLog(jobId, `Original signatures removed successfully (${signatureEntries.length} files)`);
+    } else {
       await addJobLog(jobId, 'No original signatures to remove');
     }
-    
-    await updateJobProgress(jobId, 30, 'Processing AndroidManifest.xml...');
-    await addJobLog(jobId, 'Processing AndroidManifest.xml with improved handling');
-    
-    // Process AndroidManifest.xml with improved handling
-    const manifestPath = path.join(workDir, 'AndroidManifest.xml');
-    const manifestProcessed = await improveManifestHandling(manifestPath, jobId);
-    if (!manifestProcessed) {
-      await addJobLog(jobId, 'Warning: AndroidManifest.xml processing had issues, continuing...');
-    }
-    
-    await updateJobProgress(jobId, 40, 'Adding Debug Resources...');
+    return { dropEntry: isJarSignatureEntry };
+  }
+});
+
+debugPipeline.register({
+  name: 'resources',
+  inputs: ['archive', 'manifestBuffer', 'hasResources'],
+  outputs: ['replacedEntries', 'addedEntries', 'networkSecurityConfigId'],
+  progress: 30,
+  label: 'Adding Debug Resources...',
+  async run({ archive, manifestBuffer, hasResources, jobId }, meter) {
     await addJobLog(jobId, 'Adding debug-specific resources');
     
-    // Create res/xml directory for network security config
-    const resXmlDir = path.join(workDir, 'res', 'xml');
-    await fs.mkdir(resXmlDir, { recursive: true });
-    
-    // Add network security config for debug mode
-    const networkConfigPath = path.join(resXmlDir, 'network_security_config.xml');
-    await fs.writeFile(networkConfigPath, createNetworkSecurityConfig());
-    await addJobLog(jobId, 'Added network security config for debugging');
-    
-    // Create debug values that won't interfere with existing resources
-    const resValuesDir = path.join(workDir, 'res', 'values');
-    await fs.mkdir(resValuesDir, { recursive: true });
-    
-    // Create debug values with unique names to avoid conflicts
-    const debugValuesXml = `<?xml version="1.0" encoding="utf-8"?>
-<resources>
-    <bool name="apk_debug_mode_enabled">true</bool>
-    <string name="apk_debug_network_config">network_security_config</string>
-    <string name="apk_debug_info">Debug mode enabled by APK Debug Converter</string>
-    <string name="apk_debug_version">1.0</string>
-</resources>`;
-    
-    const debugValuesPath = path.join(resValuesDir, 'apk_debug_values.xml');
-    await fs.writeFile(debugValuesPath, debugValuesXml);
-    await addJobLog(jobId, 'Added debug values for runtime detection');
-    
-    await updateJobProgress(jobId, 55, 'Creating Optimized APK Structure...');
-    await addJobLog(jobId, 'Building optimized APK structure');
-    
-    // Create optimized APK with proper ZIP structure
-    const unalignedApkPath = path.join(outputDir, `unaligned_${path.basename(apkPath)}`);
-    const zipCreated = await createOptimizedZip(workDir, unalignedApkPath, jobId);
-    if (!zipCreated) {
-      throw new Error('Failed to create optimized APK structure');
+    const replacedEntries = new Map();
+    const addedEntries = new Map();
+    let networkSecurityConfigId = null;
+    if (isBinaryXml(manifestBuffer) && hasResources) {
+      // Compiled APK: resources only resolve through resources.arsc
+      networkSecurityConfigId = await addCompiledDebugResources(archive, replacedEntries, addedEntries, jobId);
+    } else {
+      // Add network security config for debug mode
+      addedEntries.set('res/xml/network_security_config.xml', Buffer.from(createNetworkSecurityConfig()));
+      await addJobLog(jobId, 'Added network security config for debugging');
+      
+      addedEntries.set('res/values/apk_debug_values.xml', Buffer.from(createDebugValuesXml()));
+      await addJobLog(jobId, 'Added debug values for runtime detection');
     }
     
-    await updateJobProgress(jobId, 65, 'Aligning APK for Installation...');
-    await addJobLog(jobId, 'Performing APK alignment (zipalign) for Android compatibility');
-    
-    // Align APK before signing (CRITICAL for Android installation)
-    const tempApkPath = path.join(outputDir, `temp_${path.basename(apkPath)}`);
-    const alignSuccess = await alignApk(unalignedApkPath, tempApkPath, jobId);
-    if (!alignSuccess) {
-      throw new Error('Failed to align APK - this is required for Android installation');
+    for (const buffer of [...replacedEntries.values(), ...addedEntries.values()]) {
+      meter.bytes += buffer.length;
     }
+    return { replacedEntries, addedEntries, networkSecurityConfigId };
+  }
+});
+
+debugPipeline.register({
+  name: 'manifest',
+  // Runs after resources: a compiled manifest references the new config by resource ID
+  inputs: ['manifestBuffer', 'replacedEntries', 'networkSecurityConfigId'],
+  outputs: ['manifestPatched'],
+  progress: 40,
+  label: 'Processing AndroidManifest.xml...',
+  async run({ manifestBuffer, replacedEntries, networkSecurityConfigId, jobId }, meter) {
+    await addJobLog(jobId, 'Processing AndroidManifest.xml with improved handling');
     
-    // Clean up unaligned APK
-    await fs.rm(unalignedApkPath, { force: true });
-    
-    await updateJobProgress(jobId, 75, 'Signing APK with Debug Certificate...');
-    await addJobLog(jobId, 'Signing aligned APK with debug certificate');
-    
-    // Sign the APK with debug keystore
-    const signSuccess = await signApk(tempApkPath, keystorePath);
-    if (!signSuccess) {
-      throw new Error('Failed to sign APK with debug certificate');
+    meter.bytes += manifestBuffer.length;
+    const modifiedManifest = await improveManifestHandling(manifestBuffer, jobId, networkSecurityConfigId);
+    if (modifiedManifest) {
+      replacedEntries.set('AndroidManifest.xml', modifiedManifest);
     }
-    await addJobLog(jobId, 'APK signed successfully with debug certificate');
-    
-    await updateJobProgress(jobId, 88, 'Verifying APK Signature...');
-    await addJobLog(jobId, 'Verifying APK signature');
+    return { manifestPatched: modifiedManifest !== null };
+  }
+});
+
+debugPipeline.register({
+  name: 'pack',
+  inputs: ['archive', 'dropEntry', 'replacedEntries', 'addedEntries', 'manifestPatched'],
+  outputs: ['unsignedApkPath'],
+  progress: 55,
+  label: 'Creating Optimized APK Structure...',
+  async run({ archive, apkPath, outputPath, dropEntry, replacedEntries, addedEntries, jobId }, meter) {
+    await addJobLog(jobId, 'Building optimized APK structure');
     
-    // Verify the APK signature
-    const isVerified = await verifyApkSignature(tempApkPath);
-    if (!isVerified) {
+    // Stream the APK into its new structure, copying untouched entries verbatim;
+    // stored entries are aligned as they are written, so no zipalign pass is needed
+    const unsignedApkPath = path.join(outputPath, `unsigned_${path.basename(apkPath)}`);
+    const stats = await createOptimizedZip(archive, unsignedApkPath, {
+      drop: dropEntry,
+      replace: replacedEntries,
+      add: addedEntries
+    }, jobId);
+    if (!stats) {
+      throw new Error('Failed to create optimized APK structure');
+    }
+    meter.bytes += stats.bytesWritten;
+    return { unsignedApkPath };
+  }
+});
+
+debugPipeline.register({
+  name: 'sign',
+  inputs: ['unsignedApkPath', 'signingKeyLoaded'],
+  outputs: ['signedApkPath', 'verified'],
+  progress: 65,
+  label: 'Signing APK with Debug Certificate...',
+  async run({ unsignedApkPath, apkPath, outputPath, jobId }, meter) {
+    await addJobLog(jobId, 'Adding v1 (JAR) signature with debug certificate');
+    
+    const signedApkPath = path.join(outputPath, `temp_${path.basename(apkPath)}`);
+    const jarSignature = await apkSigner.signJar(unsignedApkPath, signedApkPath);
+    await fs.rm(unsignedApkPath, { force: true });
+    await addJobLog(jobId, `v1 signature added (${jarSignature.entriesSigned} entries digested)`);
+    
+    await addJobLog(jobId, 'Adding APK Signature Scheme v2 and v3 signing block');
+    
+    // The signing block covers the whole file, so nothing may touch the APK after this
+    const verified = await apkSigner.signApk(signedApkPath);
+    if (!verified) {
       await addJobLog(jobId, 'Warning: APK signature verification failed, but continuing...');
     } else {
-      await addJobLog(jobId, 'APK signature verified successfully');
+      await addJobLog(jobId, 'APK signed and verified with v1, v2 and v3 schemes');
     }
     
-    await updateJobProgress(jobId, 95, 'Finalizing Debug APK...');
+    // v1 writes the archive once; v2/v3 digest it once more
+    meter.bytes += jarSignature.bytesWritten * 2;
+    return { signedApkPath, verified };
+  }
+});
+
+debugPipeline.register({
+  name: 'verify',
+  inputs: ['signedApkPath'],
+  outputs: ['aligned'],
+  progress: 88,
+  label: 'Verifying APK Alignment...',
+  async run({ signedApkPath, jobId }, meter) {
+    // Alignment check (CRITICAL for Android installation) reads local headers only
+    const signedArchive = await ApkArchive.open(signedApkPath);
+    meter.bytes += signedArchive.fileSize - signedArchive.centralDirectoryOffset;
+    const misalignedEntries = await signedArchive.findMisalignedEntries().finally(() => signedArchive.close());
+    if (misalignedEntries.length > 0) {
+      throw new Error(`APK alignment check failed for ${misalignedEntries.length} entries (${misalignedEntries[0]}, ...)`);
+    }
+    await addJobLog(jobId, 'APK alignment verification passed');
+    return { aligned: true };
+  }
+});
+
+debugPipeline.register({
+  name: 'finalize',
+  inputs: ['signedApkPath', 'verified', 'aligned'],
+  outputs: ['result'],
+  progress: 95,
+  label: 'Finalizing Debug APK...',
+  async run({ signedApkPath, apkPath, outputPath, verified, aligned, jobId }) {
     await addJobLog(jobId, 'Creating final debug APK ready for installation');
     
     // Move to final output location with better error handling
-    const finalApkPath = path.join(outputDir, `debug_${path.basename(apkPath)}`);
+    const finalApkPath = path.join(outputPath, `debug_${path.basename(apkPath)}`);
     try {
       // Remove existing debug APK if it exists
       await fs.rm(finalApkPath, { force: true });
       // Move temp APK to final location
-      await fs.rename(tempApkPath, finalApkPath);
+      await fs.rename(signedApkPath, finalApkPath);
       await addJobLog(jobId, `Debug APK moved to final location: ${path.basename(finalApkPath)}`);
     } catch (renameError) {
       await addJobLog(jobId, `Error moving file, copying instead: ${renameError.message}`);
       // If rename fails, copy the file
-      await fs.copyFile(tempApkPath, finalApkPath);
-      await fs.rm(tempApkPath, { force: true });
+      await fs.copyFile(signedApkPath, finalApkPath);
+      await fs.rm(signedApkPath, { force: true });
       await addJobLog(jobId, `Debug APK copied to final location: ${path.basename(finalApkPath)}`);
     }
     
@@ -487,28 +429,322 @@ async function processApkToDebugMode(apkPath, outputPath, jobId) {
     const stats = await fs.stat(finalApkPath);
     const fileSizeKB = Math.round(stats.size / 1024);
     
+    return {
+      result: {
+        fileName: path.basename(finalApkPath),
+        size: `${fileSizeKB}KB`,
+        path: finalApkPath,
+        signed: true,
+        verified,
+        signatureSchemes: ['v1', 'v2', 'v3'],
+        aligned
+      }
+    };
+  }
+});
+
+async function processApkToDebugMode(apkPath, outputPath, jobId) {
+  const context = { apkPath, outputPath, jobId };
+  let progress = 0;
+  
+  try {
+    await updateJobProgress(jobId, 5, 'Initializing APK Processing...');
+    await addJobLog(jobId, 'Starting comprehensive APK debug conversion');
+    
+    await debugPipeline.run(context, {
+      // Concurrent stages may start out of order; progress only moves forward
+      onStageStart: async (stage) => {
+        progress = Math.max(progress, stage.progress);
+        await updateJobProgress(jobId, progress, stage.label);
+      },
+      onStageEnd: (stage, metric, stages) => {
+        metrics.observeStage(metric);
+        return dbService.recordJobStages(jobId, stages);
+      }
+    });
+    
+    const { result } = context;
     await updateJobProgress(jobId, 100, 'Debug APK Ready for Installation!');
-    await addJobLog(jobId, `Debug APK created successfully: ${fileSizeKB}KB`);
+    await addJobLog(jobId, `Debug APK created successfully: ${result.size}`);
     await addJobLog(jobId, 'APK is properly aligned, signed and ready for installation on Android devices');
     await addJobLog(jobId, 'Debug features enabled: debuggable=true, cleartext traffic, network security config');
     await addJobLog(jobId, 'Installation note: Enable "Install from Unknown Sources" on your Android device');
     
-    // Clean up work directory
-    await fs.rm(workDir, { recursive: true, force: true });
-    
-    return {
-      fileName: path.basename(finalApkPath),
-      size: `${fileSizeKB}KB`,
-      path: finalApkPath,
-      signed: true,
-      verified: isVerified,
-      aligned: true
-    };
+    return result;
     
   } catch (error) {
     await addJobLog(jobId, `Error: ${error.message}`);
     throw error;
+  } finally {
+    if (context.archive) {
+      await context.archive.close();
+    }
+  }
+}
+
+// Runs a job claimed from the queue inside one of the bounded worker slots
+async function runQueuedJob(job) {
+  try {
+    const result = await processApkToDebugMode(job.uploadPath, outputDir, job._id);
+    await dbService.completeJob(job._id, result);
+    if (job.inputHash) {
+      await artifactCache.store(job.inputHash, PIPELINE_VERSION, result);
+    }
+  } catch (error) {
+    console.error('Processing error:', error);
+    await dbService.errorJob(job._id, error.message);
+  }
+}
+
+jobQueue.setProcessor(runQueuedJob);
+
+// Removes expired and orphaned files from temp/ and enforces the disk quota
+janitor.start({ uploadsDir, outputDir });
+
+// Background probe behind /api/ready (queue depth, free disk, tools)
+readiness.start({ tempDir });
+
+const MAX_THROUGHPUT_MINUTES = 7 * 24 * 60;
+
+const STATUS_RETRY_AFTER_SECONDS = 5;
+
+// During a MongoDB outage a job created before it is only known by the changes
+// made since (a partial fallback entry, without status or file name), so its
+// status cannot be answered until the database is back
+function jobStatusUnavailable() {
+  return NextResponse.json(
+    { error: 'Job status temporarily unavailable, please retry' },
+    { status: 503, headers: { 'Retry-After': String(STATUS_RETRY_AFTER_SECONDS) } }
+  );
+}
+
+const STREAM_KEEPALIVE_MS = 15000;
+const STREAM_POLL_INTERVAL_MS = 2000;
+const STATUS_ORDER = { queued: 0, processing: 1, completed: 2, error: 2 };
+
+// Subscribes to a job's bus events before its snapshot is read. Events are
+// buffered until forward() attaches the stream, which replays the ones the
+// snapshot does not already reflect.
+function subscribeToJobEvents(jobId) {
+  const buffered = [];
+  let listener = null;
+  const unsubscribe = jobEvents.subscribe(jobId, (event) => {
+    if (listener) {
+      listener(event);
+    } else {
+      buffered.push(event);
+    }
+  });
+  
+  return {
+    unsubscribe,
+    forward(send, isNewer) {
+      buffered.splice(0).filter(isNewer).forEach(send);
+      listener = send;
+    }
+  };
+}
+
+// Whether a bus event published while the snapshot was read is newer than it.
+// Log lines are filtered by seq when sent; progress only moves forward.
+function isNewerThanSnapshot(event, job) {
+  if (event.type === 'status') {
+    return STATUS_ORDER[event.status] > STATUS_ORDER[job.status];
+  }
+  if (event.type === 'progress') {
+    return (event.progress || 0) >= (job.progress || 0);
+  }
+  return true;
+}
+
+// Server-Sent Events stream of a job's progress: a snapshot first, then only
+// progress/step changes and new log lines. Events come from the in-process bus
+// (subscribed before the snapshot was read); jobs owned by another instance are
+// followed through a MongoDB change stream, or by polling when change streams
+// are unavailable.
+function createStatusStream(jobId, job, subscription, request) {
+  const encoder = new TextEncoder();
+  let nextSeq = job.nextSeq;
+  let closed = false;
+  const cleanups = [];
+  
+  const close = (controller) => {
+    if (closed) return;
+    closed = true;
+    cleanups.forEach(cleanup => cleanup());
+    try {
+      controller.close();
+    } catch (error) {
+      // Stream already closed by the client
+    }
+  };
+  
+  return new ReadableStream({
+    start(controller) {
+      cleanups.push(subscription.unsubscribe);
+      
+      const write = (chunk) => {
+        if (!closed) {
+          controller.enqueue(encoder.encode(chunk));
+        }
+      };
+      
+      const send = (event) => {
+        if (event.type === 'log') {
+          // The bus and the change stream can both deliver the same entry
+          const entries = event.logs.filter(entry => entry.seq >= nextSeq);
+          if (entries.length === 0) return;
+          nextSeq = entries[entries.length - 1].seq + 1;
+          event = { type: 'log', logs: entries.map(formatLogEntry), nextSeq };
+        }
+        
+        write(`event: ${event.type}\ndata: ${JSON.stringify(event)}\n\n`);
+        
+        if (event.type === 'status' && (event.status === 'completed' || event.status === 'error')) {
+          close(controller);
+        }
+      };
+      
+      const pollForChanges = () => {
+        let last = job;
+        const timer = setInterval(async () => {
+          const current = await dbService.getJobStatus(jobId, { since: nextSeq });
+          if (!current || current.partial) return;
+          if (current.progress !== last.progress || current.currentStep !== last.currentStep) {
+            send({ type: 'progress', progress: current.progress, currentStep: current.currentStep });
+          }
+          send({ type: 'log', logs: current.logs });
+          if (current.status !== last.status) {
+            send({ type: 'status', status: current.status, result: current.result, error: current.error });
+          }
+          last = current;
+        }, STREAM_POLL_INTERVAL_MS);
+        cleanups.push(() => clearInterval(timer));
+      };
+      
+      send({
+        type: 'snapshot',
+        status: job.status,
+        progress: job.progress,
+        currentStep: job.currentStep,
+        logs: job.logs.map(formatLogEntry),
+        nextSeq: job.nextSeq,
+        result: job.result,
+        error: job.error
+      });
+      
+      if (job.status === 'completed' || job.status === 'error') {
+        close(controller);
+        return;
+      }
+      
+      subscription.forward(send, event => isNewerThanSnapshot(event, job));
+      if (closed) {
+        // A completed or error event arrived while the snapshot was read
+        return;
+      }
+      
+      if (!jobQueue.isRunning(jobId) && dbService.isConnected) {
+        const closeWatch = dbService.watchJob(jobId, send, () => {
+          if (!closed) pollForChanges();
+        });
+        if (closeWatch) {
+          cleanups.push(closeWatch);
+        } else {
+          pollForChanges();
+        }
+      }
+      
+      const keepalive = setInterval(() => write(': keepalive\n\n'), STREAM_KEEPALIVE_MS);
+      cleanups.push(() => clearInterval(keepalive));
+      
+      request.signal.addEventListener('abort', () => close(controller));
+    },
+    cancel() {
+      closed = true;
+      cleanups.forEach(cleanup => cleanup());
+    }
+  });
+}
+
+// Parses a single-range "bytes=start-end" header; returns null to serve the whole file
+// and { invalid: true } when the range cannot be satisfied
+function parseRange(rangeHeader, size) {
+  const match = /^bytes=(\d*)-(\d*)$/.exec((rangeHeader || '').trim());
+  if (!match || (match[1] === '' && match[2] === '')) {
+    return null;
+  }
+  
+  let start;
+  let end;
+  if (match[1] === '') {
+    // Suffix range: the last N bytes
+    start = Math.max(0, size - parseInt(match[2], 10));
+    end = size - 1;
+  } else {
+    start = parseInt(match[1], 10);
+    end = match[2] === '' ? size - 1 : Math.min(parseInt(match[2], 10), size - 1);
+  }
+  
+  if (start > end || start >= size) {
+    return { invalid: true };
   }
+  return { start, end };
+}
+
+// Streams an output APK with Range (206) and ETag/If-None-Match (304) support.
+// Behind nginx with DOWNLOAD_ACCEL_REDIRECT_PREFIX set, the transfer is handed to
+// nginx via X-Accel-Redirect so it can use sendfile.
+async function createDownloadResponse(request, filePath, fileName, stats) {
+  const etag = (await artifactCache.getETag(fileName)) || `W/"${stats.size.toString(16)}-${Math.floor(stats.mtimeMs).toString(16)}"`;
+  const headers = {
+    'Content-Type': 'application/vnd.android.package-archive',
+    'Content-Disposition': `attachment; filename="${fileName}"`,
+    'Accept-Ranges': 'bytes',
+    'ETag': etag,
+    'Last-Modified': stats.mtime.toUTCString(),
+    'Cache-Control': 'private, max-age=0, must-revalidate'
+  };
+  
+  const ifNoneMatch = request.headers.get('if-none-match');
+  if (ifNoneMatch && ifNoneMatch.split(',').some(tag => tag.trim() === etag || tag.trim() === '*')) {
+    return new Response(null, { status: 304, headers });
+  }
+  
+  const accelPrefix = process.env.DOWNLOAD_ACCEL_REDIRECT_PREFIX;
+  if (accelPrefix) {
+    return new Response(null, {
+      headers: { ...headers, 'X-Accel-Redirect': `${accelPrefix.replace(/\/$/, '')}/${encodeURIComponent(fileName)}` }
+    });
+  }
+  
+  // If-Range: only honour the range when the client's copy is still current
+  const ifRange = request.headers.get('if-range');
+  const range = !ifRange || ifRange === etag ? parseRange(request.headers.get('range'), stats.size) : null;
+  
+  if (range && range.invalid) {
+    return new Response(null, {
+      status: 416,
+      headers: { ...headers, 'Content-Range': `bytes */${stats.size}` }
+    });
+  }
+  
+  if (range) {
+    const body = Readable.toWeb(createReadStream(filePath, { start: range.start, end: range.end }));
+    return new Response(body, {
+      status: 206,
+      headers: {
+        ...headers,
+        'Content-Range': `bytes ${range.start}-${range.end}/${stats.size}`,
+        'Content-Length': (range.end - range.start + 1).toString()
+      }
+    });
+  }
+  
+  const body = Readable.toWeb(createReadStream(filePath));
+  return new Response(body, {
+    headers: { ...headers, 'Content-Length': stats.size.toString() }
+  });
 }
 
 export async function GET(request) {
@@ -523,24 +759,84 @@ export async function GET(request) {
   const endpoint = pathParts[0];
   
   try {
+    // Liveness: answered from process state only, never waits on MongoDB
+    if (endpoint === 'health') {
+      return NextResponse.json({
+        status: 'ok',
+        uptimeSeconds: Math.round(process.uptime()),
+        jobsInFlight: jobQueue.getStats().inFlight
+      });
+    }
+    
+    // Readiness: in-process state plus the cached probe; 503 asks orchestrators
+    // to route new work elsewhere without restarting the container
+    if (endpoint === 'ready') {
+      const status = readiness.getStatus();
+      return NextResponse.json(status, { status: status.ready ? 200 : 503 });
+    }
+    
+    // Handle status stream endpoint
+    if (endpoint === 'status' && pathParts[1] && pathParts[2] === 'stream') {
+      const jobId = pathParts[1];
+      // Events published while the snapshot is read are buffered, not lost
+      const subscription = subscribeToJobEvents(jobId);
+      let job;
+      try {
+        job = await dbService.getJobStatus(jobId);
+      } finally {
+        if (!job || job.partial) {
+          subscription.unsubscribe();
+        }
+      }
+      
+      if (!job) {
+        return NextResponse.json({ error: 'Job not found' }, { status: 404 });
+      }
+      if (job.partial) {
+        return jobStatusUnavailable();
+      }
+      
+      return new Response(createStatusStream(jobId, job, subscription, request), {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache, no-transform',
+          'Connection': 'keep-alive',
+          'X-Accel-Buffering': 'no'
+        }
+      });
+    }
+    
     // Handle status endpoint
     if (endpoint === 'status' && pathParts[1]) {
       const jobId = pathParts[1];
+      // ?since=<seq> returns only newer log entries; ?fields=progress skips logs entirely
+      const since = Math.max(0, parseInt(url.searchParams.get('since'), 10) || 0);
+      const includeLogs = url.searchParams.get('fields') !== 'progress';
       
       try {
-        const job = await dbService.getJob(jobId);
+        const job = await dbService.getJobStatus(jobId, { since, includeLogs });
         
         if (!job) {
           return NextResponse.json({ error: 'Job not found' }, { status: 404 });
         }
+        if (job.partial) {
+          return jobStatusUnavailable();
+        }
         
-        return NextResponse.json({
+        const response = {
           status: job.status,
           progress: job.progress,
           currentStep: job.currentStep,
-          logs: job.logs || [],
-          result: job.result
-        });
+          queuePosition: await jobQueue.getQueuePosition(job),
+          result: job.result,
+          error: job.error
+        };
+        if (includeLogs) {
+          response.logs = job.logs.map(formatLogEntry);
+          response.nextSeq = job.nextSeq;
+        }
+        
+        return NextResponse.json(response);
       } catch (error) {
         console.error('Error fetching job status:', error);
         return NextResponse.json({ error: 'Failed to fetch job status' }, { status: 500 });
@@ -549,19 +845,18 @@ export async function GET(request) {
     
     // Handle download endpoint
     if (endpoint === 'download' && pathParts[1]) {
-      const fileName = pathParts[1];
+      const fileName = decodeURIComponent(pathParts[1]);
+      
+      // Only plain file names inside the output directory can be downloaded
+      if (fileName !== path.basename(fileName)) {
+        return NextResponse.json({ error: 'File not found' }, { status: 404 });
+      }
+      
       const filePath = path.join(outputDir, fileName);
       
       try {
-        const fileBuffer = await fs.readFile(filePath);
-        
-        return new Response(fileBuffer, {
-          headers: {
-            'Content-Type': 'application/vnd.android.package-archive',
-            'Content-Disposition': `attachment; filename="${fileName}"`,
-            'Content-Length': fileBuffer.length.toString()
-          }
-        });
+        const stats = await fs.stat(filePath);
+        return await createDownloadResponse(request, filePath, fileName, stats);
       } catch (error) {
         return NextResponse.json({ error: 'File not found' }, { status: 404 });
       }
@@ -589,11 +884,31 @@ export async function GET(request) {
     if (endpoint === 'stats') {
       try {
         const stats = await dbService.getJobStats();
+        // ?minutes=<n> adds per-minute throughput from the rollups (at most a week)
+        const minutes = Math.min(MAX_THROUGHPUT_MINUTES, parseInt(url.searchParams.get('minutes'), 10) || 0);
+        if (minutes > 0) {
+          stats.throughput = await dbService.getJobThroughput(minutes);
+        }
         return NextResponse.json(stats);
       } catch (error) {
         return NextResponse.json({ error: 'Failed to get stats' }, { status: 500 });
       }
     }
+
+    // Handle metrics endpoint (Prometheus text format)
+    if (endpoint === 'metrics') {
+      try {
+        return new Response(await metrics.render(), {
+          headers: {
+            'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+            'Cache-Control': 'no-store'
+          }
+        });
+      } catch (error) {
+        console.error('Error rendering metrics:', error);
+        return NextResponse.json({ error: 'Failed to get metrics' }, { status: 500 });
+      }
+    }
     
     return NextResponse.json({ error: 'Invalid endpoint' }, { status: 400 });
   } catch (error) {
@@ -622,51 +937,57 @@ export async function POST(request) {
         return NextResponse.json({ error: 'No APK file provided' }, { status: 400 });
       }
       
-      const formData = await request.formData();
-      const apkFile = formData.get('apk');
-      
-      if (!apkFile) {
-        return NextResponse.json({ error: 'No APK file provided' }, { status: 400 });
-      }
+      // Generate job ID
+      const jobId = uuidv4();
       
-      // Validate file
-      if (!apkFile.name.endsWith('.apk')) {
-        return NextResponse.json({ error: 'Invalid file type' }, { status: 400 });
+      // Stream the upload to disk; size, type and hash are checked on the fly
+      const uploadPath = path.join(uploadsDir, `${jobId}.apk`);
+      let upload;
+      try {
+        upload = await receiveApkUpload(request, {
+          destination: uploadPath,
+          maxBytes: MAX_UPLOAD_BYTES
+        });
+      } catch (error) {
+        if (error instanceof UploadError) {
+          return NextResponse.json({ error: error.message }, { status: error.status });
+        }
+        throw error;
       }
+      const inputHash = upload.sha256;
       
-      if (apkFile.size > 100 * 1024 * 1024) { // 100MB limit
-        return NextResponse.json({ error: 'File too large' }, { status: 400 });
+      // Identical uploads reuse the existing conversion output
+      const cachedResult = await artifactCache.lookup(inputHash, PIPELINE_VERSION);
+      if (cachedResult) {
+        await fs.rm(uploadPath, { force: true });
+        await dbService.saveJob(jobId, {
+          status: 'completed',
+          progress: 100,
+          currentStep: 'Debug APK Ready for Installation!',
+          logs: [],
+          startTime: new Date().toISOString(),
+          fileName: upload.fileName,
+          fileSize: upload.size,
+          inputHash,
+          result: { ...cachedResult, cached: true },
+          completedAt: new Date()
+        });
+        await addJobLog(jobId, `Reused cached debug APK for identical upload (${inputHash.slice(0, 12)})`);
+        return NextResponse.json({ jobId });
       }
       
-      // Generate job ID
-      const jobId = uuidv4();
-      
-      // Initialize job in database
-      await dbService.saveJob(jobId, {
-        status: 'processing',
+      // Queue the job; a worker slot picks it up in FIFO order
+      await jobQueue.enqueue(jobId, {
         progress: 0,
-        currentStep: 'Starting...',
+        currentStep: 'Waiting in queue...',
         logs: [],
         startTime: new Date().toISOString(),
-        fileName: apkFile.name,
-        fileSize: apkFile.size
+        fileName: upload.fileName,
+        fileSize: upload.size,
+        inputHash,
+        uploadPath
       });
       
-      // Save uploaded file
-      const uploadPath = path.join(uploadsDir, `${jobId}.apk`);
-      const fileBuffer = await apkFile.arrayBuffer();
-      await fs.writeFile(uploadPath, Buffer.from(fileBuffer));
-      
-      // Process APK in background
-      processApkToDebugMode(uploadPath, outputDir, jobId)
-        .then(async (result) => {
-          await dbService.completeJob(jobId, result);
-        })
-        .catch(async (error) => {
-          console.error('Processing error:', error);
-          await dbService.errorJob(jobId, error.message);
-        });
-      
       return NextResponse.json({ jobId });
     }
     
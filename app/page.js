@@ -87,18 +87,29 @@ export default function APKDebugConverter() {
     event.preventDefault();
   };
 
-  const pollProgress = async (jobId) => {
+  const pollProgress = async (jobId, since = 0) => {
     try {
-      const response = await fetch(`/api/status/${jobId}`);
+      const response = await fetch(`/api/status/${jobId}?since=${since}`);
+      if (response.status === 503) {
+        // Status is briefly unavailable while the server reconnects to its database
+        const retryAfter = parseInt(response.headers.get('retry-after'), 10) || 5;
+        setTimeout(() => pollProgress(jobId, since), retryAfter * 1000);
+        return;
+      }
       const data = await response.json();
       
-      if (data.status === 'processing') {
+      if (data.status === 'queued') {
+        setCurrentStep(data.queuePosition ? `Waiting in queue (position ${data.queuePosition})...` : data.currentStep);
+        
+        // Continue polling
+        setTimeout(() => pollProgress(jobId, since), 1000);
+      } else if (data.status === 'processing') {
         setProgress(data.progress);
         setCurrentStep(data.currentStep);
-        setLogs(data.logs || []);
+        setLogs((previous) => (since === 0 ? data.logs : [...previous, ...data.logs]));
         
-        // Continue polling
-        setTimeout(() => pollProgress(jobId), 1000);
+        // Continue polling, fetching only log lines we have not seen yet
+        setTimeout(() => pollProgress(jobId, data.nextSeq), 1000);
       } else if (data.status === 'completed') {
         setProgress(100);
         setCurrentStep('Conversion Complete!');
@@ -117,6 +128,74 @@ export default function APKDebugConverter() {
     }
   };
 
+  // Follows the job over Server-Sent Events; falls back to polling if the stream fails
+  const streamProgress = (jobId) => {
+    if (typeof EventSource === 'undefined') {
+      pollProgress(jobId);
+      return;
+    }
+
+    const events = new EventSource(`/api/status/${jobId}/stream`);
+    let finished = false;
+
+    const handleStatus = (data) => {
+      if (data.status === 'queued') {
+        setCurrentStep(data.currentStep);
+      } else if (data.status === 'completed') {
+        finished = true;
+        events.close();
+        setProgress(100);
+        setCurrentStep('Conversion Complete!');
+        setProcessing(false);
+        setProcessedApk(data.result);
+      } else if (data.status === 'error') {
+        finished = true;
+        events.close();
+        setError(data.error);
+        setProcessing(false);
+        setProgress(0);
+        setCurrentStep('');
+      }
+    };
+
+    events.addEventListener('snapshot', (event) => {
+      const data = JSON.parse(event.data);
+      setProgress(data.progress || 0);
+      setCurrentStep(data.currentStep);
+      setLogs(data.logs || []);
+      handleStatus(data);
+    });
+
+    events.addEventListener('progress', (event) => {
+      const data = JSON.parse(event.data);
+      if (data.progress !== undefined) setProgress(data.progress);
+      if (data.currentStep !== undefined) setCurrentStep(data.currentStep);
+    });
+
+    events.addEventListener('log', (event) => {
+      const data = JSON.parse(event.data);
+      setLogs((previous) => [...previous, ...data.logs]);
+    });
+
+    events.addEventListener('status', (event) => {
+      handleStatus(JSON.parse(event.data));
+    });
+
+    let nextSeq = 0;
+    const trackSeq = (event) => {
+      nextSeq = JSON.parse(event.data).nextSeq ?? nextSeq;
+    };
+    events.addEventListener('snapshot', trackSeq);
+    events.addEventListener('log', trackSeq);
+
+    events.onerror = () => {
+      events.close();
+      if (!finished) {
+        pollProgress(jobId, nextSeq);
+      }
+    };
+  };
+
   const convertToDebugMode = async () => {
     if (!selectedFile) return;
 
@@ -144,8 +223,8 @@ export default function APKDebugConverter() {
       if (data.jobId) {
         setJobId(data.jobId);
         setUploading(false);
-        // Start polling for progress
-        pollProgress(data.jobId);
+        // Start streaming progress
+        streamProgress(data.jobId);
       } else {
         throw new Error(data.error || 'Unknown error occurred');
       }
@@ -0,0 +1,487 @@
+// Streaming APK (ZIP) archive reader and rewriter
+// Reads only the central directory of the input and copies untouched entries'
+// compressed bytes straight into the output, so large APKs are never inflated,
+// extracted to disk or held in memory as a whole. Stored entries are aligned
+// as they are written, so the output never needs a zipalign pass.
+
+import { promises as fs, createReadStream } from 'fs';
+import { Readable } from 'stream';
+import { promisify } from 'util';
+import zlib from 'zlib';
+
+const LOCAL_FILE_HEADER_SIGNATURE = 0x04034b50;
+const CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50;
+const END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06054b50;
+const ZIP64_LOCATOR_SIGNATURE = 0x07064b50;
+
+const LOCAL_FILE_HEADER_SIZE = 30;
+const CENTRAL_DIRECTORY_HEADER_SIZE = 46;
+const END_OF_CENTRAL_DIRECTORY_SIZE = 22;
+const MAX_COMMENT_SIZE = 0xffff;
+
+const FLAG_DATA_DESCRIPTOR = 0x0008;
+const FLAG_UTF8 = 0x0800;
+
+const METHOD_STORED = 0;
+const METHOD_DEFLATED = 8;
+
+const COPY_CHUNK_SIZE = 1024 * 1024;
+
+// The async zlib calls run on the libuv threadpool instead of the event loop
+const inflateRaw = promisify(zlib.inflateRaw);
+const deflateRaw = promisify(zlib.deflateRaw);
+
+// Stored data must be 4-byte aligned to be mmap-able; native libraries are
+// page aligned so they can be loaded straight from the APK
+const DEFAULT_ALIGNMENT = 4;
+const NATIVE_LIBRARY_ALIGNMENT = 4096;
+const ALIGNMENT_EXTRA_ID = 0xd935; // same extra field apksigner/zipflinger use
+const ALIGNMENT_EXTRA_MIN_SIZE = 6;
+
+// Files that are already compressed (or must be mmap-able) are stored as-is
+const STORED_EXTENSIONS = ['.dex', '.so', '.png', '.arsc'];
+
+const CRC32_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+export function crc32(buffer, previous = 0) {
+  let crc = (previous ^ 0xffffffff) >>> 0;
+  for (let i = 0; i < buffer.length; i++) {
+    crc = CRC32_TABLE[(crc ^ buffer[i]) & 0xff] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+function dosDateTime(date = new Date()) {
+  const year = Math.max(date.getFullYear(), 1980);
+  return {
+    time: ((date.getHours() << 11) | (date.getMinutes() << 5) | Math.floor(date.getSeconds() / 2)) & 0xffff,
+    date: (((year - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate()) & 0xffff
+  };
+}
+
+function getAlignment(name) {
+  return name.endsWith('.so') ? NATIVE_LIBRARY_ALIGNMENT : DEFAULT_ALIGNMENT;
+}
+
+// Drops alignment padding left by zipalign or an earlier rewrite; a malformed
+// tail (zipalign pads with bare zero bytes) is discarded as well
+function stripAlignmentPadding(extra) {
+  const fields = [];
+  for (let offset = 0; offset + 4 <= extra.length;) {
+    const id = extra.readUInt16LE(offset);
+    const end = offset + 4 + extra.readUInt16LE(offset + 2);
+    if (end > extra.length) {
+      break;
+    }
+    if (id !== ALIGNMENT_EXTRA_ID && id !== 0) {
+      fields.push(extra.subarray(offset, end));
+    }
+    offset = end;
+  }
+  return Buffer.concat(fields);
+}
+
+// Appends an alignment extra field that pads the entry's data to `alignment`
+function alignExtra(extra, dataStart, alignment) {
+  const padding = (alignment - ((dataStart + extra.length + ALIGNMENT_EXTRA_MIN_SIZE) % alignment)) % alignment;
+  const field = Buffer.alloc(ALIGNMENT_EXTRA_MIN_SIZE + padding);
+  field.writeUInt16LE(ALIGNMENT_EXTRA_ID, 0);
+  field.writeUInt16LE(2 + padding, 2);
+  field.writeUInt16LE(alignment, 4);
+  return Buffer.concat([extra, field]);
+}
+
+function shouldStore(name) {
+  return STORED_EXTENSIONS.some(extension => name.endsWith(extension));
+}
+
+async function readAt(fileHandle, position, length) {
+  const buffer = Buffer.alloc(length);
+  const { bytesRead } = await fileHandle.read(buffer, 0, length, position);
+  if (bytesRead !== length) {
+    throw new Error(`Unexpected end of archive at offset ${position}`);
+  }
+  return buffer;
+}
+
+async function findEndOfCentralDirectory(fileHandle, fileSize) {
+  const searchSize = Math.min(fileSize, END_OF_CENTRAL_DIRECTORY_SIZE + MAX_COMMENT_SIZE);
+  const tail = await readAt(fileHandle, fileSize - searchSize, searchSize);
+
+  for (let i = tail.length - END_OF_CENTRAL_DIRECTORY_SIZE; i >= 0; i--) {
+    if (tail.readUInt32LE(i) === END_OF_CENTRAL_DIRECTORY_SIGNATURE) {
+      const commentLength = tail.readUInt16LE(i + 20);
+      if (i + END_OF_CENTRAL_DIRECTORY_SIZE + commentLength !== tail.length) {
+        continue;
+      }
+      if (i >= 20 && tail.readUInt32LE(i - 20) === ZIP64_LOCATOR_SIGNATURE) {
+        throw new Error('ZIP64 archives are not supported');
+      }
+      return {
+        offset: fileSize - searchSize + i,
+        entryCount: tail.readUInt16LE(i + 10),
+        centralDirectorySize: tail.readUInt32LE(i + 12),
+        centralDirectoryOffset: tail.readUInt32LE(i + 16)
+      };
+    }
+  }
+
+  throw new Error('Invalid APK: end of central directory not found');
+}
+
+function parseCentralDirectory(buffer, entryCount) {
+  const entries = [];
+  let offset = 0;
+
+  for (let i = 0; i < entryCount; i++) {
+    if (buffer.readUInt32LE(offset) !== CENTRAL_DIRECTORY_SIGNATURE) {
+      throw new Error('Invalid APK: corrupt central directory');
+    }
+
+    const nameLength = buffer.readUInt16LE(offset + 28);
+    const extraLength = buffer.readUInt16LE(offset + 30);
+    const commentLength = buffer.readUInt16LE(offset + 32);
+    const nameStart = offset + CENTRAL_DIRECTORY_HEADER_SIZE;
+    const rawName = buffer.subarray(nameStart, nameStart + nameLength);
+
+    const entry = {
+      name: rawName.toString('utf8'),
+      rawName: Buffer.from(rawName),
+      versionMadeBy: buffer.readUInt16LE(offset + 4),
+      versionNeeded: buffer.readUInt16LE(offset + 6),
+      flags: buffer.readUInt16LE(offset + 8),
+      method: buffer.readUInt16LE(offset + 10),
+      time: buffer.readUInt16LE(offset + 12),
+      date: buffer.readUInt16LE(offset + 14),
+      crc32: buffer.readUInt32LE(offset + 16),
+      compressedSize: buffer.readUInt32LE(offset + 20),
+      uncompressedSize: buffer.readUInt32LE(offset + 24),
+      internalAttributes: buffer.readUInt16LE(offset + 36),
+      externalAttributes: buffer.readUInt32LE(offset + 38),
+      localHeaderOffset: buffer.readUInt32LE(offset + 42),
+      comment: Buffer.from(buffer.subarray(nameStart + nameLength + extraLength, nameStart + nameLength + extraLength + commentLength))
+    };
+
+    if (entry.compressedSize === 0xffffffff || entry.uncompressedSize === 0xffffffff || entry.localHeaderOffset === 0xffffffff) {
+      throw new Error('ZIP64 archives are not supported');
+    }
+
+    entries.push(entry);
+    offset = nameStart + nameLength + extraLength + commentLength;
+  }
+
+  return entries;
+}
+
+export class ApkArchive {
+  constructor(filePath, fileHandle, fileSize, entries, eocd) {
+    this.filePath = filePath;
+    this.fileHandle = fileHandle;
+    this.fileSize = fileSize;
+    this.entries = entries;
+    this.centralDirectoryOffset = eocd.centralDirectoryOffset;
+    this.endOfCentralDirectoryOffset = eocd.offset;
+    this.entriesByName = new Map(entries.map(entry => [entry.name, entry]));
+  }
+
+  static async open(filePath) {
+    const fileHandle = await fs.open(filePath, 'r');
+    try {
+      const { size } = await fileHandle.stat();
+      const eocd = await findEndOfCentralDirectory(fileHandle, size);
+      const centralDirectory = await readAt(fileHandle, eocd.centralDirectoryOffset, eocd.centralDirectorySize);
+      const entries = parseCentralDirectory(centralDirectory, eocd.entryCount);
+      return new ApkArchive(filePath, fileHandle, size, entries, eocd);
+    } catch (error) {
+      await fileHandle.close();
+      throw error;
+    }
+  }
+
+  getEntry(name) {
+    return this.entriesByName.get(name) || null;
+  }
+
+  // Reads the local file header to find where an entry's compressed data starts
+  async getLocalHeader(entry) {
+    if (!entry.localHeader) {
+      const header = await readAt(this.fileHandle, entry.localHeaderOffset, LOCAL_FILE_HEADER_SIZE);
+      if (header.readUInt32LE(0) !== LOCAL_FILE_HEADER_SIGNATURE) {
+        throw new Error(`Invalid APK: corrupt local header for ${entry.name}`);
+      }
+      const nameLength = header.readUInt16LE(26);
+      const extraLength = header.readUInt16LE(28);
+      const extra = await readAt(this.fileHandle, entry.localHeaderOffset + LOCAL_FILE_HEADER_SIZE + nameLength, extraLength);
+      entry.localHeader = {
+        extra,
+        dataOffset: entry.localHeaderOffset + LOCAL_FILE_HEADER_SIZE + nameLength + extraLength
+      };
+    }
+    return entry.localHeader;
+  }
+
+  async readRaw(entry) {
+    const { dataOffset } = await this.getLocalHeader(entry);
+    return readAt(this.fileHandle, dataOffset, entry.compressedSize);
+  }
+
+  async read(name) {
+    const entry = typeof name === 'string' ? this.getEntry(name) : name;
+    if (!entry) {
+      return null;
+    }
+
+    const raw = await this.readRaw(entry);
+    if (entry.method === METHOD_STORED) {
+      return raw;
+    }
+    if (entry.method === METHOD_DEFLATED) {
+      return inflateRaw(raw);
+    }
+    throw new Error(`Unsupported compression method ${entry.method} for ${entry.name}`);
+  }
+
+  // Uncompressed content of an entry as a stream, for entries too large to inflate in one go
+  async openReadStream(entry) {
+    const { dataOffset } = await this.getLocalHeader(entry);
+    if (entry.compressedSize === 0) {
+      return Readable.from([]);
+    }
+
+    const raw = createReadStream(this.filePath, {
+      start: dataOffset,
+      end: dataOffset + entry.compressedSize - 1,
+      highWaterMark: COPY_CHUNK_SIZE
+    });
+    if (entry.method === METHOD_STORED) {
+      return raw;
+    }
+    if (entry.method === METHOD_DEFLATED) {
+      const inflate = zlib.createInflateRaw();
+      raw.on('error', error => inflate.destroy(error));
+      return raw.pipe(inflate);
+    }
+    raw.destroy();
+    throw new Error(`Unsupported compression method ${entry.method} for ${entry.name}`);
+  }
+
+  // Names of stored entries whose data is not aligned; reads local headers only
+  async findMisalignedEntries() {
+    const misaligned = [];
+    for (const entry of this.entries) {
+      if (entry.method !== METHOD_STORED) {
+        continue;
+      }
+      const { dataOffset } = await this.getLocalHeader(entry);
+      if (dataOffset % getAlignment(entry.name) !== 0) {
+        misaligned.push(entry.name);
+      }
+    }
+    return misaligned;
+  }
+
+  async close() {
+    await this.fileHandle.close();
+  }
+}
+
+class ArchiveWriter {
+  constructor(fileHandle) {
+    this.fileHandle = fileHandle;
+    this.offset = 0;
+    this.centralDirectory = [];
+  }
+
+  async write(buffer) {
+    let written = 0;
+    while (written < buffer.length) {
+      const { bytesWritten } = await this.fileHandle.write(buffer, written, buffer.length - written);
+      written += bytesWritten;
+    }
+    this.offset += buffer.length;
+  }
+
+  // Stored entries get an alignment extra field so their data lands on an aligned offset
+  async writeLocalHeader(record) {
+    if (record.method === METHOD_STORED) {
+      record.extra = alignExtra(
+        stripAlignmentPadding(record.extra),
+        this.offset + LOCAL_FILE_HEADER_SIZE + record.rawName.length,
+        getAlignment(record.rawName.toString('utf8'))
+      );
+    }
+
+    const header = Buffer.alloc(LOCAL_FILE_HEADER_SIZE);
+    header.writeUInt32LE(LOCAL_FILE_HEADER_SIGNATURE, 0);
+    header.writeUInt16LE(record.versionNeeded, 4);
+    header.writeUInt16LE(record.flags, 6);
+    header.writeUInt16LE(record.method, 8);
+    header.writeUInt16LE(record.time, 10);
+    header.writeUInt16LE(record.date, 12);
+    header.writeUInt32LE(record.crc32, 14);
+    header.writeUInt32LE(record.compressedSize, 18);
+    header.writeUInt32LE(record.uncompressedSize, 22);
+    header.writeUInt16LE(record.rawName.length, 26);
+    header.writeUInt16LE(record.extra.length, 28);
+
+    record.localHeaderOffset = this.offset;
+    await this.write(Buffer.concat([header, record.rawName, record.extra]));
+    this.centralDirectory.push(record);
+  }
+
+  async writeCentralDirectory() {
+    const centralDirectoryOffset = this.offset;
+
+    for (const record of this.centralDirectory) {
+      const header = Buffer.alloc(CENTRAL_DIRECTORY_HEADER_SIZE);
+      header.writeUInt32LE(CENTRAL_DIRECTORY_SIGNATURE, 0);
+      header.writeUInt16LE(record.versionMadeBy, 4);
+      header.writeUInt16LE(record.versionNeeded, 6);
+      header.writeUInt16LE(record.flags, 8);
+      header.writeUInt16LE(record.method, 10);
+      header.writeUInt16LE(record.time, 12);
+      header.writeUInt16LE(record.date, 14);
+      header.writeUInt32LE(record.crc32, 16);
+      header.writeUInt32LE(record.compressedSize, 20);
+      header.writeUInt32LE(record.uncompressedSize, 24);
+      header.writeUInt16LE(record.rawName.length, 28);
+      header.writeUInt16LE(0, 30);
+      header.writeUInt16LE(record.comment.length, 32);
+      header.writeUInt16LE(0, 34);
+      header.writeUInt16LE(record.internalAttributes, 36);
+      header.writeUInt32LE(record.externalAttributes, 38);
+      header.writeUInt32LE(record.localHeaderOffset, 42);
+      await this.write(Buffer.concat([header, record.rawName, record.comment]));
+    }
+
+    const centralDirectorySize = this.offset - centralDirectoryOffset;
+    const eocd = Buffer.alloc(END_OF_CENTRAL_DIRECTORY_SIZE);
+    eocd.writeUInt32LE(END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0);
+    eocd.writeUInt16LE(this.centralDirectory.length, 8);
+    eocd.writeUInt16LE(this.centralDirectory.length, 10);
+    eocd.writeUInt32LE(centralDirectorySize, 12);
+    eocd.writeUInt32LE(centralDirectoryOffset, 16);
+    await this.write(eocd);
+
+    if (this.offset > 0xffffffff || this.centralDirectory.length > 0xffff) {
+      throw new Error('Output APK exceeds the ZIP32 size limits');
+    }
+  }
+}
+
+async function copyEntry(archive, writer, entry, copyBuffer) {
+  const { extra, dataOffset } = await archive.getLocalHeader(entry);
+
+  // Sizes always come from the central directory, so data descriptors are dropped
+  await writer.writeLocalHeader({
+    rawName: entry.rawName,
+    extra,
+    comment: entry.comment,
+    versionMadeBy: entry.versionMadeBy,
+    versionNeeded: entry.versionNeeded,
+    flags: entry.flags & ~FLAG_DATA_DESCRIPTOR,
+    method: entry.method,
+    time: entry.time,
+    date: entry.date,
+    crc32: entry.crc32,
+    compressedSize: entry.compressedSize,
+    uncompressedSize: entry.uncompressedSize,
+    internalAttributes: entry.internalAttributes,
+    externalAttributes: entry.externalAttributes
+  });
+
+  let remaining = entry.compressedSize;
+  let position = dataOffset;
+  while (remaining > 0) {
+    const length = Math.min(remaining, copyBuffer.length);
+    const { bytesRead } = await archive.fileHandle.read(copyBuffer, 0, length, position);
+    if (bytesRead === 0) {
+      throw new Error(`Unexpected end of archive while copying ${entry.name}`);
+    }
+    await writer.write(copyBuffer.subarray(0, bytesRead));
+    remaining -= bytesRead;
+    position += bytesRead;
+  }
+}
+
+async function writeNewEntry(writer, name, content, original = null) {
+  const data = Buffer.isBuffer(content) ? content : Buffer.from(content);
+  const method = shouldStore(name) ? METHOD_STORED : METHOD_DEFLATED;
+  const compressed = method === METHOD_DEFLATED ? await deflateRaw(data) : data;
+  const { time, date } = dosDateTime();
+
+  await writer.writeLocalHeader({
+    rawName: Buffer.from(name, 'utf8'),
+    extra: Buffer.alloc(0),
+    comment: Buffer.alloc(0),
+    versionMadeBy: original ? original.versionMadeBy : 20,
+    versionNeeded: 20,
+    flags: /[^\x20-\x7e]/.test(name) ? FLAG_UTF8 : 0,
+    method,
+    time,
+    date,
+    crc32: crc32(data),
+    compressedSize: compressed.length,
+    uncompressedSize: data.length,
+    internalAttributes: original ? original.internalAttributes : 0,
+    externalAttributes: original ? original.externalAttributes : 0
+  });
+  await writer.write(compressed);
+}
+
+/**
+ * Writes a new APK to outputPath from an opened ApkArchive.
+ *
+ * Entries are emitted in their original order. Entries for which drop(name)
+ * returns true are omitted, entries named in `replace` get new content, and
+ * everything else is copied as raw compressed bytes without inflating.
+ * Entries in `add` that do not exist in the input are appended at the end.
+ */
+export async function rewriteApk(archive, outputPath, { drop = () => false, replace = new Map(), add = new Map() } = {}) {
+  const fileHandle = await fs.open(outputPath, 'w');
+  const writer = new ArchiveWriter(fileHandle);
+  const copyBuffer = Buffer.allocUnsafe(COPY_CHUNK_SIZE);
+  const stats = { copied: 0, rewritten: 0, added: 0, dropped: 0, bytesCopied: 0, bytesWritten: 0 };
+
+  try {
+    for (const entry of archive.entries) {
+      if (replace.has(entry.name)) {
+        await writeNewEntry(writer, entry.name, replace.get(entry.name), entry);
+        stats.rewritten++;
+      } else if (add.has(entry.name)) {
+        await writeNewEntry(writer, entry.name, add.get(entry.name), entry);
+        stats.rewritten++;
+      } else if (drop(entry.name)) {
+        stats.dropped++;
+      } else {
+        await copyEntry(archive, writer, entry, copyBuffer);
+        stats.copied++;
+        stats.bytesCopied += entry.compressedSize;
+      }
+    }
+
+    for (const [name, content] of add) {
+      if (!archive.getEntry(name)) {
+        await writeNewEntry(writer, name, content);
+        stats.added++;
+      }
+    }
+
+    await writer.writeCentralDirectory();
+    stats.bytesWritten = writer.offset;
+  } finally {
+    await fileHandle.close();
+  }
+
+  return stats;
+}
@@ -0,0 +1,89 @@
+// SHA-256 digests used by the APK signer
+// v1 needs a digest of every entry's uncompressed content and v2/v3 a digest
+// over 1MB chunks of the whole file. Both are CPU-bound, so the signer runs
+// them through the digest worker pool; the functions here are what the
+// workers execute.
+
+import { promises as fs } from 'fs';
+import crypto from 'crypto';
+import { ApkArchive } from './apk-archive.js';
+
+const CONTENT_DIGEST_CHUNK_SIZE = 1024 * 1024;
+
+// Entries at or above this size are digested as a stream instead of inflated in one go
+const STREAM_DIGEST_THRESHOLD = 1024 * 1024;
+
+export function uint32(value) {
+  const buffer = Buffer.alloc(4);
+  buffer.writeUInt32LE(value >>> 0);
+  return buffer;
+}
+
+export function sha256(...parts) {
+  const hash = crypto.createHash('sha256');
+  parts.forEach(part => hash.update(part));
+  return hash.digest();
+}
+
+async function digestEntry(archive, entry) {
+  if (entry.uncompressedSize < STREAM_DIGEST_THRESHOLD) {
+    return sha256(await archive.read(entry));
+  }
+
+  const hash = crypto.createHash('sha256');
+  for await (const chunk of await archive.openReadStream(entry)) {
+    hash.update(chunk);
+  }
+  return hash.digest();
+}
+
+// Base64 SHA-256 of the uncompressed content of each named entry, in order
+export async function digestEntries(filePath, entryNames) {
+  const archive = await ApkArchive.open(filePath);
+  try {
+    const digests = [];
+    for (const name of entryNames) {
+      digests.push((await digestEntry(archive, archive.getEntry(name))).toString('base64'));
+    }
+    return digests;
+  } finally {
+    await archive.close();
+  }
+}
+
+/**
+ * v2/v3 content digest of filePath. Sections are { start, end } byte ranges
+ * of the file or { data } buffers (e.g. a patched EOCD), digested in order.
+ * Returns the digest base64-encoded.
+ */
+export async function digestSections(filePath, sections) {
+  const fileHandle = await fs.open(filePath, 'r');
+  const chunkDigests = [];
+  const buffer = Buffer.allocUnsafe(CONTENT_DIGEST_CHUNK_SIZE);
+
+  try {
+    for (const section of sections) {
+      if (section.data) {
+        const data = Buffer.from(section.data);
+        for (let offset = 0; offset < data.length; offset += CONTENT_DIGEST_CHUNK_SIZE) {
+          const chunk = data.subarray(offset, offset + CONTENT_DIGEST_CHUNK_SIZE);
+          chunkDigests.push(sha256(Buffer.from([0xa5]), uint32(chunk.length), chunk));
+        }
+        continue;
+      }
+
+      for (let offset = section.start; offset < section.end; offset += CONTENT_DIGEST_CHUNK_SIZE) {
+        const length = Math.min(CONTENT_DIGEST_CHUNK_SIZE, section.end - offset);
+        const { bytesRead } = await fileHandle.read(buffer, 0, length, offset);
+        if (bytesRead !== length) {
+          throw new Error('Unexpected end of APK while computing content digest');
+        }
+        chunkDigests.push(sha256(Buffer.from([0xa5]), uint32(length), buffer.subarray(0, length)));
+      }
+    }
+  } finally {
+    await fileHandle.close();
+  }
+
+  return sha256(Buffer.from([0x5a]), uint32(chunkDigests.length), ...chunkDigests).toString('base64');
+}
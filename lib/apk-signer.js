@@ -0,0 +1,472 @@
+// In-process APK signing with the debug key
+// Produces v1 (JAR), v2 and v3 (APK Signature Scheme) signatures without
+// spawning keytool or jarsigner. The debug key and certificate are generated
+// once, stored next to the old keystore in temp/keystore and kept in memory.
+
+import { promises as fs } from 'fs';
+import path from 'path';
+import crypto from 'crypto';
+import { ApkArchive, rewriteApk } from './apk-archive.js';
+import { sha256, uint32 } from './apk-digest.js';
+import digestPool from './digest-pool.js';
+import * as der from './der.js';
+
+const KEY_FILE = 'debug-key.pem';
+const CERTIFICATE_FILE = 'debug-cert.der';
+const CERTIFICATE_VALIDITY_YEARS = 30;
+
+const OID_RSA_ENCRYPTION = '1.2.840.113549.1.1.1';
+const OID_SHA256_WITH_RSA = '1.2.840.113549.1.1.11';
+const OID_SHA256 = '2.16.840.1.101.3.4.2.1';
+const OID_PKCS7_DATA = '1.2.840.113549.1.7.1';
+const OID_PKCS7_SIGNED_DATA = '1.2.840.113549.1.7.2';
+
+// Same subject keytool was given: CN=Debug, OU=Debug, O=Debug, L=Debug, ST=Debug, C=US
+const DEBUG_SUBJECT = [
+  ['2.5.4.6', 'US'],
+  ['2.5.4.8', 'Debug'],
+  ['2.5.4.7', 'Debug'],
+  ['2.5.4.10', 'Debug'],
+  ['2.5.4.11', 'Debug'],
+  ['2.5.4.3', 'Debug']
+];
+
+const APK_SIG_BLOCK_MAGIC = Buffer.from('APK Sig Block 42', 'ascii');
+const APK_SIGNATURE_SCHEME_V2_BLOCK_ID = 0x7109871a;
+const APK_SIGNATURE_SCHEME_V3_BLOCK_ID = 0xf05368c0;
+const STRIPPING_PROTECTION_ATTRIBUTE_ID = 0xbeeff00d;
+const SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256 = 0x0103;
+const V3_MIN_SDK_VERSION = 28;
+const V3_MAX_SDK_VERSION = 0x7fffffff;
+
+const MANIFEST_LINE_LENGTH = 72;
+const CREATED_BY = '1.0 (APK Debug Converter)';
+
+// Signature files from a previous signer; other META-INF entries are regular content
+export function isJarSignatureEntry(entryName) {
+  return /^META-INF\/([^/]+\.(SF|RSA|DSA|EC)|MANIFEST\.MF|SIG-[^/]+)$/i.test(entryName);
+}
+
+function uint64(value) {
+  const buffer = Buffer.alloc(8);
+  buffer.writeBigUInt64LE(BigInt(value));
+  return buffer;
+}
+
+function lengthPrefixed(...parts) {
+  const body = Buffer.concat(parts);
+  return Buffer.concat([uint32(body.length), body]);
+}
+
+// Manifest lines are limited to 72 bytes; longer ones continue on lines starting with a space
+function manifestLine(text) {
+  const bytes = Buffer.from(text, 'utf8');
+  const lines = [bytes.subarray(0, MANIFEST_LINE_LENGTH)];
+  for (let offset = MANIFEST_LINE_LENGTH; offset < bytes.length; offset += MANIFEST_LINE_LENGTH - 1) {
+    lines.push(Buffer.concat([Buffer.from(' '), bytes.subarray(offset, offset + MANIFEST_LINE_LENGTH - 1)]));
+  }
+  return Buffer.concat(lines.flatMap(line => [line, Buffer.from('\r\n')]));
+}
+
+function buildName(attributes) {
+  return der.sequence(...attributes.map(([type, value]) => der.set(der.sequence(
+    der.oid(type),
+    type === '2.5.4.6' ? der.printableString(value) : der.utf8String(value)
+  ))));
+}
+
+function sha256WithRsaAlgorithm() {
+  return der.sequence(der.oid(OID_SHA256_WITH_RSA), der.nullValue());
+}
+
+function createSelfSignedCertificate(privateKey, publicKey) {
+  const serial = crypto.randomBytes(8);
+  serial[0] &= 0x7f;
+  const notBefore = new Date();
+  const notAfter = new Date(notBefore);
+  notAfter.setUTCFullYear(notAfter.getUTCFullYear() + CERTIFICATE_VALIDITY_YEARS);
+  const subject = buildName(DEBUG_SUBJECT);
+
+  const tbsCertificate = der.sequence(
+    der.contextConstructed(0, der.integer(2)),
+    der.integer(serial),
+    sha256WithRsaAlgorithm(),
+    subject,
+    der.sequence(der.time(notBefore), der.time(notAfter)),
+    subject,
+    publicKey.export({ type: 'spki', format: 'der' })
+  );
+
+  return der.sequence(
+    tbsCertificate,
+    sha256WithRsaAlgorithm(),
+    der.bitString(crypto.sign('sha256', tbsCertificate, privateKey))
+  );
+}
+
+// Issuer Name and serial number of a certificate, needed by PKCS#7 SignerInfo
+function readIssuerAndSerial(certificate) {
+  const [tbsCertificate] = der.readChildren(der.readElement(certificate).content);
+  const fields = der.readChildren(tbsCertificate.content);
+  const offset = fields[0].tag === 0xa0 ? 1 : 0;
+  return { serial: fields[offset].raw, issuer: fields[offset + 2].raw };
+}
+
+// Reads the length-prefixed sequence used throughout the APK Signing Block
+function readLengthPrefixedSequence(buffer) {
+  const items = [];
+  for (let offset = 0; offset < buffer.length;) {
+    const length = buffer.readUInt32LE(offset);
+    items.push(buffer.subarray(offset + 4, offset + 4 + length));
+    offset += 4 + length;
+  }
+  return items;
+}
+
+function readLengthPrefixed(buffer, offset) {
+  const length = buffer.readUInt32LE(offset);
+  return { value: buffer.subarray(offset + 4, offset + 4 + length), end: offset + 4 + length };
+}
+
+class ApkSigner {
+  constructor() {
+    this.loading = null;
+    this.privateKey = null;
+    this.publicKey = null;
+    this.certificate = null;
+  }
+
+  // Loads (or creates on first use) the debug key; later calls reuse the same promise
+  loadKey(keyDir) {
+    if (!this.loading) {
+      this.loading = this.readOrCreateKey(keyDir).catch((error) => {
+        this.loading = null;
+        throw error;
+      });
+    }
+    return this.loading;
+  }
+
+  async readOrCreateKey(keyDir) {
+    const keyPath = path.join(keyDir, KEY_FILE);
+    const certificatePath = path.join(keyDir, CERTIFICATE_FILE);
+
+    try {
+      const [keyPem, certificate] = await Promise.all([
+        fs.readFile(keyPath, 'utf8'),
+        fs.readFile(certificatePath)
+      ]);
+      this.privateKey = crypto.createPrivateKey(keyPem);
+      this.certificate = certificate;
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        throw error;
+      }
+
+      const { privateKey, publicKey } = crypto.generateKeyPairSync('rsa', { modulusLength: 2048 });
+      this.privateKey = privateKey;
+      this.certificate = createSelfSignedCertificate(privateKey, publicKey);
+
+      await fs.mkdir(keyDir, { recursive: true });
+      await fs.writeFile(keyPath, privateKey.export({ type: 'pkcs8', format: 'pem' }), { mode: 0o600 });
+      await fs.writeFile(certificatePath, this.certificate);
+      console.log('🔑 Generated debug signing key');
+    }
+
+    this.publicKey = crypto.createPublicKey(this.privateKey);
+    this.publicKeyDer = this.publicKey.export({ type: 'spki', format: 'der' });
+
+    if (!new crypto.X509Certificate(this.certificate).checkPrivateKey(this.privateKey)) {
+      throw new Error('Debug certificate does not match the debug private key');
+    }
+  }
+
+  // PKCS#7 SignedData over the signature file, detached, without signed attributes
+  createSignatureBlock(signatureFile) {
+    const { issuer, serial } = readIssuerAndSerial(this.certificate);
+    const sha256Algorithm = der.sequence(der.oid(OID_SHA256), der.nullValue());
+
+    const signerInfo = der.sequence(
+      der.integer(1),
+      der.sequence(issuer, serial),
+      sha256Algorithm,
+      der.sequence(der.oid(OID_RSA_ENCRYPTION), der.nullValue()),
+      der.octetString(crypto.sign('sha256', signatureFile, this.privateKey))
+    );
+
+    return der.sequence(
+      der.oid(OID_PKCS7_SIGNED_DATA),
+      der.contextConstructed(0, der.sequence(
+        der.integer(1),
+        der.set(sha256Algorithm),
+        der.sequence(der.oid(OID_PKCS7_DATA)),
+        der.contextConstructed(0, this.certificate),
+        der.set(signerInfo)
+      ))
+    );
+  }
+
+  /**
+   * v1 (JAR) signature: writes inputPath to outputPath with META-INF/MANIFEST.MF,
+   * CERT.SF and CERT.RSA appended. Existing signature files are dropped and all
+   * other entries are copied without recompression.
+   */
+  async signJar(inputPath, outputPath) {
+    const archive = await ApkArchive.open(inputPath);
+
+    try {
+      const mainSection = Buffer.concat([
+        manifestLine('Manifest-Version: 1.0'),
+        manifestLine(`Created-By: ${CREATED_BY}`),
+        Buffer.from('\r\n')
+      ]);
+      const names = archive.entries
+        .map(entry => entry.name)
+        .filter(name => !name.endsWith('/') && !isJarSignatureEntry(name));
+      const digests = await digestPool.digestEntries(inputPath, names);
+      const entrySections = names.map((name, index) => ({
+        name,
+        bytes: Buffer.concat([
+          manifestLine(`Name: ${name}`),
+          manifestLine(`SHA-256-Digest: ${digests[index]}`),
+          Buffer.from('\r\n')
+        ])
+      }));
+
+      const manifest = Buffer.concat([mainSection, ...entrySections.map(section => section.bytes)]);
+      const signatureFile = Buffer.concat([
+        manifestLine('Signature-Version: 1.0'),
+        manifestLine(`Created-By: ${CREATED_BY}`),
+        manifestLine(`SHA-256-Digest-Manifest: ${sha256(manifest).toString('base64')}`),
+        manifestLine(`SHA-256-Digest-Manifest-Main-Attributes: ${sha256(mainSection).toString('base64')}`),
+        // Tells v1-only verifiers on newer Android that v2/v3 signatures must be present
+        manifestLine('X-Android-APK-Signed: 2, 3'),
+        Buffer.from('\r\n'),
+        ...entrySections.map(section => Buffer.concat([
+          manifestLine(`Name: ${section.name}`),
+          manifestLine(`SHA-256-Digest: ${sha256(section.bytes).toString('base64')}`),
+          Buffer.from('\r\n')
+        ]))
+      ]);
+
+      const stats = await rewriteApk(archive, outputPath, {
+        drop: isJarSignatureEntry,
+        add: new Map([
+          ['META-INF/MANIFEST.MF', manifest],
+          ['META-INF/CERT.SF', signatureFile],
+          ['META-INF/CERT.RSA', this.createSignatureBlock(signatureFile)]
+        ])
+      });
+
+      return { entriesSigned: entrySections.length, bytesWritten: stats.bytesWritten };
+    } finally {
+      await archive.close();
+    }
+  }
+
+  signedDigests(contentDigest) {
+    return lengthPrefixed(lengthPrefixed(
+      uint32(SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256),
+      lengthPrefixed(contentDigest)
+    ));
+  }
+
+  signatures(signedData) {
+    return lengthPrefixed(lengthPrefixed(
+      uint32(SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256),
+      lengthPrefixed(crypto.sign('sha256', signedData, this.privateKey))
+    ));
+  }
+
+  createV2Block(contentDigest) {
+    const signedData = Buffer.concat([
+      this.signedDigests(contentDigest),
+      lengthPrefixed(lengthPrefixed(this.certificate)),
+      // Stops the v3 signature from being stripped to downgrade verification to v2
+      lengthPrefixed(lengthPrefixed(uint32(STRIPPING_PROTECTION_ATTRIBUTE_ID), uint32(3)))
+    ]);
+
+    return lengthPrefixed(lengthPrefixed(
+      lengthPrefixed(signedData),
+      this.signatures(signedData),
+      lengthPrefixed(this.publicKeyDer)
+    ));
+  }
+
+  createV3Block(contentDigest) {
+    const signedData = Buffer.concat([
+      this.signedDigests(contentDigest),
+      lengthPrefixed(lengthPrefixed(this.certificate)),
+      uint32(V3_MIN_SDK_VERSION),
+      uint32(V3_MAX_SDK_VERSION),
+      lengthPrefixed()
+    ]);
+
+    return lengthPrefixed(lengthPrefixed(
+      lengthPrefixed(signedData),
+      uint32(V3_MIN_SDK_VERSION),
+      uint32(V3_MAX_SDK_VERSION),
+      this.signatures(signedData),
+      lengthPrefixed(this.publicKeyDer)
+    ));
+  }
+
+  /**
+   * v2 + v3 signatures: inserts an APK Signing Block in front of the central
+   * directory of apkPath, in place. Must run after anything that rewrites or
+   * realigns entries. Returns whether the new signatures verified.
+   */
+  async signApk(apkPath) {
+    const archive = await ApkArchive.open(apkPath);
+    const { centralDirectoryOffset, endOfCentralDirectoryOffset, fileSize } = archive;
+    await archive.close();
+
+    const fileHandle = await fs.open(apkPath, 'r+');
+    try {
+      const tail = Buffer.alloc(fileSize - centralDirectoryOffset);
+      await fileHandle.read(tail, 0, tail.length, centralDirectoryOffset);
+      const eocdStart = endOfCentralDirectoryOffset - centralDirectoryOffset;
+
+      if (centralDirectoryOffset >= 16) {
+        const magic = Buffer.alloc(16);
+        await fileHandle.read(magic, 0, 16, centralDirectoryOffset - 16);
+        if (magic.equals(APK_SIG_BLOCK_MAGIC)) {
+          throw new Error('APK already contains an APK Signing Block');
+        }
+      }
+
+      const contentDigest = await digestPool.digestSections(apkPath, [
+        { start: 0, end: centralDirectoryOffset },
+        { start: centralDirectoryOffset, end: endOfCentralDirectoryOffset },
+        { start: endOfCentralDirectoryOffset, end: fileSize }
+      ]);
+
+      const pairs = Buffer.concat([
+        [APK_SIGNATURE_SCHEME_V2_BLOCK_ID, this.createV2Block(contentDigest)],
+        [APK_SIGNATURE_SCHEME_V3_BLOCK_ID, this.createV3Block(contentDigest)]
+      ].map(([id, value]) => Buffer.concat([uint64(value.length + 4), uint32(id), value])));
+      const blockSize = pairs.length + 8 + APK_SIG_BLOCK_MAGIC.length;
+      const signingBlock = Buffer.concat([uint64(blockSize), pairs, uint64(blockSize), APK_SIG_BLOCK_MAGIC]);
+
+      // The central directory moves back by the size of the block
+      const newTail = Buffer.from(tail);
+      newTail.writeUInt32LE(centralDirectoryOffset + signingBlock.length, eocdStart + 16);
+      await fileHandle.write(Buffer.concat([signingBlock, newTail]), 0, signingBlock.length + newTail.length, centralDirectoryOffset);
+
+      return this.verifySigningBlock(signingBlock.subarray(8, 8 + pairs.length), contentDigest);
+    } finally {
+      await fileHandle.close();
+    }
+  }
+
+  // Checks every v2/v3 signer: signature over signed data, certificate key and content digest
+  verifySigningBlock(pairs, contentDigest) {
+    const found = { v2: false, v3: false };
+
+    for (let offset = 0; offset < pairs.length;) {
+      const length = Number(pairs.readBigUInt64LE(offset));
+      const id = pairs.readUInt32LE(offset + 8);
+      const value = pairs.subarray(offset + 12, offset + 8 + length);
+      offset += 8 + length;
+
+      const scheme = id === APK_SIGNATURE_SCHEME_V2_BLOCK_ID ? 'v2' : id === APK_SIGNATURE_SCHEME_V3_BLOCK_ID ? 'v3' : null;
+      if (!scheme) {
+        continue;
+      }
+
+      const [signers] = readLengthPrefixedSequence(value);
+      found[scheme] = readLengthPrefixedSequence(signers).every((signer) => {
+        // v3 signers carry min/max SDK between signed data and signatures
+        const signedData = readLengthPrefixed(signer, 0);
+        const signatures = readLengthPrefixed(signer, signedData.end + (scheme === 'v3' ? 8 : 0));
+        const publicKeyDer = readLengthPrefixed(signer, signatures.end).value;
+        const publicKey = crypto.createPublicKey({ key: publicKeyDer, format: 'der', type: 'spki' });
+
+        const signaturesValid = readLengthPrefixedSequence(signatures.value).every((signature) => (
+          signature.readUInt32LE(0) === SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256 &&
+          crypto.verify('sha256', signedData.value, publicKey, readLengthPrefixed(signature, 4).value)
+        ));
+
+        const digests = readLengthPrefixed(signedData.value, 0);
+        const certificates = readLengthPrefixed(signedData.value, digests.end);
+        const certificate = readLengthPrefixedSequence(certificates.value)[0];
+        const certificateMatches = new crypto.X509Certificate(certificate).publicKey
+          .export({ type: 'spki', format: 'der' }).equals(publicKeyDer);
+
+        const digestsMatch = readLengthPrefixedSequence(digests.value).every((digest) => (
+          digest.readUInt32LE(0) === SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256 &&
+          readLengthPrefixed(digest, 4).value.equals(contentDigest)
+        ));
+
+        return signaturesValid && certificateMatches && digestsMatch;
+      });
+    }
+
+    return found.v2 && found.v3;
+  }
+
+  // v1: CERT.RSA signs CERT.SF, and CERT.SF matches the manifest
+  async verifyJarSignature(archive) {
+    const manifest = await archive.read('META-INF/MANIFEST.MF');
+    const signatureFile = await archive.read('META-INF/CERT.SF');
+    const signatureBlock = await archive.read('META-INF/CERT.RSA');
+    if (!manifest || !signatureFile || !signatureBlock) {
+      return false;
+    }
+
+    const manifestDigest = /SHA-256-Digest-Manifest: ([A-Za-z0-9+/=]+)\r\n/.exec(signatureFile.toString('utf8'));
+    if (!manifestDigest || manifestDigest[1] !== sha256(manifest).toString('base64')) {
+      return false;
+    }
+
+    const [, content] = der.readChildren(der.readElement(signatureBlock).content);
+    const signedData = der.readChildren(der.readElement(content.content).content);
+    const certificate = der.readChildren(signedData[3].content)[0].raw;
+    const signerInfo = der.readChildren(signedData[signedData.length - 1].content)[0];
+    const signature = der.readChildren(signerInfo.content).pop().content;
+
+    return crypto.verify('sha256', signatureFile, new crypto.X509Certificate(certificate).publicKey, signature);
+  }
+
+  /**
+   * Verifies v1, v2 and v3 signatures of a signed APK, recomputing the v2/v3
+   * content digest from the file. Returns { verified, schemes }.
+   */
+  async verify(apkPath) {
+    const archive = await ApkArchive.open(apkPath);
+    try {
+      const schemes = { v1: await this.verifyJarSignature(archive), v2: false, v3: false };
+      const { centralDirectoryOffset, endOfCentralDirectoryOffset, fileSize, fileHandle } = archive;
+
+      const footer = Buffer.alloc(24);
+      await fileHandle.read(footer, 0, 24, centralDirectoryOffset - 24);
+      if (footer.subarray(8).equals(APK_SIG_BLOCK_MAGIC)) {
+        const blockSize = Number(footer.readBigUInt64LE(0));
+        const blockStart = centralDirectoryOffset - blockSize - 8;
+        const pairs = Buffer.alloc(blockSize - 24);
+        await fileHandle.read(pairs, 0, pairs.length, blockStart + 8);
+
+        // The digest covers the EOCD as if the central directory started where the block does
+        const eocd = Buffer.alloc(fileSize - endOfCentralDirectoryOffset);
+        await fileHandle.read(eocd, 0, eocd.length, endOfCentralDirectoryOffset);
+        eocd.writeUInt32LE(blockStart, 16);
+
+        const contentDigest = await digestPool.digestSections(apkPath, [
+          { start: 0, end: blockStart },
+          { start: centralDirectoryOffset, end: endOfCentralDirectoryOffset },
+          { data: eocd }
+        ]);
+        schemes.v2 = schemes.v3 = this.verifySigningBlock(pairs, contentDigest);
+      }
+
+      return { verified: schemes.v1 && schemes.v2 && schemes.v3, schemes };
+    } finally {
+      await archive.close();
+    }
+  }
+}
+
+// Create singleton instance
+const apkSigner = new ApkSigner();
+
+export default apkSigner;
@@ -0,0 +1,117 @@
+// Content-addressed cache of converted APKs
+// Outputs are keyed by the SHA-256 of the uploaded APK plus the pipeline
+// version, so re-uploads of the same APK reuse the existing debug build. The
+// index lives in the artifact_cache collection and is evicted least recently
+// used first once the cached files exceed ARTIFACT_CACHE_MAX_BYTES.
+
+import { promises as fs } from 'fs';
+import dbService from './database.js';
+
+const DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024; // 2GB of temp/output
+const MAX_REMEMBERED_ETAGS = 1000;
+
+class ArtifactCache {
+  constructor() {
+    this.maxBytes = parseInt(process.env.ARTIFACT_CACHE_MAX_BYTES, 10) || DEFAULT_MAX_BYTES;
+    this.evicting = null;
+    this.etags = new Map(); // fileName -> ETag, in least recently used order
+  }
+
+  cacheKey(inputHash, pipelineVersion) {
+    return `${inputHash}:${pipelineVersion}`;
+  }
+
+  // Returns the cached conversion result, or null if there is none or its file is gone
+  async lookup(inputHash, pipelineVersion) {
+    const cacheKey = this.cacheKey(inputHash, pipelineVersion);
+    const artifact = await dbService.getCachedArtifact(cacheKey);
+    if (!artifact) {
+      return null;
+    }
+
+    try {
+      await fs.access(artifact.result.path);
+      return artifact.result;
+    } catch (error) {
+      await dbService.deleteCachedArtifact(cacheKey);
+      return null;
+    }
+  }
+
+  async store(inputHash, pipelineVersion, result) {
+    try {
+      const stats = await fs.stat(result.path);
+      await dbService.saveCachedArtifact(this.cacheKey(inputHash, pipelineVersion), {
+        inputHash,
+        pipelineVersion,
+        fileName: result.fileName,
+        path: result.path,
+        sizeBytes: stats.size,
+        result
+      });
+    } catch (error) {
+      console.error('❌ Error caching conversion output:', error);
+      return;
+    }
+
+    await this.evict();
+  }
+
+  // Strong ETag for a cached output file, derived from its content address
+  async getETag(fileName) {
+    if (this.etags.has(fileName)) {
+      const etag = this.etags.get(fileName);
+      this.etags.delete(fileName);
+      this.etags.set(fileName, etag);
+      return etag;
+    }
+
+    const artifact = await dbService.getCachedArtifactByFileName(fileName);
+    if (!artifact) {
+      return null;
+    }
+
+    const etag = `"${artifact.inputHash}-${artifact.pipelineVersion}"`;
+    this.etags.set(fileName, etag);
+    if (this.etags.size > MAX_REMEMBERED_ETAGS) {
+      this.etags.delete(this.etags.keys().next().value);
+    }
+    return etag;
+  }
+
+  // Removes least recently used artifacts until the cache fits in maxBytes
+  async evict() {
+    if (this.evicting) {
+      return this.evicting;
+    }
+
+    this.evicting = (async () => {
+      const artifacts = await dbService.listCachedArtifacts();
+      let totalBytes = artifacts.reduce((sum, artifact) => sum + (artifact.sizeBytes || 0), 0);
+
+      for (const artifact of artifacts) {
+        if (totalBytes <= this.maxBytes) {
+          break;
+        }
+        await dbService.deleteCachedArtifact(artifact._id);
+        this.etags.delete(artifact.fileName);
+        await fs.rm(artifact.path, { force: true }).catch(() => {});
+        totalBytes -= artifact.sizeBytes || 0;
+        console.log(`🧹 Evicted cached artifact ${artifact.fileName}`);
+      }
+    })();
+
+    try {
+      await this.evicting;
+    } catch (error) {
+      console.error('❌ Error evicting artifact cache:', error);
+    } finally {
+      this.evicting = null;
+    }
+  }
+}
+
+// Create singleton instance
+const artifactCache = new ArtifactCache();
+
+export default artifactCache;
@@ -0,0 +1,372 @@
+// Android binary XML (AXML) editor
+// Adds or overrides attributes on an element of a compiled XML document such
+// as a binary AndroidManifest.xml. Attributes are matched by resource ID, new
+// attribute names are inserted into the resource-mapped part of the string
+// pool, and only the affected chunk sizes are rewritten.
+
+import { StringPool, RES_STRING_POOL_TYPE, shiftIndex } from './string-pool.js';
+
+const RES_XML_TYPE = 0x0003;
+const RES_XML_START_NAMESPACE_TYPE = 0x0100;
+const RES_XML_END_NAMESPACE_TYPE = 0x0101;
+const RES_XML_START_ELEMENT_TYPE = 0x0102;
+const RES_XML_END_ELEMENT_TYPE = 0x0103;
+const RES_XML_CDATA_TYPE = 0x0104;
+const RES_XML_RESOURCE_MAP_TYPE = 0x0180;
+
+const ATTRIBUTE_EXT_SIZE = 20;
+const ATTRIBUTE_SIZE = 20;
+const NO_ENTRY = 0xffffffff;
+
+export const ANDROID_NAMESPACE = 'http://schemas.android.com/apk/res/android';
+
+// Res_value data types
+export const TYPE_REFERENCE = 0x01;
+export const TYPE_STRING = 0x03;
+export const TYPE_INT_BOOLEAN = 0x12;
+
+export function isBinaryXml(buffer) {
+  return buffer.length >= 8 && buffer.readUInt16LE(0) === RES_XML_TYPE && buffer.readUInt16LE(2) === 8;
+}
+
+function readChunks(buffer, start, end) {
+  const chunks = [];
+  for (let offset = start; offset < end;) {
+    const type = buffer.readUInt16LE(offset);
+    const size = buffer.readUInt32LE(offset + 4);
+    if (size < 8 || offset + size > end) {
+      throw new Error('Invalid binary XML: corrupt chunk size');
+    }
+    chunks.push({ type, data: buffer.subarray(offset, offset + size) });
+    offset += size;
+  }
+  return chunks;
+}
+
+// Rewrites every string reference in a node chunk after strings were inserted
+function shiftNodeReferences(chunk, index, count) {
+  const data = Buffer.from(chunk.data);
+  const shift = (offset) => data.writeUInt32LE(shiftIndex(data.readUInt32LE(offset), index, count), offset);
+  const headerSize = data.readUInt16LE(2);
+
+  shift(12); // comment
+  if (chunk.type === RES_XML_START_NAMESPACE_TYPE || chunk.type === RES_XML_END_NAMESPACE_TYPE ||
+      chunk.type === RES_XML_END_ELEMENT_TYPE) {
+    shift(headerSize);
+    shift(headerSize + 4);
+  } else if (chunk.type === RES_XML_START_ELEMENT_TYPE) {
+    shift(headerSize);
+    shift(headerSize + 4);
+    const attributeStart = data.readUInt16LE(headerSize + 8);
+    const attributeSize = data.readUInt16LE(headerSize + 10);
+    const attributeCount = data.readUInt16LE(headerSize + 12);
+    for (let i = 0; i < attributeCount; i++) {
+      const offset = headerSize + attributeStart + i * attributeSize;
+      shift(offset);
+      shift(offset + 4);
+      shift(offset + 8);
+      if (data[offset + 15] === TYPE_STRING) {
+        shift(offset + 16);
+      }
+    }
+  } else if (chunk.type === RES_XML_CDATA_TYPE) {
+    shift(headerSize);
+    if (data[headerSize + 7] === TYPE_STRING) {
+      shift(headerSize + 8);
+    }
+  }
+
+  return { type: chunk.type, data };
+}
+
+function readAttributes(data) {
+  const headerSize = data.readUInt16LE(2);
+  const attributeStart = data.readUInt16LE(headerSize + 8);
+  const attributeSize = data.readUInt16LE(headerSize + 10);
+  const attributeCount = data.readUInt16LE(headerSize + 12);
+
+  return Array.from({ length: attributeCount }, (_, i) => {
+    const offset = headerSize + attributeStart + i * attributeSize;
+    return {
+      namespace: data.readUInt32LE(offset),
+      name: data.readUInt32LE(offset + 4),
+      rawValue: data.readUInt32LE(offset + 8),
+      dataType: data[offset + 15],
+      data: data.readUInt32LE(offset + 16),
+      extra: data.subarray(offset + ATTRIBUTE_SIZE, offset + attributeSize)
+    };
+  });
+}
+
+function writeStartElement(data, attributes) {
+  const headerSize = data.readUInt16LE(2);
+  const attributeStart = data.readUInt16LE(headerSize + 8);
+  const attributeSize = data.readUInt16LE(headerSize + 10);
+  const prefix = data.subarray(0, headerSize + attributeStart);
+  const suffix = data.subarray(headerSize + attributeStart + readAttributes(data).length * attributeSize);
+
+  const body = attributes.map((attribute) => {
+    const buffer = Buffer.alloc(attributeSize);
+    buffer.writeUInt32LE(attribute.namespace, 0);
+    buffer.writeUInt32LE(attribute.name, 4);
+    buffer.writeUInt32LE(attribute.rawValue, 8);
+    buffer.writeUInt16LE(8, 12);
+    buffer[15] = attribute.dataType;
+    buffer.writeUInt32LE(attribute.data, 16);
+    if (attribute.extra && attribute.extra.length) {
+      attribute.extra.copy(buffer, ATTRIBUTE_SIZE);
+    }
+    return buffer;
+  });
+
+  const element = Buffer.concat([prefix, ...body, suffix]);
+  element.writeUInt32LE(element.length, 4);
+  element.writeUInt16LE(attributes.length, headerSize + 12);
+  return element;
+}
+
+/**
+ * Sets attributes on the first element named `elementName` of a binary XML
+ * document. Each edit is { name, resourceId, dataType, data, overwrite }:
+ * missing attributes are added, existing ones are only changed when
+ * `overwrite` is true. Returns { buffer, applied } where applied lists the
+ * names that were added or changed; buffer is null when nothing changed.
+ */
+export function setElementAttributes(buffer, elementName, edits) {
+  if (!isBinaryXml(buffer)) {
+    throw new Error('Not a binary XML document');
+  }
+
+  const chunks = readChunks(buffer, 8, buffer.readUInt32LE(4));
+  const poolIndex = chunks.findIndex(chunk => chunk.type === RES_STRING_POOL_TYPE);
+  if (poolIndex === -1) {
+    throw new Error('Invalid binary XML: missing string pool');
+  }
+  const pool = StringPool.parse(chunks[poolIndex].data);
+
+  const mapIndex = chunks.findIndex(chunk => chunk.type === RES_XML_RESOURCE_MAP_TYPE);
+  const resourceIds = [];
+  if (mapIndex !== -1) {
+    const map = chunks[mapIndex].data;
+    for (let offset = map.readUInt16LE(2); offset < map.length; offset += 4) {
+      resourceIds.push(map.readUInt32LE(offset));
+    }
+  }
+
+  const elementNameIndex = pool.indexOf(elementName);
+  const element = chunks.find(chunk => (
+    chunk.type === RES_XML_START_ELEMENT_TYPE &&
+    chunk.data.readUInt32LE(chunk.data.readUInt16LE(2) + 4) === elementNameIndex
+  ));
+  if (elementNameIndex === -1 || !element) {
+    throw new Error(`Element <${elementName}> not found`);
+  }
+
+  const namespaceIndex = pool.indexOf(ANDROID_NAMESPACE);
+  if (namespaceIndex === -1) {
+    throw new Error('Android namespace not declared');
+  }
+
+  const attributes = readAttributes(element.data);
+  const applied = [];
+  const missing = [];
+
+  for (const edit of edits) {
+    const existing = attributes.find(attribute => resourceIds[attribute.name] === edit.resourceId);
+    if (!existing) {
+      missing.push(edit);
+    } else if (edit.overwrite && (existing.dataType !== edit.dataType || existing.data !== edit.data)) {
+      Object.assign(existing, { rawValue: NO_ENTRY, dataType: edit.dataType, data: edit.data });
+      applied.push(edit.name);
+    }
+  }
+
+  if (missing.length === 0 && applied.length === 0) {
+    return { buffer: null, applied };
+  }
+
+  // Names of resource attributes must sit in the resource-mapped prefix of the pool,
+  // so they are inserted right after it and later strings shift up
+  const insertAt = resourceIds.length;
+  let shiftedChunks = chunks;
+  if (missing.length > 0) {
+    if (insertAt > pool.length) {
+      throw new Error('Invalid binary XML: resource map longer than string pool');
+    }
+    pool.insert(insertAt, missing.map(edit => edit.name));
+    resourceIds.push(...missing.map(edit => edit.resourceId));
+    shiftedChunks = chunks.map(chunk => (
+      chunk.type >= RES_XML_START_NAMESPACE_TYPE && chunk.type <= RES_XML_CDATA_TYPE
+        ? shiftNodeReferences(chunk, insertAt, missing.length)
+        : chunk
+    ));
+
+    for (const attribute of attributes) {
+      attribute.namespace = shiftIndex(attribute.namespace, insertAt, missing.length);
+      attribute.name = shiftIndex(attribute.name, insertAt, missing.length);
+      attribute.rawValue = shiftIndex(attribute.rawValue, insertAt, missing.length);
+      if (attribute.dataType === TYPE_STRING) {
+        attribute.data = shiftIndex(attribute.data, insertAt, missing.length);
+      }
+    }
+
+    missing.forEach((edit, i) => {
+      attributes.push({
+        namespace: shiftIndex(namespaceIndex, insertAt, missing.length),
+        name: insertAt + i,
+        rawValue: NO_ENTRY,
+        dataType: edit.dataType,
+        data: edit.data
+      });
+      applied.push(edit.name);
+    });
+  }
+
+  // The framework expects attributes with resource IDs first, in ascending ID order
+  const order = new Map(attributes.map((attribute, i) => [attribute, i]));
+  const idOf = attribute => resourceIds[attribute.name] || 0;
+  attributes.sort((a, b) => {
+    if (idOf(a) && idOf(b)) {
+      return idOf(a) - idOf(b);
+    }
+    return idOf(a) ? -1 : idOf(b) ? 1 : order.get(a) - order.get(b);
+  });
+
+  const elementPosition = chunks.indexOf(element);
+  const elementChunk = shiftedChunks[elementPosition];
+  const newElement = writeStartElement(elementChunk.data, attributes);
+
+  // id/class/style attribute indices are 1-based positions into the attribute list
+  const headerSize = newElement.readUInt16LE(2);
+  for (const field of [14, 16, 18]) {
+    const position = newElement.readUInt16LE(headerSize + field);
+    if (position > 0) {
+      const moved = attributes.findIndex(attribute => order.get(attribute) === position - 1);
+      newElement.writeUInt16LE(moved + 1, headerSize + field);
+    }
+  }
+
+  const resourceMap = Buffer.alloc(8 + resourceIds.length * 4);
+  resourceMap.writeUInt16LE(RES_XML_RESOURCE_MAP_TYPE, 0);
+  resourceMap.writeUInt16LE(8, 2);
+  resourceMap.writeUInt32LE(resourceMap.length, 4);
+  resourceIds.forEach((id, i) => resourceMap.writeUInt32LE(id, 8 + i * 4));
+
+  const output = shiftedChunks.map((chunk, i) => {
+    if (i === poolIndex) return pool.toBuffer();
+    if (i === mapIndex) return resourceMap;
+    if (i === elementPosition) return newElement;
+    return chunk.data;
+  });
+  if (mapIndex === -1) {
+    output.splice(poolIndex + 1, 0, resourceMap);
+  }
+
+  const header = Buffer.alloc(8);
+  header.writeUInt16LE(RES_XML_TYPE, 0);
+  header.writeUInt16LE(8, 2);
+  const document = Buffer.concat([header, ...output]);
+  document.writeUInt32LE(document.length, 4);
+
+  return { buffer: document, applied };
+}
+
+const XML_TOKEN = /<\?[\s\S]*?\?>|<!--[\s\S]*?-->|<\/([\w:.-]+)\s*>|<([\w:.-]+)((?:\s+[\w:.-]+\s*=\s*"[^"]*")*)\s*(\/?)>|([^<]+)/g;
+const XML_ATTRIBUTE = /([\w:.-]+)\s*=\s*"([^"]*)"/g;
+
+function unescapeXml(text) {
+  return text.replace(/&(lt|gt|amp|quot|apos);/g, (match, name) => ({ lt: '<', gt: '>', amp: '&', quot: '"', apos: "'" })[name]);
+}
+
+function writeNode(type, lineNumber, ext) {
+  const node = Buffer.alloc(16 + ext.length);
+  node.writeUInt16LE(type, 0);
+  node.writeUInt16LE(16, 2);
+  node.writeUInt32LE(node.length, 4);
+  node.writeUInt32LE(lineNumber, 8);
+  node.writeUInt32LE(NO_ENTRY, 12);
+  ext.copy(node, 16);
+  return node;
+}
+
+/**
+ * Compiles a small namespace-free XML document (such as a network security
+ * config) to binary XML, the way aapt2 would for a res/xml file. "true" and
+ * "false" attribute values are typed as booleans, everything else as strings.
+ */
+export function compileXml(text) {
+  const strings = [];
+  const stringIndex = new Map();
+  const intern = (value) => {
+    if (!stringIndex.has(value)) {
+      stringIndex.set(value, strings.length);
+      strings.push(value);
+    }
+    return stringIndex.get(value);
+  };
+
+  const nodes = [];
+  const open = [];
+  let lineNumber = 1;
+  for (const match of text.matchAll(XML_TOKEN)) {
+    const [token, closing, name, rawAttributes, selfClosing, content] = match;
+    if (closing) {
+      if (open.pop() !== closing) {
+        throw new Error(`Mismatched closing tag </${closing}>`);
+      }
+      const ext = Buffer.alloc(8);
+      ext.writeUInt32LE(NO_ENTRY, 0);
+      ext.writeUInt32LE(intern(closing), 4);
+      nodes.push(writeNode(RES_XML_END_ELEMENT_TYPE, lineNumber, ext));
+    } else if (name) {
+      const attributes = [...rawAttributes.matchAll(XML_ATTRIBUTE)];
+      const ext = Buffer.alloc(ATTRIBUTE_EXT_SIZE + attributes.length * ATTRIBUTE_SIZE);
+      ext.writeUInt32LE(NO_ENTRY, 0);
+      ext.writeUInt32LE(intern(name), 4);
+      ext.writeUInt16LE(ATTRIBUTE_EXT_SIZE, 8);
+      ext.writeUInt16LE(ATTRIBUTE_SIZE, 10);
+      ext.writeUInt16LE(attributes.length, 12);
+      attributes.forEach(([, attributeName, rawValue], i) => {
+        const offset = ATTRIBUTE_EXT_SIZE + i * ATTRIBUTE_SIZE;
+        const value = unescapeXml(rawValue);
+        const isBoolean = value === 'true' || value === 'false';
+        ext.writeUInt32LE(NO_ENTRY, offset);
+        ext.writeUInt32LE(intern(attributeName), offset + 4);
+        ext.writeUInt32LE(intern(value), offset + 8);
+        ext.writeUInt16LE(8, offset + 12);
+        ext[offset + 15] = isBoolean ? TYPE_INT_BOOLEAN : TYPE_STRING;
+        ext.writeUInt32LE(isBoolean ? (value === 'true' ? 0xffffffff : 0) : intern(value), offset + 16);
+      });
+      nodes.push(writeNode(RES_XML_START_ELEMENT_TYPE, lineNumber, ext));
+      open.push(name);
+
+      if (selfClosing) {
+        const end = Buffer.alloc(8);
+        end.writeUInt32LE(NO_ENTRY, 0);
+        end.writeUInt32LE(intern(name), 4);
+        nodes.push(writeNode(RES_XML_END_ELEMENT_TYPE, lineNumber, end));
+        open.pop();
+      }
+    } else if (content && content.trim() && open.length > 0) {
+      const ext = Buffer.alloc(12);
+      ext.writeUInt32LE(intern(unescapeXml(content.trim())), 0);
+      ext.writeUInt16LE(8, 4);
+      nodes.push(writeNode(RES_XML_CDATA_TYPE, lineNumber, ext));
+    }
+    lineNumber += (token.match(/\n/g) || []).length;
+  }
+
+  if (open.length > 0) {
+    throw new Error(`Unclosed element <${open[open.length - 1]}>`);
+  }
+
+  const pool = new StringPool({ flags: 0, stringOffsets: [], styleOffsets: [], stringData: Buffer.alloc(0), styleData: Buffer.alloc(0) });
+  pool.append(strings);
+
+  const header = Buffer.alloc(8);
+  header.writeUInt16LE(RES_XML_TYPE, 0);
+  header.writeUInt16LE(8, 2);
+  const document = Buffer.concat([header, pool.toBuffer(), ...nodes]);
+  document.writeUInt32LE(document.length, 4);
+  return document;
+}
@@ -0,0 +1,119 @@
+// Background connection supervisor for the database
+// Connection attempts run off the request path and are retried with
+// exponential backoff and full jitter. A circuit breaker decides where
+// operations go: closed routes them to MongoDB, open sends them straight to
+// the in-memory fallback while the database is unreachable, and half-open is
+// a reconnect attempt in progress. Closing the breaker again runs onClose
+// (index setup, fallback resync) before traffic returns to MongoDB.
+
+export const CircuitState = {
+  CLOSED: 'closed',
+  OPEN: 'open',
+  HALF_OPEN: 'half-open'
+};
+
+export class ConnectionSupervisor {
+  constructor({ connect, onClose, onOpen, baseDelayMs = 1000, maxDelayMs = 60000, failureThreshold = 2 }) {
+    this.connect = connect;
+    this.onClose = onClose;
+    this.onOpen = onOpen;
+    this.baseDelayMs = baseDelayMs;
+    this.maxDelayMs = maxDelayMs;
+    this.failureThreshold = failureThreshold;
+    this.state = CircuitState.OPEN;
+    this.attempts = 0; // Failed attempts since the breaker last closed
+    this.consecutiveFailures = 0;
+    this.lastError = null;
+    this.nextAttemptAt = null;
+    this.timer = null;
+    this.pending = null;
+  }
+
+  // Runs the first attempt; later attempts are scheduled in the background
+  start() {
+    if (!this.pending && this.state === CircuitState.OPEN && !this.timer) {
+      this.pending = this.tryConnect();
+    }
+    return this.pending || Promise.resolve();
+  }
+
+  async tryConnect() {
+    this.state = CircuitState.HALF_OPEN;
+    this.nextAttemptAt = null;
+
+    try {
+      await this.connect();
+      await this.onClose();
+      this.state = CircuitState.CLOSED;
+      this.attempts = 0;
+      this.consecutiveFailures = 0;
+      this.lastError = null;
+    } catch (error) {
+      this.state = CircuitState.OPEN;
+      this.lastError = error;
+      this.attempts++;
+      this.scheduleRetry();
+    } finally {
+      this.pending = null;
+    }
+  }
+
+  scheduleRetry() {
+    // Full jitter: uniform in [0, min(max, base * 2^(attempts - 1))]
+    const ceiling = Math.min(this.maxDelayMs, this.baseDelayMs * 2 ** Math.max(0, this.attempts - 1));
+    const delay = Math.round(Math.random() * ceiling);
+    console.log(`🔄 Reconnecting to MongoDB in ${delay}ms (attempt ${this.attempts + 1})`);
+
+    this.nextAttemptAt = new Date(Date.now() + delay);
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      this.pending = this.tryConnect();
+    }, delay);
+    this.timer.unref();
+  }
+
+  // A failed heartbeat, or an operation that failed to reach the server; enough
+  // of them without a successful heartbeat in between open the breaker
+  recordFailure(error) {
+    if (this.state !== CircuitState.CLOSED) {
+      return;
+    }
+    this.consecutiveFailures++;
+    if (this.consecutiveFailures >= this.failureThreshold) {
+      this.trip(error);
+    }
+  }
+
+  recordSuccess() {
+    if (this.state === CircuitState.CLOSED) {
+      this.consecutiveFailures = 0;
+    }
+  }
+
+  // Opens the breaker immediately (connection closed, failure threshold reached)
+  trip(error) {
+    if (this.state !== CircuitState.CLOSED) {
+      return;
+    }
+    this.state = CircuitState.OPEN;
+    this.lastError = error;
+    this.attempts = 1;
+    this.onOpen(error);
+    this.scheduleRetry();
+  }
+
+  getState() {
+    return {
+      state: this.state,
+      consecutiveFailures: this.consecutiveFailures,
+      failedAttempts: this.attempts,
+      nextAttemptAt: this.nextAttemptAt ? this.nextAttemptAt.toISOString() : null,
+      lastError: this.lastError ? this.lastError.message : null
+    };
+  }
+
+  stop() {
+    clearTimeout(this.timer);
+    this.timer = null;
+  }
+}
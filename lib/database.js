@@ -5,98 +5,147 @@
 // Handles job storage and retrieval using MongoDB Atlas cluster
 
 import { MongoClient, ServerApiVersion } from 'mongodb';
+import jobEvents from './job-events.js';
+import { EmbeddedMongoClient, matchesFilter } from './embedded-mongo.js';
+import { ConnectionSupervisor, CircuitState } from './connection-supervisor.js';
+
+// Upper bound on log entries returned by one cursor read
+const MAX_LOG_PAGE = 1000;
+const DEFAULT_JOB_TTL_HOURS = 24;
+const JOB_COUNTERS_ID = 'status';
+const JOB_STATUSES = ['queued', 'processing', 'completed', 'error'];
+const ROLLUP_RETENTION_SECONDS = 7 * 24 * 3600; // Per-minute throughput rollups kept for a week
+const DEFAULT_COUNTER_RECONCILE_MS = 60 * 60 * 1000;
+const COUNTER_RECONCILE_ATTEMPTS = 3;
+const JOB_WRITE_ATTEMPTS = 3; // Tries per buffered job update before it is kept in memory
+const CONNECT_TIMEOUT_MS = 15000;
+
+// Driver errors raised when the server cannot be reached, as opposed to a failed command
+const CONNECTIVITY_ERRORS = new Set([
+  'MongoNetworkError',
+  'MongoNetworkTimeoutError',
+  'MongoServerSelectionError',
+  'MongoTopologyClosedError',
+  'MongoNotConnectedError'
+]);
+
+// Log entries are stored as { seq, time, message } in job_logs, one document per line
+// keyed by (jobId, seq); older jobs kept them inline in jobs.logs, some as plain strings
+export function formatLogEntry(entry) {
+  return typeof entry === 'string' ? entry : `${entry.time}: ${entry.message}`;
+}
 
 class DatabaseService {
   constructor() {
     this.client = null;
     this.db = null;
     this.isConnected = false;
-    this.connectionAttempts = 0;
-    this.maxConnectionAttempts = 3;
+    this.pool = null; // Connection pool counters from driver events
+    this.backend = (process.env.DB_BACKEND || 'mongodb').toLowerCase(); // mongodb | embedded | memory
+    this.supervisor = null; // Reconnects in the background; see connect()
+    this.indexesEnsured = false;
     this.inMemoryJobs = new Map(); // Initialize in-memory fallback
+    this.inMemoryArtifacts = new Map(); // In-memory fallback for the artifact cache index
+    this.inMemoryRollups = new Map(); // In-memory fallback for per-minute throughput rollups
+    this.pendingJobWrites = new Map(); // Write-behind buffer of progress/log updates per job
+    this.inFlightJobWrites = new Map(); // Flushed updates per job whose write has not landed yet
+    this.logSeqs = new Map(); // Next log sequence number per job processed here
+    this.jobWriteChains = new Map(); // Per-job flush promises, keeps writes ordered
+    this.logFlushIntervalMs = parseInt(process.env.LOG_FLUSH_INTERVAL_MS, 10) || 250;
+    this.logFlushMaxEntries = parseInt(process.env.LOG_FLUSH_MAX_ENTRIES, 10) || 20;
+    this.jobTtlSeconds = Math.round((parseFloat(process.env.JOB_TTL_HOURS) || DEFAULT_JOB_TTL_HOURS) * 3600);
+    this.counterReconcileMs = parseInt(process.env.JOB_COUNTER_RECONCILE_MS, 10) || DEFAULT_COUNTER_RECONCILE_MS;
+    this.counterReconcileTimer = null;
   }
 
+  // Starts the connection supervisor and resolves once its first attempt has
+  // finished. Until the circuit closes, operations use the in-memory fallback;
+  // failed attempts are retried in the background, never on a request path.
   async connect() {
     if (this.isConnected && this.db) {
       return this.db;
     }
 
-    if (this.connectionAttempts >= this.maxConnectionAttempts) {
-      console.log('🔄 Max connection attempts reached, using in-memory storage');
+    if (this.backend === 'mongodb' && !process.env.MONGO_URL) {
+      console.error('❌ MONGO_URL not found in environment variables');
+      this.backend = 'memory'; // No database configured, rather than one that is down
+    }
+
+    if (this.backend === 'memory') {
       this.useInMemoryFallback();
       return null;
     }
 
-    this.connectionAttempts++;
-    
+    if (!this.supervisor) {
+      this.supervisor = new ConnectionSupervisor({
+        connect: () => (this.backend === 'embedded' ? this.openEmbeddedClient() : this.openMongoClient()),
+        onClose: () => this.handleCircuitClosed(),
+        onOpen: (error) => this.handleCircuitOpen(error),
+        baseDelayMs: parseInt(process.env.DB_RECONNECT_BASE_MS, 10) || 1000,
+        maxDelayMs: parseInt(process.env.DB_RECONNECT_MAX_MS, 10) || 60000,
+        failureThreshold: parseInt(process.env.DB_BREAKER_FAILURE_THRESHOLD, 10) || 2
+      });
+    }
+
+    await this.supervisor.start();
+    return this.isConnected ? this.db : null;
+  }
+
+  // One connection attempt; replaces any client left from a previous attempt
+  async openMongoClient() {
+    const mongoUrl = process.env.MONGO_URL;
+    const dbName = process.env.DB_NAME || 'apk_converter';
+
+    if (this.client) {
+      const previous = this.client;
+      this.client = null;
+      await previous.close().catch(() => {});
+    }
+
+    console.log('🔌 Connecting to MongoDB Atlas:');
+    console.log(`   Database: ${dbName}`);
+    console.log(`   Connection: ${mongoUrl.replace(/:[^:@]*@/, ':***@')}`);
+
+    // MongoDB Atlas connection options optimized for cloud environments. Server
+    // selection fails fast so an outage falls back to memory instead of stalling
+    // requests; heartbeats, and operations failing on network errors, feed the
+    // circuit breaker.
+    const options = {
+      serverApi: {
+        version: ServerApiVersion.v1,
+        strict: true,
+        deprecationErrors: true,
+      },
+      serverSelectionTimeoutMS: 5000,
+      heartbeatFrequencyMS: 5000,
+      connectTimeoutMS: 30000,
+      socketTimeoutMS: 30000,
+      maxPoolSize: 10,
+      minPoolSize: 2,
+      retryWrites: true,
+      w: 'majority'
+    };
+
+    const client = new MongoClient(mongoUrl, options);
+    this.client = client;
+    this.trackConnectionPool(client, options.maxPoolSize);
+
     try {
-      const mongoUrl = process.env.MONGO_URL;
-      const dbName = process.env.DB_NAME || 'apk_converter';
-      
-      if (!mongoUrl) {
-        console.error('❌ MONGO_URL not found in environment variables');
-        this.useInMemoryFallback();
-        return null;
-      }
-      
-      console.log(`🔌 Connecting to MongoDB Atlas (attempt ${this.connectionAttempts}/${this.maxConnectionAttempts}):`);
-      console.log(`   Database: ${dbName}`);
-      console.log(`   Connection: ${mongoUrl.replace(/:[^:@]*@/, ':***@')}`);
-      
-      // MongoDB Atlas connection options optimized for cloud environments
-      const options = {
-        serverApi: {
-          version: ServerApiVersion.v1,
-          strict: true,
-          deprecationErrors: true,
-        },
-        serverSelectionTimeoutMS: 30000, // 30 second timeout
-        connectTimeoutMS: 30000,
-        socketTimeoutMS: 30000,
-        maxPoolSize: 10,
-        minPoolSize: 2,
-        retryWrites: true,
-        w: 'majority'
-      };
-      
-      this.client = new MongoClient(mongoUrl, options);
-      
       // Connect with timeout
-      const connectPromise = this.client.connect();
+      let timer;
       const timeoutPromise = new Promise((_, reject) => {
-        setTimeout(() => reject(new Error('Connection timeout after 15 seconds')), 15000);
+        timer = setTimeout(() => reject(new Error(`Connection timeout after ${CONNECT_TIMEOUT_MS / 1000} seconds`)), CONNECT_TIMEOUT_MS);
       });
-      
-      await Promise.race([connectPromise, timeoutPromise]);
-      
-      this.db = this.client.db(dbName);
-      
+      await Promise.race([client.connect(), timeoutPromise]).finally(() => clearTimeout(timer));
+
       // Test the connection with a simple operation
       console.log('🔍 Testing MongoDB Atlas connection...');
-      await this.db.admin().ping();
-      
+      const db = client.db(dbName);
+      await db.admin().ping();
+
       // Test collection access
-      const collection = this.db.collection('jobs');
-      await collection.findOne({}, { limit: 1 });
-      
-      this.isConnected = true;
-      this.connectionAttempts = 0; // Reset on successful connection
-      
-      console.log('✅ Successfully connected to MongoDB Atlas');
-      console.log('✅ Database connection test passed');
-      
-      // Set up connection event listeners
-      this.client.on('error', (error) => {
-        console.error('❌ MongoDB connection error:', error);
-        this.isConnected = false;
-      });
-      
-      this.client.on('close', () => {
-        console.log('🔌 MongoDB connection closed');
-        this.isConnected = false;
-      });
-      
-      return this.db;
+      await db.collection('jobs').findOne({}, { limit: 1 });
+      this.db = db;
     } catch (error) {
       console.error('❌ MongoDB Atlas connection failed:', error.message);
       console.error('❌ Error details:', {
@@ -104,19 +153,166 @@ class DatabaseService {
         code: error.code,
         codeName: error.codeName
       });
-      
-      if (this.connectionAttempts < this.maxConnectionAttempts) {
-        console.log(`🔄 Retrying connection in 2 seconds... (${this.connectionAttempts}/${this.maxConnectionAttempts})`);
-        await new Promise(resolve => setTimeout(resolve, 2000));
-        return this.connect();
+      throw error;
+    }
+
+    // Connection event listeners; events from replaced clients are ignored
+    client.on('serverHeartbeatFailed', (event) => {
+      if (client === this.client) {
+        this.supervisor.recordFailure(event.failure);
+      }
+    });
+
+    client.on('serverHeartbeatSucceeded', () => {
+      if (client === this.client) {
+        this.supervisor.recordSuccess();
+      }
+    });
+
+    client.on('error', (error) => {
+      console.error('❌ MongoDB connection error:', error);
+      if (client === this.client) {
+        this.supervisor.trip(error);
+      }
+    });
+
+    client.on('close', () => {
+      console.log('🔌 MongoDB connection closed');
+      if (client === this.client) {
+        this.supervisor.trip(new Error('MongoDB connection closed'));
+      }
+    });
+  }
+
+  // Runs before traffic is routed back to MongoDB
+  async handleCircuitClosed() {
+    if (!this.indexesEnsured) {
+      await this.ensureIndexes();
+      this.indexesEnsured = true;
+    }
+
+    // Copy what the fallback holds while requests still write there, then switch
+    // over and copy whatever arrived during the first pass
+    await this.resyncFallbackStore();
+    this.isConnected = true;
+    await this.resyncFallbackStore().catch((error) => {
+      console.error('❌ Error resyncing in-memory jobs:', error);
+    });
+    await this.scheduleCounterReconcile();
+
+    console.log(this.backend === 'embedded' ? '✅ Embedded MongoDB backend ready' : '✅ Successfully connected to MongoDB Atlas');
+  }
+
+  // Copies jobs, log lines, cached artifacts and rollups that were written to the
+  // in-memory fallback while MongoDB was unreachable, then drops them from memory.
+  // Jobs that existed in MongoDB before the outage only hold the fields changed
+  // since (partial), so they are merged with $set instead of replaced.
+  async resyncFallbackStore() {
+    const jobs = this.db.collection('jobs');
+    let resynced = 0;
+
+    for (const job of Array.from(this.inMemoryJobs.values())) {
+      const { _id: jobId, logs = [], partial, ...fields } = job;
+      const updatedAt = job.updatedAt;
+      if (partial) {
+        await jobs.updateOne({ _id: jobId }, { $set: fields });
       } else {
-        console.error('❌ All connection attempts failed, falling back to in-memory storage');
-        this.useInMemoryFallback();
-        return null;
+        await jobs.replaceOne({ _id: jobId }, { _id: jobId, ...fields }, { upsert: true });
       }
+      await this.insertJobLogs(jobId, logs.filter(entry => typeof entry !== 'string'));
+
+      // Entries updated meanwhile are picked up by the next pass
+      if (this.inMemoryJobs.get(jobId) === job && job.updatedAt === updatedAt) {
+        this.inMemoryJobs.delete(jobId);
+      }
+      resynced++;
+    }
+
+    for (const [cacheKey, artifact] of Array.from(this.inMemoryArtifacts.entries())) {
+      await this.db.collection('artifact_cache').replaceOne({ _id: cacheKey }, artifact, { upsert: true });
+      this.inMemoryArtifacts.delete(cacheKey);
+    }
+
+    for (const [key, { _id, minute, ...counts }] of Array.from(this.inMemoryRollups.entries())) {
+      this.inMemoryRollups.delete(key);
+      await this.db.collection('job_rollups').updateOne(
+        { _id },
+        { $inc: counts, $setOnInsert: { minute } },
+        { upsert: true }
+      );
+    }
+
+    if (resynced > 0) {
+      console.log(`🔄 Resynced ${resynced} jobs written to in-memory storage during the outage`);
+    }
+  }
+
+  // Operation errors that mean MongoDB is unreachable count towards opening the
+  // breaker like failed heartbeats do; other errors (duplicate keys, rejected
+  // writes) say nothing about connectivity and are left out
+  recordOperationError(error) {
+    if (this.supervisor && CONNECTIVITY_ERRORS.has(error && error.name)) {
+      this.supervisor.recordFailure(error);
     }
   }
 
+  handleCircuitOpen(error) {
+    this.isConnected = false;
+    console.error(`❌ MongoDB unreachable (${error ? error.message : 'unknown error'}), using in-memory storage until it recovers`);
+  }
+
+  getConnectionState() {
+    if (!this.supervisor) {
+      return { state: this.backend === 'memory' ? 'disabled' : CircuitState.OPEN };
+    }
+    return this.supervisor.getState();
+  }
+
+  // Follows the driver's connection pool events so readiness can report pool
+  // state without a round trip
+  trackConnectionPool(client, maxPoolSize) {
+    const pool = { open: 0, inUse: 0, waiting: 0, maxPoolSize };
+    const decrement = field => { pool[field] = Math.max(0, pool[field] - 1); };
+    this.pool = pool;
+
+    client.on('connectionCreated', () => { pool.open++; });
+    client.on('connectionClosed', () => decrement('open'));
+    client.on('connectionCheckOutStarted', () => { pool.waiting++; });
+    client.on('connectionCheckOutFailed', () => decrement('waiting'));
+    client.on('connectionCheckedOut', () => {
+      decrement('waiting');
+      pool.inUse++;
+    });
+    client.on('connectionCheckedIn', () => decrement('inUse'));
+  }
+
+  getPoolStats() {
+    return this.pool ? { ...this.pool } : null;
+  }
+
+  // In-process MongoDB stand-in; DB_LATENCY_MS simulates the Atlas round trip
+  async openEmbeddedClient() {
+    const dbName = process.env.DB_NAME || 'apk_converter';
+    const latencyMs = parseFloat(process.env.DB_LATENCY_MS) || 0;
+    const jitterMs = parseFloat(process.env.DB_LATENCY_JITTER_MS) || 0;
+
+    console.log(`🔌 Using embedded MongoDB backend (latency ${latencyMs}ms ± ${jitterMs}ms):`);
+    console.log(`   Database: ${dbName}`);
+
+    const client = new EmbeddedMongoClient({ latencyMs, jitterMs });
+    await client.connect();
+    this.client = client;
+    this.db = client.db(dbName);
+    this.indexesEnsured = false; // Every embedded client starts with an empty database
+
+    client.on('close', () => {
+      console.log('🔌 Embedded MongoDB backend closed');
+      if (client === this.client) {
+        this.supervisor.trip(new Error('Embedded MongoDB backend closed'));
+      }
+    });
+  }
+
   async testConnection() {
     console.log('🧪 Testing MongoDB connection...');
     
@@ -172,13 +368,53 @@ class DatabaseService {
     }
   }
 
+  async ensureIndexes() {
+    try {
+      // Supports FIFO claiming and queue position lookups
+      await this.db.collection('jobs').createIndex({ status: 1, queuedAt: 1 });
+      // Lease sweeps for jobs whose instance stopped renewing them
+      await this.db.collection('jobs').createIndex({ status: 1, leaseExpiresAt: 1 });
+      // LRU eviction order for cached conversion outputs
+      await this.db.collection('artifact_cache').createIndex({ lastAccessedAt: 1 });
+      await this.db.collection('artifact_cache').createIndex({ fileName: 1 });
+      // Range reads of a job's log lines; unique so retried inserts cannot duplicate a line
+      await this.db.collection('job_logs').createIndex({ jobId: 1, seq: 1 }, { unique: true });
+      // Finished jobs and their log lines expire after JOB_TTL_HOURS; queued and
+      // processing jobs have no completedAt, so they never expire
+      await this.ensureTtlIndex('jobs', 'completedAt', this.jobTtlSeconds);
+      await this.ensureTtlIndex('job_logs', 'createdAt', this.jobTtlSeconds);
+      await this.ensureTtlIndex('job_rollups', 'minute', ROLLUP_RETENTION_SECONDS);
+    } catch (error) {
+      console.error('❌ Error creating job indexes:', error);
+    }
+  }
+
+  async ensureTtlIndex(collectionName, field, expireAfterSeconds) {
+    try {
+      await this.db.collection(collectionName).createIndex({ [field]: 1 }, { expireAfterSeconds });
+    } catch (error) {
+      // IndexOptionsConflict: the retention changed since the index was created
+      if (error.code !== 85) {
+        throw error;
+      }
+      await this.db.command({
+        collMod: collectionName,
+        index: { keyPattern: { [field]: 1 }, expireAfterSeconds }
+      });
+    }
+  }
+
   useInMemoryFallback() {
     console.log('🔄 Falling back to in-memory storage');
     this.inMemoryJobs = new Map();
     this.isConnected = false;
+    this.db = null;
   }
 
   async saveJob(jobId, jobData) {
+    this.logSeqs.set(jobId, (jobData.logs || []).length);
+    jobData = { ...jobData, logCount: (jobData.logs || []).length };
+
     if (!this.isConnected || !this.db) {
       // Use in-memory storage as fallback
       this.inMemoryJobs.set(jobId, {
@@ -187,25 +423,34 @@ class DatabaseService {
         createdAt: new Date(),
         updatedAt: new Date()
       });
+      await this.recordJobTransition(null, jobData.status);
       return;
     }
 
     try {
       const collection = this.db.collection('jobs');
+      const { logs = [], ...fields } = jobData;
       const jobDocument = {
         _id: jobId,
-        ...jobData,
+        ...fields,
         createdAt: new Date(),
         updatedAt: new Date()
       };
       
-      await collection.replaceOne(
-        { _id: jobId },
-        jobDocument,
-        { upsert: true }
-      );
+      const [saved] = await Promise.all([
+        collection.replaceOne(
+          { _id: jobId },
+          jobDocument,
+          { upsert: true }
+        ),
+        this.insertJobLogs(jobId, logs)
+      ]);
+      if (saved.upsertedCount === 1) {
+        await this.recordJobTransition(null, jobData.status);
+      }
     } catch (error) {
       console.error('❌ Error saving job to database:', error);
+      this.recordOperationError(error);
       // Fallback to in-memory
       this.inMemoryJobs.set(jobId, {
         ...jobData,
@@ -224,242 +469,933 @@ class DatabaseService {
 
     try {
       const collection = this.db.collection('jobs');
+      const unwritten = this.unwrittenJobWrites(jobId);
       const job = await collection.findOne({ _id: jobId });
-      return job;
+      return this.withPendingWrites(job, unwritten);
     } catch (error) {
       console.error('❌ Error retrieving job from database:', error);
+      this.recordOperationError(error);
       // Fallback to in-memory
       return this.inMemoryJobs.get(jobId) || null;
     }
   }
 
-  async updateJobProgress(jobId, progress, currentStep, logs = []) {
+  // Reads a job for status polling. With includeLogs, only log entries with
+  // seq >= since are read (a range read on job_logs); without it logs are skipped.
+  async getJobStatus(jobId, { since = 0, includeLogs = true } = {}) {
     if (!this.isConnected || !this.db) {
       // Use in-memory storage as fallback
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.progress = progress;
-        job.currentStep = currentStep;
-        job.logs = [...(job.logs || []), ...logs];
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      return this.sliceJobLogs(this.inMemoryJobs.get(jobId) || null, since, includeLogs);
+    }
+
+    try {
+      const collection = this.db.collection('jobs');
+      const unwritten = this.unwrittenJobWrites(jobId);
+      if (!includeLogs) {
+        const job = await collection.findOne({ _id: jobId }, { projection: { logs: 0 } });
+        return this.sliceJobLogs(this.withPendingWrites(job, unwritten), since, false);
       }
+
+      // Jobs stored before job_logs existed keep their lines inline, hence the $slice
+      const [job, logs] = await Promise.all([
+        collection.findOne({ _id: jobId }, { projection: { logs: { $slice: [since, MAX_LOG_PAGE] } } }),
+        this.readJobLogs(jobId, since)
+      ]);
+      if (!job) {
+        return null;
+      }
+      const stored = { ...job, logs: job.logs && job.logs.length > 0 ? job.logs : logs };
+      return this.sliceJobLogs(this.withPendingWrites(stored, unwritten), since, true, true);
+    } catch (error) {
+      console.error('❌ Error retrieving job status from database:', error);
+      this.recordOperationError(error);
+      // Fallback to in-memory
+      return this.sliceJobLogs(this.inMemoryJobs.get(jobId) || null, since, includeLogs);
+    }
+  }
+
+  // One page of a job's log lines with seq >= since, in order
+  async readJobLogs(jobId, since) {
+    return this.db.collection('job_logs')
+      .find({ jobId, seq: { $gte: since } }, { projection: { _id: 0, jobId: 0, createdAt: 0 } })
+      .sort({ seq: 1 })
+      .limit(MAX_LOG_PAGE)
+      .toArray();
+  }
+
+  // Appends log lines; a retried flush may resend lines that were already stored
+  async insertJobLogs(jobId, logs) {
+    if (logs.length === 0) {
       return;
     }
+    try {
+      await this.db.collection('job_logs').insertMany(
+        logs.map(entry => ({ jobId, ...entry, createdAt: new Date() })),
+        { ordered: false }
+      );
+    } catch (error) {
+      if (error.code !== 11000) {
+        throw error;
+      }
+    }
+  }
+
+  sliceJobLogs(job, since, includeLogs, alreadySliced = false) {
+    if (!job) {
+      return null;
+    }
+    if (!includeLogs) {
+      const { logs, ...rest } = job;
+      return rest;
+    }
+
+    // Only a gap-free run of lines starting at since is returned, so nextSeq never
+    // skips a line that was neither stored nor buffered when the job was read (a
+    // flush landing mid-read, or a partial in-memory job during an outage).
+    // Legacy inline lines are plain strings numbered by position.
+    const logs = [];
+    for (const [index, entry] of (job.logs || []).entries()) {
+      const seq = typeof entry === 'string' ? (alreadySliced ? since : 0) + index : entry.seq;
+      if (seq < since + logs.length) {
+        continue;
+      }
+      if (seq > since + logs.length || logs.length >= MAX_LOG_PAGE) {
+        break;
+      }
+      logs.push(entry);
+    }
+    return { ...job, logs, nextSeq: since + logs.length };
+  }
+
+  // Claims the oldest queued job this instance can run. Uploads live in the
+  // owner's local temp/, so only jobs it owns (or legacy jobs without an
+  // owner) are eligible; the lease is renewed by renewJobLeases while it runs.
+  async claimNextQueuedJob(owner, leaseMs) {
+    const job = await this.claimNextJobDocument(owner, new Date(Date.now() + leaseMs));
+    if (job) {
+      // This instance now writes the job's logs, so it continues the sequence
+      this.logSeqs.set(job._id, job.logCount || (job.logs || []).length);
+      await this.recordJobTransition('queued', 'processing');
+      jobEvents.publish(job._id, { type: 'status', status: 'processing' });
+    }
+    return job;
+  }
+
+  async claimNextJobDocument(owner, leaseExpiresAt) {
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      return this.claimNextInMemoryJob(owner, leaseExpiresAt);
+    }
 
     try {
       const collection = this.db.collection('jobs');
-      await collection.updateOne(
-        { _id: jobId },
+      const now = new Date();
+      return await collection.findOneAndUpdate(
+        { status: 'queued', owner: { $in: [owner, null] } },
         {
           $set: {
-            progress,
-            currentStep,
-            updatedAt: new Date()
-          },
-          $push: {
-            logs: { $each: logs }
+            status: 'processing',
+            startedAt: now,
+            updatedAt: now,
+            leaseExpiresAt
           }
-        }
+        },
+        { sort: { queuedAt: 1 }, returnDocument: 'after' }
       );
     } catch (error) {
-      console.error('❌ Error updating job progress:', error);
+      console.error('❌ Error claiming queued job:', error);
+      this.recordOperationError(error);
       // Fallback to in-memory
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.progress = progress;
-        job.currentStep = currentStep;
-        job.logs = [...(job.logs || []), ...logs];
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      return this.claimNextInMemoryJob(owner, leaseExpiresAt);
+    }
+  }
+
+  claimNextInMemoryJob(owner, leaseExpiresAt) {
+    let next = null;
+    for (const job of this.inMemoryJobs.values()) {
+      if (job.status === 'queued' && (!job.owner || job.owner === owner) &&
+          (!next || job.queuedAt < next.queuedAt)) {
+        next = job;
       }
     }
+
+    if (next) {
+      next.status = 'processing';
+      next.startedAt = new Date();
+      next.updatedAt = new Date();
+      next.leaseExpiresAt = leaseExpiresAt;
+    }
+    return next;
   }
 
-  async addJobLog(jobId, message) {
-    const logEntry = `${new Date().toISOString()}: ${message}`;
-    
+  // Extends the lease on the owner's queued jobs and on the processing jobs it
+  // is actually running. Processing jobs it owns but no longer runs (left over
+  // from a restart) are not renewed, so they expire and are re-queued.
+  async renewJobLeases(owner, runningJobIds, leaseMs) {
+    const leaseExpiresAt = new Date(Date.now() + leaseMs);
+    const filter = {
+      owner,
+      $or: [
+        { status: 'queued' },
+        { status: 'processing', _id: { $in: runningJobIds } }
+      ]
+    };
+
     if (!this.isConnected || !this.db) {
-      // Use in-memory storage as fallback
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.logs = [...(job.logs || []), logEntry];
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      for (const job of this.inMemoryJobs.values()) {
+        if (matchesFilter(job, filter)) {
+          job.leaseExpiresAt = leaseExpiresAt;
+        }
       }
       return;
     }
 
     try {
-      const collection = this.db.collection('jobs');
-      await collection.updateOne(
-        { _id: jobId },
-        {
-          $push: { logs: logEntry },
-          $set: { updatedAt: new Date() }
-        }
-      );
+      await this.db.collection('jobs').updateMany(filter, { $set: { leaseExpiresAt } });
     } catch (error) {
-      console.error('❌ Error adding job log:', error);
-      // Fallback to in-memory
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.logs = [...(job.logs || []), logEntry];
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      console.error('❌ Error renewing job leases:', error);
+      this.recordOperationError(error);
+    }
+  }
+
+  // Recovers jobs whose lease has lapsed. The owner's own processing jobs go
+  // back to the queue, since their upload is still in its temp/. Jobs owned by
+  // another instance that has stopped renewing for a further lease period are
+  // failed: nobody else can read their upload.
+  async recoverExpiredJobs(owner, leaseMs) {
+    const now = Date.now();
+    const recovered = { requeued: 0, failed: 0 };
+
+    let job;
+    while ((job = await this.takeExpiredJob(
+      { status: 'processing', owner, leaseExpiresAt: { $lt: new Date(now) } },
+      { $set: { status: 'queued', currentStep: 'Waiting in queue...', updatedAt: new Date() }, $unset: { startedAt: '', leaseExpiresAt: '' } }
+    ))) {
+      this.logSeqs.delete(job._id);
+      await this.recordJobTransition('processing', 'queued');
+      jobEvents.publish(job._id, { type: 'status', status: 'queued' });
+      recovered.requeued++;
+    }
+
+    const error = 'The server processing this job stopped before it finished. Please upload the APK again.';
+    while ((job = await this.takeExpiredJob(
+      {
+        status: { $in: ['queued', 'processing'] },
+        owner: { $ne: owner },
+        leaseExpiresAt: { $lt: new Date(now - leaseMs) }
+      },
+      { $set: { status: 'error', error, completedAt: new Date(), updatedAt: new Date() }, $unset: { leaseExpiresAt: '' } }
+    ))) {
+      await this.recordJobTransition(job.status, 'error');
+      jobEvents.publish(job._id, { type: 'status', status: 'error', error });
+      recovered.failed++;
+    }
+
+    return recovered;
+  }
+
+  // Atomically applies update to one job matching filter; returns the job as it
+  // was before, or null when none is left
+  async takeExpiredJob(filter, update) {
+    if (!this.isConnected || !this.db) {
+      for (const job of this.inMemoryJobs.values()) {
+        if (matchesFilter(job, filter)) {
+          const before = { ...job };
+          Object.assign(job, update.$set);
+          Object.keys(update.$unset || {}).forEach(key => delete job[key]);
+          return before;
+        }
       }
+      return null;
+    }
+
+    try {
+      return await this.db.collection('jobs').findOneAndUpdate(filter, update, {
+        sort: { leaseExpiresAt: 1 },
+        projection: { _id: 1, status: 1 }
+      });
+    } catch (error) {
+      console.error('❌ Error recovering expired jobs:', error);
+      this.recordOperationError(error);
+      return null;
     }
   }
 
-  async completeJob(jobId, result) {
+  async getQueuePosition(job) {
     if (!this.isConnected || !this.db) {
       // Use in-memory storage as fallback
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.status = 'completed';
-        job.result = result;
-        job.completedAt = new Date();
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      let ahead = 0;
+      for (const other of this.inMemoryJobs.values()) {
+        if (other.status === 'queued' && other.queuedAt < job.queuedAt) {
+          ahead++;
+        }
       }
-      return;
+      return ahead + 1;
     }
 
     try {
       const collection = this.db.collection('jobs');
-      await collection.updateOne(
-        { _id: jobId },
-        {
+      const ahead = await collection.countDocuments({
+        status: 'queued',
+        queuedAt: { $lt: job.queuedAt }
+      });
+      return ahead + 1;
+    } catch (error) {
+      console.error('❌ Error getting queue position:', error);
+      this.recordOperationError(error);
+      return null;
+    }
+  }
+
+  async updateJobProgress(jobId, progress, currentStep, messages = []) {
+    const logs = messages.map(message => this.createLogEntry(jobId, message));
+    jobEvents.publish(jobId, { type: 'progress', progress, currentStep });
+    if (logs.length > 0) {
+      jobEvents.publish(jobId, { type: 'log', logs });
+    }
+
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      this.applyInMemoryUpdate(jobId, { progress, currentStep }, logs);
+      return;
+    }
+
+    this.bufferJobWrite(jobId, { progress, currentStep }, logs);
+  }
+
+  async addJobLog(jobId, message) {
+    const logEntry = this.createLogEntry(jobId, message);
+    jobEvents.publish(jobId, { type: 'log', logs: [logEntry] });
+    
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      this.applyInMemoryUpdate(jobId, {}, [logEntry]);
+      return;
+    }
+
+    this.bufferJobWrite(jobId, {}, [logEntry]);
+  }
+
+  // Per-stage pipeline metrics (wall/CPU time, bytes); rides along with the next buffered write
+  async recordJobStages(jobId, stages) {
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      this.applyInMemoryUpdate(jobId, { stages }, []);
+      return;
+    }
+
+    this.bufferJobWrite(jobId, { stages }, []);
+  }
+
+  createLogEntry(jobId, message) {
+    const seq = this.logSeqs.get(jobId) || 0;
+    this.logSeqs.set(jobId, seq + 1);
+    return { seq, time: new Date().toISOString(), message };
+  }
+
+  // Queues a progress/log update; buffered updates for a job are merged into one
+  // write (an updateOne plus an insertMany of log lines, sent concurrently)
+  // every logFlushIntervalMs or logFlushMaxEntries log lines
+  bufferJobWrite(jobId, fields, logs) {
+    let pending = this.pendingJobWrites.get(jobId);
+    if (!pending) {
+      pending = { fields: {}, logs: [], timer: null };
+      this.pendingJobWrites.set(jobId, pending);
+    }
+
+    Object.assign(pending.fields, fields);
+    pending.logs.push(...logs);
+
+    if (pending.logs.length >= this.logFlushMaxEntries) {
+      this.flushJobWrites(jobId);
+    } else if (!pending.timer) {
+      pending.timer = setTimeout(() => this.flushJobWrites(jobId), this.logFlushIntervalMs);
+    }
+  }
+
+  // Writes everything buffered for a job (plus any extra fields) in one round trip.
+  // Flushes for the same job are chained so they reach the database in order.
+  flushJobWrites(jobId, extraFields = null) {
+    const pending = this.pendingJobWrites.get(jobId);
+    this.pendingJobWrites.delete(jobId);
+    if (pending && pending.timer) {
+      clearTimeout(pending.timer);
+    }
+
+    const fields = { ...(pending ? pending.fields : {}), ...(extraFields || {}) };
+    const logs = pending ? pending.logs : [];
+    const previous = this.jobWriteChains.get(jobId) || Promise.resolve();
+
+    if (Object.keys(fields).length === 0 && logs.length === 0) {
+      return previous;
+    }
+
+    // Readers keep seeing the update until its write has landed
+    const write = { fields, logs };
+    const inFlight = this.inFlightJobWrites.get(jobId) || [];
+    inFlight.push(write);
+    this.inFlightJobWrites.set(jobId, inFlight);
+
+    const chain = previous.then(() => this.writeJobUpdate(jobId, fields, logs));
+    this.jobWriteChains.set(jobId, chain);
+    chain.then(() => {
+      const remaining = (this.inFlightJobWrites.get(jobId) || []).filter(entry => entry !== write);
+      if (remaining.length > 0) {
+        this.inFlightJobWrites.set(jobId, remaining);
+      } else {
+        this.inFlightJobWrites.delete(jobId);
+      }
+      if (this.jobWriteChains.get(jobId) === chain) {
+        this.jobWriteChains.delete(jobId);
+      }
+    });
+    return chain;
+  }
+
+  // A failed write is retried in place, so later flushes for the job stay queued
+  // behind it; both halves are idempotent (a $set, and log inserts keyed by seq).
+  // The update falls back to in-memory storage only once the attempts run out.
+  async writeJobUpdate(jobId, fields, logs) {
+    for (let attempt = 1; ; attempt++) {
+      if (!this.isConnected || !this.db) {
+        // Use in-memory storage as fallback
+        this.applyInMemoryUpdate(jobId, fields, logs);
+        return;
+      }
+
+      try {
+        const collection = this.db.collection('jobs');
+        const update = {
           $set: {
-            status: 'completed',
-            result,
-            completedAt: new Date(),
+            ...fields,
             updatedAt: new Date()
           }
+        };
+        if (logs.length > 0) {
+          update.$set.logCount = logs[logs.length - 1].seq + 1;
         }
-      );
-    } catch (error) {
-      console.error('❌ Error completing job:', error);
-      // Fallback to in-memory
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.status = 'completed';
-        job.result = result;
-        job.completedAt = new Date();
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+        await Promise.all([
+          collection.updateOne({ _id: jobId }, update),
+          this.insertJobLogs(jobId, logs)
+        ]);
+        return;
+      } catch (error) {
+        this.recordOperationError(error);
+        if (attempt >= JOB_WRITE_ATTEMPTS) {
+          console.error('❌ Error writing buffered job update:', error);
+          // Fallback to in-memory
+          this.applyInMemoryUpdate(jobId, fields, logs);
+          return;
+        }
+        console.error(`⚠️ Buffered job update failed (attempt ${attempt}/${JOB_WRITE_ATTEMPTS}), retrying:`, error.message);
+        await new Promise(resolve => setTimeout(resolve, this.logFlushIntervalMs * attempt));
       }
     }
   }
 
+  applyInMemoryUpdate(jobId, fields, logs) {
+    let job = this.inMemoryJobs.get(jobId);
+    if (!job && this.backend !== 'memory') {
+      // A job stored in MongoDB before it became unreachable; keep the changes for the resync
+      job = { _id: jobId, partial: true, logs: [] };
+    }
+    if (job) {
+      Object.assign(job, fields);
+      job.logs = [...(job.logs || []), ...logs];
+      const last = job.logs[job.logs.length - 1];
+      job.logCount = last && typeof last !== 'string' ? last.seq + 1 : job.logs.length;
+      job.updatedAt = new Date();
+      this.inMemoryJobs.set(jobId, job);
+    }
+  }
+
+  // A job's updates that may not be in the database yet: changes held in the
+  // fallback store for the next resync, in-flight flushes, oldest first, then
+  // the buffer. Taken before a read, so an update whose write lands while the
+  // read runs is in the snapshot, the result or both.
+  unwrittenJobWrites(jobId) {
+    const writes = [];
+    const fallback = this.inMemoryJobs.get(jobId);
+    if (fallback && fallback.partial) {
+      const { _id, partial, logs = [], ...fields } = fallback;
+      writes.push({ fields, logs });
+    }
+    writes.push(...(this.inFlightJobWrites.get(jobId) || []));
+    const pending = this.pendingJobWrites.get(jobId);
+    if (pending) {
+      writes.push(pending);
+    }
+    return {
+      fields: Object.assign({}, ...writes.map(write => write.fields)),
+      logs: writes.flatMap(write => write.logs)
+    };
+  }
+
+  // Overlays updates that have not landed so in-process readers see them immediately
+  withPendingWrites(job, unwritten = job && this.unwrittenJobWrites(job._id)) {
+    if (!job || (Object.keys(unwritten.fields).length === 0 && unwritten.logs.length === 0)) {
+      return job;
+    }
+    const stored = new Set((job.logs || []).map(entry => entry.seq));
+    return {
+      ...job,
+      ...unwritten.fields,
+      logs: [...(job.logs || []), ...unwritten.logs.filter(entry => !stored.has(entry.seq))]
+    };
+  }
+
+  async completeJob(jobId, result) {
+    // Final status is written together with any buffered progress and logs
+    await Promise.all([
+      this.flushJobWrites(jobId, {
+        status: 'completed',
+        result,
+        completedAt: new Date()
+      }),
+      this.recordJobTransition('processing', 'completed')
+    ]);
+    this.logSeqs.delete(jobId);
+    jobEvents.publish(jobId, { type: 'status', status: 'completed', result });
+  }
+
   async errorJob(jobId, error) {
+    await Promise.all([
+      this.flushJobWrites(jobId, {
+        status: 'error',
+        error,
+        completedAt: new Date()
+      }),
+      this.recordJobTransition('processing', 'error')
+    ]);
+    this.logSeqs.delete(jobId);
+    jobEvents.publish(jobId, { type: 'status', status: 'error', error });
+  }
+
+  // Follows updates to a job made by other instances through MongoDB change streams
+  // (jobs for progress and status, job_logs for log lines).
+  // Returns a close function, or null when change streams are unavailable.
+  watchJob(jobId, listener, onError = () => {}) {
+    if (!this.isConnected || !this.db) {
+      return null;
+    }
+
+    try {
+      const jobStream = this.db.collection('jobs').watch([
+        { $match: { 'documentKey._id': jobId, operationType: 'update' } }
+      ]);
+      const logStream = this.db.collection('job_logs').watch([
+        { $match: { 'fullDocument.jobId': jobId, operationType: 'insert' } }
+      ]);
+      const close = () => Promise.all([jobStream.close(), logStream.close()]).catch(() => {});
+
+      jobStream.on('change', (change) => {
+        for (const event of this.changeToJobEvents(change.updateDescription.updatedFields)) {
+          listener(event);
+        }
+      });
+
+      logStream.on('change', (change) => {
+        const { seq, time, message } = change.fullDocument;
+        listener({ type: 'log', logs: [{ seq, time, message }] });
+      });
+
+      let failed = false;
+      for (const changeStream of [jobStream, logStream]) {
+        changeStream.on('error', (error) => {
+          console.error('❌ Job change stream error:', error.message);
+          close();
+          if (!failed) {
+            failed = true;
+            onError(error);
+          }
+        });
+      }
+
+      return close;
+    } catch (error) {
+      console.error('❌ Error opening job change stream:', error);
+      this.recordOperationError(error);
+      return null;
+    }
+  }
+
+  changeToJobEvents(updatedFields) {
+    const events = [];
+
+    if ('progress' in updatedFields || 'currentStep' in updatedFields) {
+      events.push({ type: 'progress', progress: updatedFields.progress, currentStep: updatedFields.currentStep });
+    }
+    if ('status' in updatedFields) {
+      events.push({ type: 'status', status: updatedFields.status, result: updatedFields.result, error: updatedFields.error });
+    }
+    return events;
+  }
+
+  async getCachedArtifact(cacheKey) {
     if (!this.isConnected || !this.db) {
       // Use in-memory storage as fallback
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.status = 'error';
-        job.error = error;
-        job.completedAt = new Date();
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
+      const artifact = this.inMemoryArtifacts.get(cacheKey);
+      if (artifact) {
+        artifact.lastAccessedAt = new Date();
+        artifact.hits++;
       }
-      return;
+      return artifact || null;
     }
 
     try {
-      const collection = this.db.collection('jobs');
-      await collection.updateOne(
-        { _id: jobId },
-        {
-          $set: {
-            status: 'error',
-            error,
-            completedAt: new Date(),
-            updatedAt: new Date()
-          }
-        }
+      const collection = this.db.collection('artifact_cache');
+      return await collection.findOneAndUpdate(
+        { _id: cacheKey },
+        { $set: { lastAccessedAt: new Date() }, $inc: { hits: 1 } },
+        { returnDocument: 'after' }
       );
     } catch (error) {
-      console.error('❌ Error updating job error:', error);
-      // Fallback to in-memory
-      const job = this.inMemoryJobs.get(jobId);
-      if (job) {
-        job.status = 'error';
-        job.error = error;
-        job.completedAt = new Date();
-        job.updatedAt = new Date();
-        this.inMemoryJobs.set(jobId, job);
-      }
+      console.error('❌ Error reading artifact cache:', error);
+      this.recordOperationError(error);
+      return this.inMemoryArtifacts.get(cacheKey) || null;
+    }
+  }
+
+  async getCachedArtifactByFileName(fileName) {
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      return Array.from(this.inMemoryArtifacts.values()).find(artifact => artifact.fileName === fileName) || null;
+    }
+
+    try {
+      const collection = this.db.collection('artifact_cache');
+      return await collection.findOne({ fileName }, { projection: { result: 0 } });
+    } catch (error) {
+      console.error('❌ Error reading artifact cache:', error);
+      this.recordOperationError(error);
+      return null;
     }
   }
 
-  async cleanupOldJobs(maxAgeHours = 24) {
-    const cutoffDate = new Date();
-    cutoffDate.setHours(cutoffDate.getHours() - maxAgeHours);
+  async saveCachedArtifact(cacheKey, artifact) {
+    const document = {
+      _id: cacheKey,
+      ...artifact,
+      hits: 0,
+      createdAt: new Date(),
+      lastAccessedAt: new Date()
+    };
 
     if (!this.isConnected || !this.db) {
-      // Clean up in-memory storage
-      for (const [jobId, job] of this.inMemoryJobs.entries()) {
-        if (job.createdAt < cutoffDate) {
-          this.inMemoryJobs.delete(jobId);
-        }
+      // Use in-memory storage as fallback
+      this.inMemoryArtifacts.set(cacheKey, document);
+      return;
+    }
+
+    try {
+      const collection = this.db.collection('artifact_cache');
+      await collection.replaceOne({ _id: cacheKey }, document, { upsert: true });
+    } catch (error) {
+      console.error('❌ Error saving artifact cache entry:', error);
+      this.recordOperationError(error);
+      this.inMemoryArtifacts.set(cacheKey, document);
+    }
+  }
+
+  // Cache entries ordered least recently used first
+  async listCachedArtifacts() {
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      return Array.from(this.inMemoryArtifacts.values())
+        .sort((a, b) => a.lastAccessedAt - b.lastAccessedAt);
+    }
+
+    try {
+      const collection = this.db.collection('artifact_cache');
+      return await collection.find({}, { projection: { result: 0 } })
+        .sort({ lastAccessedAt: 1 })
+        .toArray();
+    } catch (error) {
+      console.error('❌ Error listing artifact cache:', error);
+      this.recordOperationError(error);
+      return [];
+    }
+  }
+
+  async deleteCachedArtifact(cacheKey) {
+    this.inMemoryArtifacts.delete(cacheKey);
+
+    if (!this.isConnected || !this.db) {
+      return;
+    }
+
+    try {
+      const collection = this.db.collection('artifact_cache');
+      await collection.deleteOne({ _id: cacheKey });
+    } catch (error) {
+      console.error('❌ Error deleting artifact cache entry:', error);
+      this.recordOperationError(error);
+    }
+  }
+
+  // Ids of queued and processing jobs, whose files must be kept. Throws while
+  // MongoDB is unavailable rather than answering from the in-memory map.
+  async listActiveJobIds() {
+    if (this.backend !== 'memory' && !this.isConnected) {
+      throw new Error('MongoDB unavailable');
+    }
+    if (!this.db) {
+      return Array.from(this.inMemoryJobs.values())
+        .filter(job => job.status === 'queued' || job.status === 'processing')
+        .map(job => job._id);
+    }
+
+    const jobs = await this.db.collection('jobs')
+      .find({ status: { $in: ['queued', 'processing'] } }, { projection: { _id: 1 } })
+      .toArray();
+    return jobs.map(job => job._id);
+  }
+
+  // The in-memory fallback has no TTL index, so finished jobs are expired here
+  expireInMemoryJobs() {
+    const cutoff = Date.now() - this.jobTtlSeconds * 1000;
+    for (const [jobId, job] of this.inMemoryJobs.entries()) {
+      if (job.completedAt && new Date(job.completedAt).getTime() < cutoff) {
+        this.inMemoryJobs.delete(jobId);
       }
+    }
+  }
+
+  // Milliseconds for a ping round trip, or null when running on in-memory storage
+  async measureRoundTrip() {
+    if (!this.isConnected || !this.db) {
+      return null;
+    }
+
+    try {
+      const start = process.hrtime.bigint();
+      await this.db.admin().ping();
+      return Number(process.hrtime.bigint() - start) / 1e6;
+    } catch (error) {
+      console.error('❌ Error measuring MongoDB round trip:', error);
+      this.recordOperationError(error);
+      return null;
+    }
+  }
+
+  // Moves one job between status counters (from is null for a new job) and counts
+  // the event in the current minute's throughput rollup. Both are single $inc upserts.
+  async recordJobTransition(from, to) {
+    const counters = {};
+    if (from) {
+      counters[from] = -1;
+    }
+    if (to) {
+      counters[to] = (counters[to] || 0) + 1;
+    }
+    const rollup = {};
+    if (!from) {
+      rollup.submitted = 1;
+    }
+    if (to === 'completed' || to === 'error') {
+      rollup[to] = 1;
+    }
+    const minute = new Date(Math.floor(Date.now() / 60000) * 60000);
+
+    if (!this.isConnected || !this.db) {
+      // In-memory stats are counted from the job map; only the rollup is kept
+      this.applyInMemoryRollup(minute, rollup);
       return;
     }
 
     try {
-      const collection = this.db.collection('jobs');
-      const result = await collection.deleteMany({
-        createdAt: { $lt: cutoffDate }
+      await Promise.all([
+        // version tells a running reconcile that its count is already stale
+        this.db.collection('job_counters').updateOne(
+          { _id: JOB_COUNTERS_ID },
+          { $inc: { ...counters, version: 1 } },
+          { upsert: true }
+        ),
+        this.db.collection('job_rollups').updateOne(
+          { _id: minute.toISOString() },
+          { $inc: rollup, $setOnInsert: { minute } },
+          { upsert: true }
+        )
+      ]);
+    } catch (error) {
+      // Counters are repaired by the next reconcile
+      console.error('❌ Error updating job counters:', error);
+      this.recordOperationError(error);
+    }
+  }
+
+  applyInMemoryRollup(minute, rollup) {
+    const key = minute.toISOString();
+    const entry = this.inMemoryRollups.get(key) || { _id: key, minute };
+    for (const [field, count] of Object.entries(rollup)) {
+      entry[field] = (entry[field] || 0) + count;
+    }
+    this.inMemoryRollups.set(key, entry);
+
+    const cutoff = minute.getTime() - ROLLUP_RETENTION_SECONDS * 1000;
+    for (const [rollupKey, rollupEntry] of this.inMemoryRollups) {
+      if (rollupEntry.minute.getTime() >= cutoff) {
+        break;
+      }
+      this.inMemoryRollups.delete(rollupKey);
+    }
+  }
+
+  // Recounts jobs per status with a $group over the jobs collection and replaces
+  // the counters. Runs at connect and every JOB_COUNTER_RECONCILE_MS to repair
+  // drift (failed increments, jobs removed by the TTL index). The replacement
+  // only applies if no transition bumped the counters' version while the jobs
+  // were counted, so it never overwrites an increment; otherwise it recounts.
+  async reconcileJobCounters() {
+    if (!this.isConnected || !this.db) {
+      return null;
+    }
+
+    const collection = this.db.collection('job_counters');
+    for (let attempt = 0; attempt < COUNTER_RECONCILE_ATTEMPTS; attempt++) {
+      const previous = await collection.findOne({ _id: JOB_COUNTERS_ID });
+      const stats = await this.db.collection('jobs').aggregate([
+        {
+          $group: {
+            _id: '$status',
+            count: { $sum: 1 }
+          }
+        }
+      ]).toArray();
+
+      const counters = Object.fromEntries(JOB_STATUSES.map(status => [status, 0]));
+      stats.forEach(stat => {
+        if (stat._id in counters) {
+          counters[stat._id] = stat.count;
+        }
       });
-      
-      console.log(`🧹 Cleaned up ${result.deletedCount} old jobs`);
+
+      let applied = null;
+      try {
+        if (previous) {
+          // Counters written before versioning have none, which matches null
+          applied = await collection.findOneAndUpdate(
+            { _id: JOB_COUNTERS_ID, version: previous.version ?? null },
+            { $set: { ...counters, reconciledAt: new Date() }, $inc: { version: 1 } },
+            { returnDocument: 'after' }
+          );
+        } else {
+          // Inserted rather than upserted: an upsert would copy version: null
+          // from the filter into the document, and $inc fails on null
+          applied = await collection.insertOne({ _id: JOB_COUNTERS_ID, ...counters, reconciledAt: new Date(), version: 1 });
+        }
+      } catch (error) {
+        // The insert lost to a concurrent first increment
+        if (error.code !== 11000) {
+          throw error;
+        }
+      }
+      if (!applied) {
+        continue;
+      }
+
+      const drift = JOB_STATUSES.filter(status => previous && (previous[status] || 0) !== counters[status]);
+      if (drift.length > 0) {
+        console.log(`🔄 Reconciled job counters (${drift.map(status => `${status}: ${previous[status] || 0} -> ${counters[status]}`).join(', ')})`);
+      }
+      return { ...counters, _id: JOB_COUNTERS_ID };
+    }
+
+    console.log(`⚠️ Job counters changed during ${COUNTER_RECONCILE_ATTEMPTS} reconcile attempts; retrying at the next interval`);
+    return null;
+  }
+
+  async scheduleCounterReconcile() {
+    try {
+      await this.reconcileJobCounters();
     } catch (error) {
-      console.error('❌ Error cleaning up old jobs:', error);
+      console.error('❌ Error reconciling job counters:', error);
+      this.recordOperationError(error);
+    }
+
+    if (!this.counterReconcileTimer) {
+      this.counterReconcileTimer = setInterval(() => {
+        this.reconcileJobCounters().catch(error => console.error('❌ Error reconciling job counters:', error));
+      }, this.counterReconcileMs);
+      this.counterReconcileTimer.unref();
     }
   }
 
+  // Job counts per status; a single document read from the maintained counters
   async getJobStats() {
     if (!this.isConnected || !this.db) {
       // In-memory stats
       const total = this.inMemoryJobs.size;
+      const queued = Array.from(this.inMemoryJobs.values()).filter(job => job.status === 'queued').length;
       const processing = Array.from(this.inMemoryJobs.values()).filter(job => job.status === 'processing').length;
       const completed = Array.from(this.inMemoryJobs.values()).filter(job => job.status === 'completed').length;
       const errors = Array.from(this.inMemoryJobs.values()).filter(job => job.status === 'error').length;
       
-      return { total, processing, completed, errors, storage: 'in-memory' };
+      return { total, queued, processing, completed, errors, storage: 'in-memory' };
     }
 
     try {
-      const collection = this.db.collection('jobs');
-      const stats = await collection.aggregate([
-        {
-          $group: {
-            _id: '$status',
-            count: { $sum: 1 }
-          }
-        }
-      ]).toArray();
+      const counters = await this.db.collection('job_counters').findOne({ _id: JOB_COUNTERS_ID })
+        || await this.reconcileJobCounters();
       
-      const result = { total: 0, processing: 0, completed: 0, errors: 0, storage: 'mongodb' };
-      stats.forEach(stat => {
-        result.total += stat.count;
-        if (stat._id === 'processing') result.processing = stat.count;
-        if (stat._id === 'completed') result.completed = stat.count;
-        if (stat._id === 'error') result.errors = stat.count;
-      });
+      const result = {
+        total: 0,
+        queued: Math.max(0, counters.queued || 0),
+        processing: Math.max(0, counters.processing || 0),
+        completed: Math.max(0, counters.completed || 0),
+        errors: Math.max(0, counters.error || 0),
+        storage: this.backend === 'embedded' ? 'embedded' : 'mongodb'
+      };
+      result.total = result.queued + result.processing + result.completed + result.errors;
       
       return result;
     } catch (error) {
       console.error('❌ Error getting job stats:', error);
-      return { total: 0, processing: 0, completed: 0, errors: 0, storage: 'error' };
+      this.recordOperationError(error);
+      return { total: 0, queued: 0, processing: 0, completed: 0, errors: 0, storage: 'error' };
+    }
+  }
+
+  // Per-minute submitted/completed/error counts for the last `minutes` minutes, oldest first
+  async getJobThroughput(minutes) {
+    const since = new Date(Math.floor(Date.now() / 60000) * 60000 - (minutes - 1) * 60000);
+    const toPoint = rollup => ({
+      minute: rollup.minute.toISOString(),
+      submitted: rollup.submitted || 0,
+      completed: rollup.completed || 0,
+      errors: rollup.error || 0
+    });
+
+    if (!this.isConnected || !this.db) {
+      // Use in-memory storage as fallback
+      return Array.from(this.inMemoryRollups.values())
+        .filter(rollup => rollup.minute >= since)
+        .map(toPoint);
+    }
+
+    try {
+      const rollups = await this.db.collection('job_rollups')
+        .find({ minute: { $gte: since } })
+        .sort({ minute: 1 })
+        .toArray();
+      return rollups.map(toPoint);
+    } catch (error) {
+      console.error('❌ Error reading job throughput:', error);
+      this.recordOperationError(error);
+      return [];
     }
   }
 
   async close() {
+    if (this.supervisor) {
+      this.supervisor.stop();
+    }
     if (this.client) {
-      await this.client.close();
+      // Detached first so its close event does not trigger a reconnect
+      const client = this.client;
+      this.client = null;
       this.isConnected = false;
+      await client.close();
       console.log('✅ Disconnected from MongoDB');
     }
   }
@@ -0,0 +1,124 @@
+// Minimal ASN.1 DER encoder and reader
+// Just enough to build the self-signed debug certificate and the PKCS#7
+// SignedData block of a v1 (JAR) APK signature, and to read them back.
+
+function encodeLength(length) {
+  if (length < 0x80) {
+    return Buffer.from([length]);
+  }
+  const bytes = [];
+  for (let value = length; value > 0; value = Math.floor(value / 256)) {
+    bytes.unshift(value & 0xff);
+  }
+  return Buffer.from([0x80 | bytes.length, ...bytes]);
+}
+
+export function tlv(tag, ...contents) {
+  const body = Buffer.concat(contents);
+  return Buffer.concat([Buffer.from([tag]), encodeLength(body.length), body]);
+}
+
+export function sequence(...items) {
+  return tlv(0x30, ...items);
+}
+
+export function set(...items) {
+  // DER requires SET OF members in ascending byte order
+  return tlv(0x31, ...items.slice().sort(Buffer.compare));
+}
+
+// Non-negative integers only; Buffers are taken as big-endian magnitudes
+export function integer(value) {
+  let bytes = value;
+  if (!Buffer.isBuffer(value)) {
+    const hex = BigInt(value).toString(16);
+    bytes = Buffer.from(hex.length % 2 ? `0${hex}` : hex, 'hex');
+  }
+  while (bytes.length > 1 && bytes[0] === 0 && !(bytes[1] & 0x80)) {
+    bytes = bytes.subarray(1);
+  }
+  if (bytes[0] & 0x80) {
+    bytes = Buffer.concat([Buffer.from([0]), bytes]);
+  }
+  return tlv(0x02, bytes);
+}
+
+export function nullValue() {
+  return Buffer.from([0x05, 0x00]);
+}
+
+export function oid(dotted) {
+  const parts = dotted.split('.').map(Number);
+  const bytes = [parts[0] * 40 + parts[1]];
+  for (const part of parts.slice(2)) {
+    const chunk = [part & 0x7f];
+    for (let value = Math.floor(part / 128); value > 0; value = Math.floor(value / 128)) {
+      chunk.unshift((value & 0x7f) | 0x80);
+    }
+    bytes.push(...chunk);
+  }
+  return tlv(0x06, Buffer.from(bytes));
+}
+
+export function octetString(buffer) {
+  return tlv(0x04, buffer);
+}
+
+export function bitString(buffer) {
+  return tlv(0x03, Buffer.from([0]), buffer);
+}
+
+export function utf8String(text) {
+  return tlv(0x0c, Buffer.from(text, 'utf8'));
+}
+
+export function printableString(text) {
+  return tlv(0x13, Buffer.from(text, 'ascii'));
+}
+
+// UTCTime for years before 2050, GeneralizedTime after, as RFC 5280 requires
+export function time(date) {
+  const iso = date.toISOString().replace(/[-:T]/g, '').slice(0, 14);
+  if (date.getUTCFullYear() < 2050) {
+    return tlv(0x17, Buffer.from(`${iso.slice(2)}Z`, 'ascii'));
+  }
+  return tlv(0x18, Buffer.from(`${iso}Z`, 'ascii'));
+}
+
+// [n] EXPLICIT / constructed context-specific tag
+export function contextConstructed(number, ...contents) {
+  return tlv(0xa0 | number, ...contents);
+}
+
+// Reads one DER element at offset; content/raw are views into buffer
+export function readElement(buffer, offset = 0) {
+  const tag = buffer[offset];
+  let length = buffer[offset + 1];
+  let headerLength = 2;
+  if (length & 0x80) {
+    const lengthBytes = length & 0x7f;
+    length = 0;
+    for (let i = 0; i < lengthBytes; i++) {
+      length = length * 256 + buffer[offset + 2 + i];
+    }
+    headerLength += lengthBytes;
+  }
+
+  const contentStart = offset + headerLength;
+  return {
+    tag,
+    end: contentStart + length,
+    content: buffer.subarray(contentStart, contentStart + length),
+    raw: buffer.subarray(offset, contentStart + length)
+  };
+}
+
+export function readChildren(buffer) {
+  const children = [];
+  for (let offset = 0; offset < buffer.length;) {
+    const element = readElement(buffer, offset);
+    children.push(element);
+    offset = element.end;
+  }
+  return children;
+}
@@ -0,0 +1,127 @@
+// worker_threads pool for APK digesting
+// v1 entry digests and the v2/v3 chunked content digest hash every byte of
+// the APK, which would block the event loop (and every other job, SSE stream
+// and health check) for the length of the hash. Tasks are queued FIFO and run
+// on up to DIGEST_WORKERS threads, started on first use; DIGEST_WORKERS=0
+// runs them on the main thread instead.
+
+import os from 'os';
+import { Worker } from 'worker_threads';
+import { digestEntries, digestSections } from './apk-digest.js';
+
+const DEFAULT_WORKERS = Math.max(1, Math.floor(os.cpus().length / 2));
+const IN_PROCESS_TASKS = { digestEntries, digestSections };
+
+class DigestPool {
+  constructor() {
+    const configured = parseInt(process.env.DIGEST_WORKERS, 10);
+    this.size = Number.isNaN(configured) ? DEFAULT_WORKERS : Math.max(0, configured);
+    this.workers = [];
+    this.idle = [];
+    this.waiting = [];
+    this.tasks = new Map(); // Task id -> { resolve, reject, worker }
+    this.nextTaskId = 0;
+  }
+
+  run(task, ...args) {
+    if (this.size === 0) {
+      return IN_PROCESS_TASKS[task](...args);
+    }
+
+    return new Promise((resolve, reject) => {
+      this.waiting.push({ id: this.nextTaskId++, task, args, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    while (this.waiting.length > 0) {
+      let worker = this.idle.pop();
+      if (!worker && this.workers.length < this.size) {
+        worker = this.spawn();
+      }
+      if (!worker) {
+        return;
+      }
+
+      const { id, task, args, resolve, reject } = this.waiting.shift();
+      this.tasks.set(id, { resolve, reject, worker });
+      worker.ref();
+      worker.postMessage({ id, task, args });
+    }
+  }
+
+  spawn() {
+    const worker = new Worker(new URL('./digest-worker.js', import.meta.url));
+    this.workers.push(worker);
+
+    worker.on('message', ({ id, result, error }) => {
+      const pending = this.tasks.get(id);
+      this.tasks.delete(id);
+      this.release(worker);
+      if (error) {
+        pending.reject(new Error(error));
+      } else {
+        pending.resolve(result);
+      }
+    });
+
+    // A crashed worker fails its task and is replaced on the next dispatch
+    worker.on('error', (error) => {
+      console.error('❌ Digest worker failed:', error);
+      this.remove(worker, error);
+    });
+    worker.on('exit', (code) => {
+      this.remove(worker, new Error(`Digest worker exited with code ${code}`));
+    });
+
+    return worker;
+  }
+
+  release(worker) {
+    // Idle workers must not keep the process alive
+    worker.unref();
+    this.idle.push(worker);
+    this.dispatch();
+  }
+
+  remove(worker, error) {
+    if (!this.workers.includes(worker)) {
+      return;
+    }
+    this.workers = this.workers.filter(existing => existing !== worker);
+    this.idle = this.idle.filter(existing => existing !== worker);
+
+    for (const [id, pending] of this.tasks) {
+      if (pending.worker === worker) {
+        this.tasks.delete(id);
+        pending.reject(error);
+      }
+    }
+    this.dispatch();
+  }
+
+  // Base64 SHA-256 of each named entry's uncompressed content
+  digestEntries(filePath, entryNames) {
+    return this.run('digestEntries', filePath, entryNames);
+  }
+
+  // v2/v3 content digest over the given sections of filePath
+  async digestSections(filePath, sections) {
+    return Buffer.from(await this.run('digestSections', filePath, sections), 'base64');
+  }
+
+  getStats() {
+    return {
+      workers: this.workers.length,
+      busy: this.tasks.size,
+      queued: this.waiting.length,
+      maxWorkers: this.size
+    };
+  }
+}
+
+// Create singleton instance
+const digestPool = new DigestPool();
+
+export default digestPool;
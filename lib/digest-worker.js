@@ -0,0 +1,15 @@
+// Worker thread entry point for the digest pool
+// Runs one task at a time and posts back { id, result } or { id, error }.
+
+import { parentPort } from 'worker_threads';
+import { digestEntries, digestSections } from './apk-digest.js';
+
+const TASKS = { digestEntries, digestSections };
+
+parentPort.on('message', async ({ id, task, args }) => {
+  try {
+    parentPort.postMessage({ id, result: await TASKS[task](...args) });
+  } catch (error) {
+    parentPort.postMessage({ id, error: error.message });
+  }
+});
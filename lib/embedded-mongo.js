@@ -0,0 +1,763 @@
+// Embedded MongoDB-compatible storage for offline testing and benchmarking
+// Implements the subset of the MongoDB driver API that DatabaseService uses
+// (collections, cursors, findOneAndUpdate, aggregate $group, change streams,
+// unique and TTL indexes, admin ping) on top of in-process Maps, so the same code paths run with or
+// without Atlas. Every operation waits for a configurable simulated round
+// trip, which makes network latency reproducible without a network.
+
+import { EventEmitter } from 'events';
+
+let nextObjectId = 0;
+
+function generateId() {
+  nextObjectId++;
+  return `${Date.now().toString(16)}${nextObjectId.toString(16).padStart(8, '0')}`;
+}
+
+function duplicateKeyError(collectionName, indexName) {
+  const error = new Error(`E11000 duplicate key error collection: ${collectionName} index: ${indexName}`);
+  error.code = 11000;
+  return error;
+}
+
+function typeMismatchError(path, value) {
+  const error = new Error(`Cannot apply $inc to a value of non-numeric type. Field '${path}' has non-numeric type ${value === null ? 'null' : typeof value}`);
+  error.code = 14;
+  error.codeName = 'TypeMismatch';
+  return error;
+}
+
+function clone(value) {
+  return value === undefined ? undefined : structuredClone(value);
+}
+
+function isOperatorObject(value) {
+  return value !== null && typeof value === 'object' && !Array.isArray(value) && !(value instanceof Date)
+    && Object.keys(value).length > 0 && Object.keys(value).every(key => key.startsWith('$'));
+}
+
+function getPath(document, path) {
+  let value = document;
+  for (const key of path.split('.')) {
+    if (value === null || value === undefined) {
+      return undefined;
+    }
+    value = value[key];
+  }
+  return value;
+}
+
+function setPath(document, path, value) {
+  const keys = path.split('.');
+  let target = document;
+  for (const key of keys.slice(0, -1)) {
+    if (target[key] === null || typeof target[key] !== 'object') {
+      target[key] = {};
+    }
+    target = target[key];
+  }
+  target[keys[keys.length - 1]] = value;
+}
+
+function unsetPath(document, path) {
+  const keys = path.split('.');
+  const parent = keys.length > 1 ? getPath(document, keys.slice(0, -1).join('.')) : document;
+  if (parent && typeof parent === 'object') {
+    delete parent[keys[keys.length - 1]];
+  }
+}
+
+function compareValues(a, b) {
+  const left = a instanceof Date ? a.getTime() : a;
+  const right = b instanceof Date ? b.getTime() : b;
+  if (left === right) {
+    return 0;
+  }
+  if (left === undefined || left === null) {
+    return -1;
+  }
+  if (right === undefined || right === null) {
+    return 1;
+  }
+  return left < right ? -1 : 1;
+}
+
+function valuesEqual(a, b) {
+  if (a instanceof Date || b instanceof Date) {
+    return a instanceof Date && b instanceof Date && a.getTime() === b.getTime();
+  }
+  if (a && b && typeof a === 'object' && typeof b === 'object') {
+    return JSON.stringify(a) === JSON.stringify(b);
+  }
+  return a === b || (a === undefined && b === null) || (a === null && b === undefined);
+}
+
+function matchesCondition(value, condition) {
+  if (!isOperatorObject(condition)) {
+    return Array.isArray(value) && !Array.isArray(condition)
+      ? value.some(item => valuesEqual(item, condition))
+      : valuesEqual(value, condition);
+  }
+
+  return Object.entries(condition).every(([operator, operand]) => {
+    switch (operator) {
+      case '$eq': return matchesCondition(value, operand);
+      case '$ne': return !matchesCondition(value, operand);
+      case '$gt': return value !== undefined && value !== null && compareValues(value, operand) > 0;
+      case '$gte': return value !== undefined && value !== null && compareValues(value, operand) >= 0;
+      case '$lt': return value !== undefined && value !== null && compareValues(value, operand) < 0;
+      case '$lte': return value !== undefined && value !== null && compareValues(value, operand) <= 0;
+      case '$in': return operand.some(candidate => matchesCondition(value, candidate));
+      case '$nin': return !operand.some(candidate => matchesCondition(value, candidate));
+      case '$exists': return (value !== undefined) === Boolean(operand);
+      default: throw new Error(`Unsupported query operator ${operator}`);
+    }
+  });
+}
+
+export function matchesFilter(document, filter = {}) {
+  return Object.entries(filter).every(([key, condition]) => {
+    switch (key) {
+      case '$and': return condition.every(subFilter => matchesFilter(document, subFilter));
+      case '$or': return condition.some(subFilter => matchesFilter(document, subFilter));
+      case '$nor': return !condition.some(subFilter => matchesFilter(document, subFilter));
+      default: return matchesCondition(getPath(document, key), condition);
+    }
+  });
+}
+
+// Applies an update document in place; returns the changed fields for change streams
+function applyUpdate(document, update, isInsert) {
+  const updatedFields = {};
+  const removedFields = [];
+
+  for (const [operator, fields] of Object.entries(update)) {
+    for (const [path, operand] of Object.entries(fields)) {
+      switch (operator) {
+        case '$set':
+          setPath(document, path, clone(operand));
+          updatedFields[path] = clone(operand);
+          break;
+        case '$setOnInsert':
+          if (isInsert) {
+            setPath(document, path, clone(operand));
+          }
+          break;
+        case '$unset':
+          unsetPath(document, path);
+          removedFields.push(path);
+          break;
+        case '$inc': {
+          // Like MongoDB, only a missing field counts as 0
+          const current = getPath(document, path);
+          if (current !== undefined && typeof current !== 'number') {
+            throw typeMismatchError(path, current);
+          }
+          const value = (current || 0) + operand;
+          setPath(document, path, value);
+          updatedFields[path] = value;
+          break;
+        }
+        case '$min':
+        case '$max': {
+          const current = getPath(document, path);
+          const order = compareValues(operand, current);
+          if (current === undefined || (operator === '$min' ? order < 0 : order > 0)) {
+            setPath(document, path, clone(operand));
+            updatedFields[path] = clone(operand);
+          }
+          break;
+        }
+        case '$push': {
+          const items = isOperatorObject(operand) && '$each' in operand ? operand.$each : [operand];
+          const array = getPath(document, path) || [];
+          if (!Array.isArray(array)) {
+            throw new Error(`Cannot $push to non-array field ${path}`);
+          }
+          for (const item of items) {
+            updatedFields[`${path}.${array.length}`] = clone(item);
+            array.push(clone(item));
+          }
+          setPath(document, path, array);
+          break;
+        }
+        default:
+          throw new Error(`Unsupported update operator ${operator}`);
+      }
+    }
+  }
+
+  return { updatedFields, removedFields };
+}
+
+function applyProjection(document, projection) {
+  if (!document || !projection || Object.keys(projection).length === 0) {
+    return clone(document);
+  }
+
+  const entries = Object.entries(projection);
+  const inclusive = entries.some(([key, value]) => key !== '_id' && (value === 1 || value === true));
+  let result;
+  if (inclusive) {
+    result = {};
+    if (projection._id !== 0 && projection._id !== false) {
+      result._id = clone(document._id);
+    }
+    for (const [key, value] of entries) {
+      if (value === 1 || value === true) {
+        const fieldValue = getPath(document, key);
+        if (fieldValue !== undefined) {
+          setPath(result, key, clone(fieldValue));
+        }
+      }
+    }
+  } else {
+    result = clone(document);
+    for (const [key, value] of entries) {
+      if (value === 0 || value === false) {
+        unsetPath(result, key);
+      }
+    }
+  }
+
+  for (const [key, value] of entries) {
+    if (value && typeof value === 'object' && '$slice' in value) {
+      const array = getPath(document, key);
+      if (Array.isArray(array)) {
+        const [skip, limit] = Array.isArray(value.$slice)
+          ? value.$slice
+          : (value.$slice < 0 ? [value.$slice, -value.$slice] : [0, value.$slice]);
+        const start = skip < 0 ? Math.max(0, array.length + skip) : skip;
+        setPath(result, key, clone(array.slice(start, start + limit)));
+      }
+    }
+  }
+  return result;
+}
+
+function sortDocuments(documents, sort) {
+  const keys = Object.entries(sort || {});
+  if (keys.length === 0) {
+    return documents;
+  }
+  return documents.sort((a, b) => {
+    for (const [key, direction] of keys) {
+      const order = compareValues(getPath(a, key), getPath(b, key));
+      if (order !== 0) {
+        return direction < 0 ? -order : order;
+      }
+    }
+    return 0;
+  });
+}
+
+function evaluateExpression(document, expression) {
+  if (typeof expression === 'string' && expression.startsWith('$')) {
+    return getPath(document, expression.slice(1));
+  }
+  return expression;
+}
+
+function groupDocuments(documents, { _id: idExpression, ...accumulators }) {
+  const groups = new Map();
+  for (const document of documents) {
+    const id = evaluateExpression(document, idExpression);
+    const key = JSON.stringify(id === undefined ? null : id);
+    if (!groups.has(key)) {
+      groups.set(key, { id: id === undefined ? null : id, documents: [] });
+    }
+    groups.get(key).documents.push(document);
+  }
+
+  return [...groups.values()].map(({ id, documents: members }) => {
+    const result = { _id: id };
+    for (const [field, accumulator] of Object.entries(accumulators)) {
+      const [operator, expression] = Object.entries(accumulator)[0];
+      const values = members.map(member => evaluateExpression(member, expression)).filter(value => value !== undefined);
+      switch (operator) {
+        case '$sum': result[field] = values.reduce((sum, value) => sum + (typeof value === 'number' ? value : 0), 0); break;
+        case '$avg': result[field] = values.length ? values.reduce((sum, value) => sum + value, 0) / values.length : null; break;
+        case '$min': result[field] = values.length ? values.reduce((min, value) => (compareValues(value, min) < 0 ? value : min)) : null; break;
+        case '$max': result[field] = values.length ? values.reduce((max, value) => (compareValues(value, max) > 0 ? value : max)) : null; break;
+        case '$first': result[field] = values.length ? values[0] : null; break;
+        case '$last': result[field] = values.length ? values[values.length - 1] : null; break;
+        default: throw new Error(`Unsupported accumulator ${operator}`);
+      }
+    }
+    return result;
+  });
+}
+
+class EmbeddedCursor {
+  constructor(collection, load) {
+    this.collection = collection;
+    this.load = load;
+    this.sortSpec = null;
+    this.skipCount = 0;
+    this.limitCount = 0;
+    this.projection = null;
+  }
+
+  sort(sort) {
+    this.sortSpec = sort;
+    return this;
+  }
+
+  skip(count) {
+    this.skipCount = count;
+    return this;
+  }
+
+  limit(count) {
+    this.limitCount = count;
+    return this;
+  }
+
+  project(projection) {
+    this.projection = projection;
+    return this;
+  }
+
+  async toArray() {
+    await this.collection.client.simulateLatency();
+    let documents = sortDocuments(this.load(), this.sortSpec).slice(this.skipCount);
+    if (this.limitCount > 0) {
+      documents = documents.slice(0, this.limitCount);
+    }
+    return documents.map(document => applyProjection(document, this.projection));
+  }
+
+  async *[Symbol.asyncIterator]() {
+    yield* await this.toArray();
+  }
+}
+
+class EmbeddedChangeStream extends EventEmitter {
+  constructor(collection, pipeline) {
+    super();
+    this.collection = collection;
+    this.matchStages = pipeline.filter(stage => stage.$match).map(stage => stage.$match);
+    if (this.matchStages.length !== pipeline.length) {
+      throw new Error('Embedded change streams only support $match stages');
+    }
+    this.handleChange = (change) => {
+      if (this.matchStages.every(match => matchesFilter(change, match))) {
+        this.emit('change', clone(change));
+      }
+    };
+    collection.changes.on('change', this.handleChange);
+  }
+
+  async close() {
+    this.collection.changes.off('change', this.handleChange);
+    this.emit('close');
+  }
+}
+
+class EmbeddedCollection {
+  constructor(client, name) {
+    this.client = client;
+    this.name = name;
+    this.documents = new Map();
+    this.indexSpecs = new Map();
+    this.changes = new EventEmitter();
+    this.changes.setMaxListeners(0);
+  }
+
+  // Equality on an indexed field's leading key narrows the scan to that index bucket
+  matching(filter) {
+    if (filter && typeof filter._id === 'string') {
+      const document = this.documents.get(filter._id);
+      return document && matchesFilter(document, filter) ? [document] : [];
+    }
+
+    let candidates = this.documents.values();
+    for (const index of this.indexSpecs.values()) {
+      const value = filter ? filter[index.fields[0]] : undefined;
+      if (['string', 'number', 'boolean'].includes(typeof value)) {
+        const ids = index.buckets.get(JSON.stringify(value)) || new Set();
+        candidates = [...ids].map(id => this.documents.get(id));
+        break;
+      }
+    }
+    return [...candidates].filter(document => matchesFilter(document, filter));
+  }
+
+  first(filter, sort) {
+    const documents = this.matching(filter);
+    return sort ? sortDocuments(documents, sort)[0] : documents[0];
+  }
+
+  publish(change) {
+    if (this.changes.listenerCount('change') > 0) {
+      setImmediate(() => this.changes.emit('change', change));
+    }
+  }
+
+  indexEntries(index, document) {
+    const value = getPath(document, index.fields[0]);
+    const values = Array.isArray(value) ? value : [value === undefined ? null : value];
+    return {
+      bucketKeys: values.map(item => JSON.stringify(item)),
+      uniqueKey: JSON.stringify(index.fields.map(field => getPath(document, field) ?? null))
+    };
+  }
+
+  addToIndex(index, document) {
+    const { bucketKeys, uniqueKey } = this.indexEntries(index, document);
+    for (const key of bucketKeys) {
+      if (!index.buckets.has(key)) {
+        index.buckets.set(key, new Set());
+      }
+      index.buckets.get(key).add(document._id);
+    }
+    if (index.unique) {
+      index.uniqueKeys.set(uniqueKey, document._id);
+    }
+  }
+
+  removeFromIndex(index, document) {
+    const { bucketKeys, uniqueKey } = this.indexEntries(index, document);
+    for (const key of bucketKeys) {
+      const ids = index.buckets.get(key);
+      if (ids) {
+        ids.delete(document._id);
+        if (ids.size === 0) {
+          index.buckets.delete(key);
+        }
+      }
+    }
+    if (index.unique && index.uniqueKeys.get(uniqueKey) === document._id) {
+      index.uniqueKeys.delete(uniqueKey);
+    }
+  }
+
+  checkUnique(document) {
+    for (const index of this.indexSpecs.values()) {
+      const owner = index.unique ? index.uniqueKeys.get(this.indexEntries(index, document).uniqueKey) : undefined;
+      if (owner !== undefined && owner !== document._id) {
+        throw duplicateKeyError(this.name, index.name);
+      }
+    }
+  }
+
+  store(document) {
+    this.checkUnique(document);
+    const previous = this.documents.get(document._id);
+    for (const index of this.indexSpecs.values()) {
+      if (previous) {
+        this.removeFromIndex(index, previous);
+      }
+      this.addToIndex(index, document);
+    }
+    this.documents.set(document._id, document);
+  }
+
+  remove(document) {
+    for (const index of this.indexSpecs.values()) {
+      this.removeFromIndex(index, document);
+    }
+    this.documents.delete(document._id);
+    this.publish({ operationType: 'delete', documentKey: { _id: document._id } });
+  }
+
+  insert(document) {
+    const stored = { ...clone(document), _id: document._id === undefined ? generateId() : document._id };
+    if (this.documents.has(stored._id)) {
+      throw duplicateKeyError(this.name, '_id_');
+    }
+    this.store(stored);
+    this.publish({ operationType: 'insert', documentKey: { _id: stored._id }, fullDocument: clone(stored) });
+    return stored;
+  }
+
+  update(document, update) {
+    const updated = clone(document);
+    const description = applyUpdate(updated, update, false);
+    this.store(updated);
+    this.publish({ operationType: 'update', documentKey: { _id: updated._id }, updateDescription: description });
+    return updated;
+  }
+
+  upsert(filter, update) {
+    const seed = {};
+    for (const [key, value] of Object.entries(filter)) {
+      if (!key.startsWith('$') && !isOperatorObject(value)) {
+        setPath(seed, key, clone(value));
+      }
+    }
+    applyUpdate(seed, update, true);
+    return this.insert(seed);
+  }
+
+  async insertOne(document) {
+    await this.client.simulateLatency();
+    const stored = this.insert(document);
+    return { acknowledged: true, insertedId: stored._id };
+  }
+
+  async insertMany(documents, { ordered = true } = {}) {
+    await this.client.simulateLatency();
+    const insertedIds = {};
+    const errors = [];
+    documents.forEach((document, i) => {
+      try {
+        insertedIds[i] = this.insert(document)._id;
+      } catch (error) {
+        if (ordered) {
+          throw error;
+        }
+        errors.push(error);
+      }
+    });
+    if (errors.length > 0) {
+      const error = new Error(errors[0].message);
+      error.code = errors[0].code;
+      error.insertedIds = insertedIds;
+      throw error;
+    }
+    return { acknowledged: true, insertedCount: Object.keys(insertedIds).length, insertedIds };
+  }
+
+  async findOne(filter = {}, { projection, sort } = {}) {
+    await this.client.simulateLatency();
+    return applyProjection(this.first(filter, sort), projection) || null;
+  }
+
+  find(filter = {}, { projection, sort, limit, skip } = {}) {
+    const cursor = new EmbeddedCursor(this, () => this.matching(filter));
+    if (projection) cursor.project(projection);
+    if (sort) cursor.sort(sort);
+    if (skip) cursor.skip(skip);
+    if (limit) cursor.limit(limit);
+    return cursor;
+  }
+
+  async countDocuments(filter = {}) {
+    await this.client.simulateLatency();
+    return this.matching(filter).length;
+  }
+
+  async estimatedDocumentCount() {
+    await this.client.simulateLatency();
+    return this.documents.size;
+  }
+
+  async replaceOne(filter, replacement, { upsert = false } = {}) {
+    await this.client.simulateLatency();
+    const existing = this.first(filter);
+    if (!existing) {
+      if (!upsert) {
+        return { acknowledged: true, matchedCount: 0, modifiedCount: 0, upsertedCount: 0 };
+      }
+      const inserted = this.insert({ ...replacement, _id: replacement._id !== undefined ? replacement._id : filter._id });
+      return { acknowledged: true, matchedCount: 0, modifiedCount: 0, upsertedCount: 1, upsertedId: inserted._id };
+    }
+
+    const replaced = { ...clone(replacement), _id: existing._id };
+    this.store(replaced);
+    this.publish({ operationType: 'replace', documentKey: { _id: replaced._id }, fullDocument: clone(replaced) });
+    return { acknowledged: true, matchedCount: 1, modifiedCount: 1, upsertedCount: 0 };
+  }
+
+  async updateOne(filter, update, { upsert = false } = {}) {
+    await this.client.simulateLatency();
+    const existing = this.first(filter);
+    if (existing) {
+      this.update(existing, update);
+      return { acknowledged: true, matchedCount: 1, modifiedCount: 1, upsertedCount: 0 };
+    }
+    if (upsert) {
+      const inserted = this.upsert(filter, update);
+      return { acknowledged: true, matchedCount: 0, modifiedCount: 0, upsertedCount: 1, upsertedId: inserted._id };
+    }
+    return { acknowledged: true, matchedCount: 0, modifiedCount: 0, upsertedCount: 0 };
+  }
+
+  async updateMany(filter, update) {
+    await this.client.simulateLatency();
+    const documents = this.matching(filter);
+    documents.forEach(document => this.update(document, update));
+    return { acknowledged: true, matchedCount: documents.length, modifiedCount: documents.length, upsertedCount: 0 };
+  }
+
+  async findOneAndUpdate(filter, update, { sort, upsert = false, returnDocument = 'before', projection } = {}) {
+    await this.client.simulateLatency();
+    const existing = this.first(filter, sort);
+    if (!existing) {
+      const inserted = upsert ? this.upsert(filter, update) : null;
+      return returnDocument === 'after' && inserted ? applyProjection(inserted, projection) : null;
+    }
+    const updated = this.update(existing, update);
+    return applyProjection(returnDocument === 'after' ? updated : existing, projection);
+  }
+
+  async deleteOne(filter = {}) {
+    await this.client.simulateLatency();
+    const existing = this.first(filter);
+    if (existing) {
+      this.remove(existing);
+    }
+    return { acknowledged: true, deletedCount: existing ? 1 : 0 };
+  }
+
+  async deleteMany(filter = {}) {
+    await this.client.simulateLatency();
+    const documents = this.matching(filter);
+    for (const document of documents) {
+      this.remove(document);
+    }
+    return { acknowledged: true, deletedCount: documents.length };
+  }
+
+  aggregate(pipeline = []) {
+    const cursor = new EmbeddedCursor(this, () => {
+      let documents = [...this.documents.values()];
+      for (const stage of pipeline) {
+        const [operator, spec] = Object.entries(stage)[0];
+        switch (operator) {
+          case '$match': documents = documents.filter(document => matchesFilter(document, spec)); break;
+          case '$group': documents = groupDocuments(documents, spec); break;
+          case '$sort': documents = sortDocuments([...documents], spec); break;
+          case '$skip': documents = documents.slice(spec); break;
+          case '$limit': documents = documents.slice(0, spec); break;
+          case '$project': documents = documents.map(document => applyProjection(document, spec)); break;
+          case '$count': documents = [{ [spec]: documents.length }]; break;
+          default: throw new Error(`Unsupported aggregation stage ${operator}`);
+        }
+      }
+      return documents;
+    });
+    return cursor;
+  }
+
+  async createIndex(key, options = {}) {
+    await this.client.simulateLatency();
+    const name = options.name || Object.entries(key).map(([field, direction]) => `${field}_${direction}`).join('_');
+    if (!this.indexSpecs.has(name)) {
+      const index = { name, key, options, fields: Object.keys(key), unique: Boolean(options.unique), buckets: new Map(), uniqueKeys: new Map() };
+      for (const document of this.documents.values()) {
+        if (index.unique && index.uniqueKeys.has(this.indexEntries(index, document).uniqueKey)) {
+          throw duplicateKeyError(this.name, name);
+        }
+        this.addToIndex(index, document);
+      }
+      this.indexSpecs.set(name, index);
+      if (options.expireAfterSeconds !== undefined) {
+        this.client.startTtlMonitor();
+      }
+    }
+    return name;
+  }
+
+  // Removes documents whose TTL-indexed date is older than expireAfterSeconds
+  expireDocuments(now) {
+    for (const index of this.indexSpecs.values()) {
+      if (index.options.expireAfterSeconds === undefined) {
+        continue;
+      }
+      const cutoff = now - index.options.expireAfterSeconds * 1000;
+      for (const document of [...this.documents.values()]) {
+        const value = getPath(document, index.fields[0]);
+        if (value instanceof Date && value.getTime() <= cutoff) {
+          this.remove(document);
+        }
+      }
+    }
+  }
+
+  async indexes() {
+    await this.client.simulateLatency();
+    return [{ name: '_id_', key: { _id: 1 } }, ...[...this.indexSpecs.values()].map(({ name, key, options }) => ({ ...options, name, key }))];
+  }
+
+  watch(pipeline = []) {
+    return new EmbeddedChangeStream(this, pipeline);
+  }
+}
+
+class EmbeddedDb {
+  constructor(client, name) {
+    this.client = client;
+    this.databaseName = name;
+    this.collections = new Map();
+  }
+
+  collection(name) {
+    if (!this.collections.has(name)) {
+      this.collections.set(name, new EmbeddedCollection(this.client, name));
+    }
+    return this.collections.get(name);
+  }
+
+  async createCollection(name) {
+    await this.client.simulateLatency();
+    return this.collection(name);
+  }
+
+  async command(command) {
+    await this.client.simulateLatency();
+    if ('ping' in command) {
+      return { ok: 1 };
+    }
+    throw new Error(`Unsupported command ${Object.keys(command)[0]}`);
+  }
+
+  admin() {
+    return { ping: () => this.command({ ping: 1 }) };
+  }
+}
+
+/**
+ * Drop-in stand-in for MongoClient. `latencyMs` (plus up to `jitterMs` of
+ * random jitter) is waited before every operation, like a network round trip.
+ * TTL indexes are enforced every `ttlMonitorIntervalMs`, like mongod's TTL monitor.
+ */
+export class EmbeddedMongoClient extends EventEmitter {
+  constructor({ latencyMs = 0, jitterMs = 0, ttlMonitorIntervalMs = 60000 } = {}) {
+    super();
+    this.latencyMs = latencyMs;
+    this.jitterMs = jitterMs;
+    this.ttlMonitorIntervalMs = ttlMonitorIntervalMs;
+    this.ttlMonitor = null;
+    this.databases = new Map();
+  }
+
+  startTtlMonitor() {
+    if (!this.ttlMonitor) {
+      this.ttlMonitor = setInterval(() => this.expireDocuments(), this.ttlMonitorIntervalMs);
+      this.ttlMonitor.unref();
+    }
+  }
+
+  expireDocuments(now = Date.now()) {
+    for (const db of this.databases.values()) {
+      for (const collection of db.collections.values()) {
+        collection.expireDocuments(now);
+      }
+    }
+  }
+
+  simulateLatency() {
+    const delay = this.latencyMs + Math.random() * this.jitterMs;
+    return delay > 0 ? new Promise(resolve => setTimeout(resolve, delay)) : Promise.resolve();
+  }
+
+  async connect() {
+    await this.simulateLatency();
+    return this;
+  }
+
+  db(name) {
+    if (!this.databases.has(name)) {
+      this.databases.set(name, new EmbeddedDb(this, name));
+    }
+    return this.databases.get(name);
+  }
+
+  async close() {
+    clearInterval(this.ttlMonitor);
+    this.ttlMonitor = null;
+    this.emit('close');
+  }
+}
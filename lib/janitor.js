@@ -0,0 +1,179 @@
+// Background janitor for temp/uploads and temp/output
+// Job documents and log lines expire through TTL indexes; this removes the
+// files they leave behind: uploads and intermediates of jobs that are no
+// longer running, debug outputs older than the job TTL, and anything else
+// oldest first while the directories exceed TEMP_DISK_QUOTA_BYTES. Files of
+// queued or running jobs, outputs indexed by the artifact cache (which has its
+// own LRU bound) and anything younger than the orphan grace period (an upload
+// still streaming, or one whose job is not saved yet) are never touched.
+
+import { promises as fs } from 'fs';
+import path from 'path';
+import dbService from './database.js';
+import jobQueue from './job-queue.js';
+
+const DEFAULT_INTERVAL_MS = 10 * 60 * 1000;
+const DEFAULT_QUOTA_BYTES = 5 * 1024 * 1024 * 1024; // 5GB across uploads and outputs
+const ORPHAN_GRACE_MS = 15 * 60 * 1000; // An upload is written before its job is saved
+const OUTPUT_PATTERN = /^(?:debug|unsigned|temp)_(.+)\.apk$/;
+
+async function diskUsage(entryPath) {
+  const stats = await fs.lstat(entryPath);
+  if (!stats.isDirectory()) {
+    return stats.size;
+  }
+  const children = await fs.readdir(entryPath);
+  const sizes = await Promise.all(children.map(child => diskUsage(path.join(entryPath, child)).catch(() => 0)));
+  return sizes.reduce((sum, size) => sum + size, 0);
+}
+
+class Janitor {
+  constructor() {
+    this.intervalMs = parseInt(process.env.JANITOR_INTERVAL_MS, 10) || DEFAULT_INTERVAL_MS;
+    this.quotaBytes = parseInt(process.env.TEMP_DISK_QUOTA_BYTES, 10) || DEFAULT_QUOTA_BYTES;
+    this.uploadsDir = null;
+    this.outputDir = null;
+    this.timer = null;
+    this.sweeping = null;
+    this.reclaimedBytes = { expired: 0, orphaned: 0, quota: 0 };
+    this.removedFiles = { expired: 0, orphaned: 0, quota: 0 };
+    this.diskUsageBytes = 0;
+    this.lastSweepAt = null;
+  }
+
+  // Starts periodic sweeps of the given directories
+  start({ uploadsDir, outputDir }) {
+    this.uploadsDir = uploadsDir;
+    this.outputDir = outputDir;
+
+    if (!this.timer) {
+      this.timer = setInterval(() => this.sweep(), this.intervalMs);
+      this.timer.unref();
+    }
+  }
+
+  async listEntries() {
+    const entries = [];
+    for (const [directory, kind] of [[this.uploadsDir, 'upload'], [this.outputDir, 'output']]) {
+      const names = await fs.readdir(directory).catch(() => []);
+      for (const name of names) {
+        const entryPath = path.join(directory, name);
+        try {
+          const stats = await fs.lstat(entryPath);
+          const match = kind === 'upload' ? /^(.+)\.apk$/.exec(name) : OUTPUT_PATTERN.exec(name);
+          entries.push({
+            path: entryPath,
+            jobId: match ? match[1] : null,
+            // Only finished debug outputs are downloadable; everything else is scratch
+            downloadable: kind === 'output' && name.startsWith('debug_'),
+            modifiedAt: stats.mtimeMs,
+            size: await diskUsage(entryPath)
+          });
+        } catch (error) {
+          // Removed while listing
+        }
+      }
+    }
+    return entries;
+  }
+
+  async remove(entry, reason) {
+    try {
+      await fs.rm(entry.path, { recursive: true, force: true });
+    } catch (error) {
+      console.error(`❌ Janitor could not remove ${entry.path}:`, error.message);
+      return false;
+    }
+    this.reclaimedBytes[reason] += entry.size;
+    this.removedFiles[reason]++;
+    return true;
+  }
+
+  // Runs one sweep; concurrent callers share the sweep in progress
+  async sweep() {
+    if (this.sweeping) {
+      return this.sweeping;
+    }
+
+    this.sweeping = (async () => {
+      dbService.expireInMemoryJobs();
+
+      // Files are listed before jobs are read, so a job claimed in between still counts as active
+      const entries = await this.listEntries();
+      const [activeJobIds, artifacts] = await Promise.all([
+        dbService.listActiveJobIds(),
+        dbService.listCachedArtifacts()
+      ]);
+      const active = new Set([...activeJobIds, ...jobQueue.running.keys()]);
+      const cached = new Set(artifacts.map(artifact => artifact.path));
+
+      const now = Date.now();
+      const expiredBefore = now - dbService.jobTtlSeconds * 1000;
+      const remaining = [];
+      let reclaimed = 0;
+
+      for (const entry of entries) {
+        if (cached.has(entry.path) || (entry.jobId && active.has(entry.jobId))) {
+          remaining.push({ ...entry, protected: true });
+        } else if (entry.downloadable ? entry.modifiedAt < expiredBefore : entry.modifiedAt < now - ORPHAN_GRACE_MS) {
+          const reason = entry.downloadable ? 'expired' : 'orphaned';
+          if (await this.remove(entry, reason)) {
+            reclaimed += entry.size;
+          }
+        } else {
+          remaining.push(entry);
+        }
+      }
+
+      let usage = remaining.reduce((sum, entry) => sum + entry.size, 0);
+      const evictable = remaining
+        .filter(entry => !entry.protected && entry.modifiedAt < now - ORPHAN_GRACE_MS)
+        .sort((a, b) => a.modifiedAt - b.modifiedAt);
+      for (const entry of evictable) {
+        if (usage <= this.quotaBytes) {
+          break;
+        }
+        if (await this.remove(entry, 'quota')) {
+          usage -= entry.size;
+          reclaimed += entry.size;
+        }
+      }
+
+      if (usage > this.quotaBytes) {
+        const inFlight = remaining.filter(entry => !entry.protected && entry.modifiedAt >= now - ORPHAN_GRACE_MS);
+        const inFlightBytes = inFlight.reduce((sum, entry) => sum + entry.size, 0);
+        console.log(`⚠️ temp/ still uses ${usage} bytes after sweeping, over the ${this.quotaBytes} byte quota ` +
+          `(${inFlight.length} files, ${inFlightBytes} bytes, are too recent to evict)`);
+      }
+      if (reclaimed > 0) {
+        console.log(`🧹 Janitor reclaimed ${reclaimed} bytes`);
+      }
+      this.diskUsageBytes = usage;
+      this.lastSweepAt = new Date();
+    })();
+
+    try {
+      await this.sweeping;
+    } catch (error) {
+      // Without the active job list nothing is known to be safe to delete
+      console.error('❌ Janitor sweep skipped:', error.message);
+    } finally {
+      this.sweeping = null;
+    }
+  }
+
+  getStats() {
+    return {
+      reclaimedBytes: { ...this.reclaimedBytes },
+      removedFiles: { ...this.removedFiles },
+      diskUsageBytes: this.diskUsageBytes,
+      quotaBytes: this.quotaBytes,
+      lastSweepAt: this.lastSweepAt
+    };
+  }
+}
+
+// Create singleton instance
+const janitor = new Janitor();
+
+export default janitor;
@@ -0,0 +1,32 @@
+// In-process event bus for job progress
+// DatabaseService publishes progress, log and status changes here as they
+// happen, and the SSE status stream forwards them to connected clients.
+
+import { EventEmitter } from 'events';
+
+class JobEvents extends EventEmitter {
+  constructor() {
+    super();
+    // One listener per open SSE connection; there is no meaningful upper bound
+    this.setMaxListeners(0);
+  }
+
+  publish(jobId, event) {
+    this.emit(jobId, event);
+  }
+
+  // Returns an unsubscribe function
+  subscribe(jobId, listener) {
+    this.on(jobId, listener);
+    return () => this.off(jobId, listener);
+  }
+
+  hasSubscribers(jobId) {
+    return this.listenerCount(jobId) > 0;
+  }
+}
+
+// Create singleton instance
+const jobEvents = new JobEvents();
+
+export default jobEvents;
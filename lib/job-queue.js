@@ -0,0 +1,141 @@
+// Job queue for APK conversions
+// Jobs are persisted as `queued` in the jobs collection and claimed in FIFO
+// order by a bounded number of worker slots, so concurrent uploads wait their
+// turn instead of all converting at once. Slots are concurrent async tasks on
+// the main thread: a conversion is mostly file I/O, and its CPU-bound parts
+// run elsewhere (signing digests in the digest worker pool, inflate/deflate on
+// the libuv threadpool), so the event loop stays free for requests.
+//
+// Uploads are written to the receiving instance's local temp/, so each job
+// records that instance as its owner and only the owner claims it. The owner
+// renews a lease on its unfinished jobs; when an instance dies, its own
+// processing jobs are re-queued once it restarts under the same INSTANCE_ID,
+// and other instances fail its jobs after the lease has lapsed twice over.
+
+import os from 'os';
+import dbService from './database.js';
+
+const DEFAULT_MAX_WORKERS = Math.max(1, Math.floor(os.cpus().length / 2));
+const DEFAULT_POLL_INTERVAL_MS = 5000;
+const DEFAULT_LEASE_MS = 60000;
+
+class JobQueue {
+  constructor() {
+    this.maxWorkers = parseInt(process.env.MAX_CONCURRENT_JOBS, 10) || DEFAULT_MAX_WORKERS;
+    this.pollIntervalMs = parseInt(process.env.QUEUE_POLL_INTERVAL_MS, 10) || DEFAULT_POLL_INTERVAL_MS;
+    this.leaseMs = parseInt(process.env.JOB_LEASE_MS, 10) || DEFAULT_LEASE_MS;
+    this.instanceId = process.env.INSTANCE_ID || os.hostname();
+    this.running = new Map();
+    this.processor = null;
+    this.pumping = false;
+    this.pumpRequested = false;
+    this.pollTimer = null;
+    this.leaseTimer = null;
+  }
+
+  // Registers the function that runs a claimed job and starts draining the queue
+  setProcessor(processor) {
+    this.processor = processor;
+
+    if (!this.pollTimer) {
+      // Picks up jobs queued by other instances or left over from a restart
+      this.pollTimer = setInterval(() => this.pump(), this.pollIntervalMs);
+      this.pollTimer.unref();
+    }
+
+    if (!this.leaseTimer) {
+      // Renews well inside the lease so one slow round does not let it lapse
+      this.leaseTimer = setInterval(() => this.maintainLeases(), Math.max(1000, Math.floor(this.leaseMs / 3)));
+      this.leaseTimer.unref();
+    }
+
+    this.pump();
+  }
+
+  async enqueue(jobId, jobData) {
+    await dbService.saveJob(jobId, {
+      ...jobData,
+      status: 'queued',
+      queuedAt: new Date(),
+      owner: this.instanceId,
+      leaseExpiresAt: new Date(Date.now() + this.leaseMs)
+    });
+    this.pump();
+  }
+
+  async pump() {
+    if (this.pumping) {
+      this.pumpRequested = true;
+      return;
+    }
+
+    this.pumping = true;
+    try {
+      do {
+        this.pumpRequested = false;
+        while (this.processor && this.running.size < this.maxWorkers) {
+          const job = await dbService.claimNextQueuedJob(this.instanceId, this.leaseMs);
+          if (!job) {
+            break;
+          }
+          this.run(job);
+        }
+      } while (this.pumpRequested);
+    } catch (error) {
+      console.error('❌ Error claiming queued job:', error);
+    } finally {
+      this.pumping = false;
+    }
+  }
+
+  run(job) {
+    const task = Promise.resolve()
+      .then(() => this.processor(job))
+      .catch((error) => {
+        console.error(`❌ Job ${job._id} failed in worker slot:`, error);
+      })
+      .finally(() => {
+        this.running.delete(job._id);
+        this.pump();
+      });
+
+    this.running.set(job._id, task);
+  }
+
+  async maintainLeases() {
+    try {
+      await dbService.renewJobLeases(this.instanceId, [...this.running.keys()], this.leaseMs);
+      const { requeued, failed } = await dbService.recoverExpiredJobs(this.instanceId, this.leaseMs);
+      if (requeued > 0 || failed > 0) {
+        console.log(`🔄 Lease sweep re-queued ${requeued} and failed ${failed} abandoned job(s)`);
+        this.pump();
+      }
+    } catch (error) {
+      console.error('❌ Error maintaining job leases:', error);
+    }
+  }
+
+  isRunning(jobId) {
+    return this.running.has(jobId);
+  }
+
+  // 1-based position among queued jobs, or null when the job is not waiting
+  async getQueuePosition(job) {
+    if (!job || job.status !== 'queued') {
+      return null;
+    }
+    return dbService.getQueuePosition(job);
+  }
+
+  getStats() {
+    return {
+      inFlight: this.running.size,
+      maxWorkers: this.maxWorkers
+    };
+  }
+}
+
+// Create singleton instance
+const jobQueue = new JobQueue();
+
+export default jobQueue;
@@ -0,0 +1,157 @@
+// Declarative AndroidManifest.xml debug edits
+// One table of attribute and permission edits drives both the text manifest
+// transformer below (tokenize once, edit, serialize once) and the binary
+// manifest patcher in binary-xml.js. A new debug feature is a new table entry.
+
+import { ANDROID_NAMESPACE, TYPE_INT_BOOLEAN, TYPE_REFERENCE } from './binary-xml.js';
+
+/**
+ * Attribute edits. `value` is a boolean or { reference: 'type/name' };
+ * `overwrite` replaces a value the app already set; `textOnly` edits are
+ * skipped for compiled manifests.
+ */
+export const DEBUG_MANIFEST_EDITS = [
+  { element: 'application', attribute: 'debuggable', resourceId: 0x0101000f, value: true, overwrite: true },
+  { element: 'application', attribute: 'usesCleartextTraffic', resourceId: 0x010104ec, value: true, overwrite: true },
+  { element: 'application', attribute: 'networkSecurityConfig', resourceId: 0x01010527, value: { reference: 'xml/network_security_config' }, overwrite: false },
+  // Blocks installs from the on-device package installer, so compiled APKs do not get it
+  { element: 'application', attribute: 'testOnly', resourceId: 0x01010272, value: true, overwrite: false, textOnly: true }
+];
+
+// <uses-permission> entries added to text manifests when not already declared
+export const DEBUG_PERMISSIONS = [
+  'android.permission.INTERNET',
+  'android.permission.ACCESS_NETWORK_STATE',
+  'android.permission.WRITE_EXTERNAL_STORAGE',
+  'android.permission.READ_EXTERNAL_STORAGE'
+];
+
+const XML_TOKEN = /<!--[\s\S]*?-->|<!\[CDATA\[[\s\S]*?\]\]>|<\?[\s\S]*?\?>|<![^>]*>|<(\/?)([\w:.-]+)((?:\s+[\w:.-]+\s*=\s*(?:"[^"]*"|'[^']*'))*)\s*(\/?)>/g;
+const XML_ATTRIBUTE = /([\w:.-]+)(\s*=\s*)("([^"]*)"|'([^']*)')/g;
+
+function escapeAttribute(value) {
+  return value.replace(/&/g, '&amp;').replace(/"/g, '&quot;').replace(/</g, '&lt;');
+}
+
+// Start tags named in `names` (all when omitted) with attribute value positions;
+// comments, CDATA and PIs are skipped
+export function tokenizeXml(text, names = null) {
+  const tags = [];
+  for (const match of text.matchAll(XML_TOKEN)) {
+    const [token, closing, name, rawAttributes, selfClosing] = match;
+    if (!name || closing || (names && !names.has(name))) {
+      continue;
+    }
+
+    const attributesStart = match.index + 1 + name.length;
+    const attributes = [];
+    for (const attribute of rawAttributes.matchAll(XML_ATTRIBUTE)) {
+      const valueStart = attributesStart + attribute.index + attribute[1].length + attribute[2].length + 1;
+      const value = attribute[4] !== undefined ? attribute[4] : attribute[5];
+      attributes.push({ name: attribute[1], value, valueStart, valueEnd: valueStart + value.length });
+    }
+
+    tags.push({
+      name,
+      attributes,
+      start: match.index,
+      // Where new attributes go: before "/>" or ">"
+      insertAt: match.index + token.length - (selfClosing ? 2 : 1),
+      end: match.index + token.length
+    });
+  }
+  return tags;
+}
+
+function formatValue(value, references) {
+  if (typeof value === 'boolean') {
+    return String(value);
+  }
+  return references[value.reference] || `@${value.reference}`;
+}
+
+/**
+ * Applies attribute edits and permission additions to a text manifest in one
+ * pass. `references` maps 'type/name' references to the text to write, e.g.
+ * { 'xml/network_security_config': '@xml/network_security_config' }.
+ * Returns { text, applied } with applied listing what was changed.
+ */
+export function transformTextManifest(text, { edits = DEBUG_MANIFEST_EDITS, permissions = DEBUG_PERMISSIONS, references = {} } = {}) {
+  const tags = tokenizeXml(text, new Set(['manifest', 'uses-permission', ...edits.map(edit => edit.element)]));
+  const manifest = tags.find(tag => tag.name === 'manifest');
+  if (!manifest) {
+    throw new Error('No <manifest> element found');
+  }
+
+  const namespaceDeclaration = manifest.attributes.find(attribute => (
+    attribute.name.startsWith('xmlns:') && attribute.value === ANDROID_NAMESPACE
+  ));
+  const prefix = namespaceDeclaration ? namespaceDeclaration.name.slice('xmlns:'.length) : 'android';
+  const qualify = name => `${prefix}:${name}`;
+
+  const splices = []; // { start, end, text }
+  const applied = [];
+
+  const declared = new Set(tags
+    .filter(tag => tag.name === 'uses-permission')
+    .map(tag => (tag.attributes.find(attribute => attribute.name === qualify('name')) || {}).value));
+  const missingPermissions = permissions.filter(permission => !declared.has(permission));
+  if (missingPermissions.length > 0) {
+    splices.push({
+      start: manifest.end,
+      end: manifest.end,
+      text: missingPermissions.map(permission => `\n    <uses-permission ${qualify('name')}="${permission}" />`).join('')
+    });
+    applied.push(...missingPermissions.map(permission => `uses-permission ${permission}`));
+  }
+
+  for (const edit of edits) {
+    const element = tags.find(tag => tag.name === edit.element);
+    if (!element) {
+      continue;
+    }
+
+    const value = escapeAttribute(formatValue(edit.value, references));
+    const existing = element.attributes.find(attribute => attribute.name === qualify(edit.attribute));
+    if (!existing) {
+      splices.push({ start: element.insertAt, end: element.insertAt, text: ` ${qualify(edit.attribute)}="${value}"` });
+      applied.push(edit.attribute);
+    } else if (edit.overwrite && existing.value !== value) {
+      splices.push({ start: existing.valueStart, end: existing.valueEnd, text: value });
+      applied.push(edit.attribute);
+    }
+  }
+
+  if (splices.length === 0) {
+    return { text, applied };
+  }
+
+  // Splices are applied in document order (stable for equal positions) while copying the input once
+  splices.sort((a, b) => a.start - b.start);
+  const output = [];
+  let position = 0;
+  for (const splice of splices) {
+    output.push(text.slice(position, splice.start), splice.text);
+    position = splice.end;
+  }
+  output.push(text.slice(position));
+  return { text: output.join(''), applied };
+}
+
+/**
+ * Converts the edit table for binary-xml.js setElementAttributes().
+ * `resourceIds` maps 'type/name' references to resource IDs; edits whose
+ * reference has no ID, and textOnly edits, are left out.
+ */
+export function binaryAttributeEdits(element, { edits = DEBUG_MANIFEST_EDITS, resourceIds = {} } = {}) {
+  return edits
+    .filter(edit => edit.element === element && !edit.textOnly)
+    .filter(edit => typeof edit.value === 'boolean' || resourceIds[edit.value.reference])
+    .map(edit => ({
+      name: edit.attribute,
+      resourceId: edit.resourceId,
+      dataType: typeof edit.value === 'boolean' ? TYPE_INT_BOOLEAN : TYPE_REFERENCE,
+      data: typeof edit.value === 'boolean' ? (edit.value ? 0xffffffff : 0) : resourceIds[edit.value.reference],
+      overwrite: edit.overwrite
+    }));
+}
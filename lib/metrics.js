@@ -0,0 +1,222 @@
+// Prometheus metrics for /api/metrics
+// Stage latency quantiles and throughput come from the pipeline's per-stage
+// measurements; queue depth, in-flight jobs, MongoDB round trip and temp/ disk
+// usage are sampled when the endpoint is scraped. Event loop lag is a
+// cumulative histogram fed by a timer, so every scraper sees the same series.
+
+import { performance } from 'perf_hooks';
+import dbService from './database.js';
+import jobQueue from './job-queue.js';
+import janitor from './janitor.js';
+
+const QUANTILES = [0.5, 0.95, 0.99];
+const STAGE_WINDOW = 1024; // Most recent samples per stage used for quantiles and throughput
+const EVENT_LOOP_SAMPLE_MS = 20;
+const EVENT_LOOP_LAG_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]; // Seconds
+
+function quantile(sorted, q) {
+  if (sorted.length === 0) {
+    return NaN;
+  }
+  return sorted[Math.min(sorted.length - 1, Math.ceil(q * sorted.length) - 1)];
+}
+
+function formatValue(value) {
+  if (Number.isNaN(value)) {
+    return 'NaN';
+  }
+  return Number.isFinite(value) ? String(value) : (value > 0 ? '+Inf' : '-Inf');
+}
+
+function escapeLabel(value) {
+  return String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+}
+
+class MetricFamilies {
+  constructor() {
+    this.lines = [];
+  }
+
+  family(name, type, help) {
+    this.lines.push(`# HELP ${name} ${help}`, `# TYPE ${name} ${type}`);
+    return this;
+  }
+
+  sample(name, value, labels = {}) {
+    const pairs = Object.entries(labels).map(([key, label]) => `${key}="${escapeLabel(label)}"`);
+    this.lines.push(`${name}${pairs.length > 0 ? `{${pairs.join(',')}}` : ''} ${formatValue(value)}`);
+    return this;
+  }
+
+  toString() {
+    return `${this.lines.join('\n')}\n`;
+  }
+}
+
+class Metrics {
+  constructor() {
+    this.stages = new Map();
+    this.eventLoopLag = { buckets: EVENT_LOOP_LAG_BUCKETS.map(() => 0), sum: 0, count: 0 };
+    this.startEventLoopSampler();
+  }
+
+  // Lag is how much later than scheduled each timer tick runs
+  startEventLoopSampler() {
+    let expected = performance.now() + EVENT_LOOP_SAMPLE_MS;
+    const timer = setInterval(() => {
+      const now = performance.now();
+      this.observeEventLoopLag(Math.max(0, now - expected) / 1000);
+      expected = now + EVENT_LOOP_SAMPLE_MS;
+    }, EVENT_LOOP_SAMPLE_MS);
+    timer.unref();
+  }
+
+  observeEventLoopLag(seconds) {
+    const lag = this.eventLoopLag;
+    EVENT_LOOP_LAG_BUCKETS.forEach((bound, i) => {
+      if (seconds <= bound) {
+        lag.buckets[i]++;
+      }
+    });
+    lag.sum += seconds;
+    lag.count++;
+  }
+
+  // Records one pipeline stage measurement ({ name, wallMs, cpuMs, bytes, status })
+  observeStage(metric) {
+    let stage = this.stages.get(metric.name);
+    if (!stage) {
+      stage = { window: [], next: 0, count: 0, seconds: 0, cpuSeconds: 0, bytes: 0, errors: 0 };
+      this.stages.set(metric.name, stage);
+    }
+
+    if (metric.status === 'error') {
+      stage.errors++;
+      return;
+    }
+
+    const sample = { seconds: metric.wallMs / 1000, bytes: metric.bytes };
+    if (stage.window.length < STAGE_WINDOW) {
+      stage.window.push(sample);
+    } else {
+      stage.window[stage.next] = sample;
+      stage.next = (stage.next + 1) % STAGE_WINDOW;
+    }
+    stage.count++;
+    stage.seconds += sample.seconds;
+    stage.cpuSeconds += metric.cpuMs / 1000;
+    stage.bytes += metric.bytes;
+  }
+
+  addStageMetrics(output) {
+    const stages = [...this.stages.entries()];
+
+    output.family('apk_stage_duration_seconds', 'summary', 'Wall time of conversion pipeline stages');
+    for (const [name, stage] of stages) {
+      const sorted = stage.window.map(sample => sample.seconds).sort((a, b) => a - b);
+      for (const q of QUANTILES) {
+        output.sample('apk_stage_duration_seconds', quantile(sorted, q), { stage: name, quantile: q });
+      }
+      output.sample('apk_stage_duration_seconds_sum', stage.seconds, { stage: name });
+      output.sample('apk_stage_duration_seconds_count', stage.count, { stage: name });
+    }
+
+    output.family('apk_stage_cpu_seconds_total', 'counter', 'Process CPU time spent while stages ran (overlaps for concurrent stages)');
+    for (const [name, stage] of stages) {
+      output.sample('apk_stage_cpu_seconds_total', stage.cpuSeconds, { stage: name });
+    }
+
+    output.family('apk_stage_bytes_total', 'counter', 'Bytes read or written by conversion pipeline stages');
+    for (const [name, stage] of stages) {
+      output.sample('apk_stage_bytes_total', stage.bytes, { stage: name });
+    }
+
+    output.family('apk_stage_throughput_megabytes_per_second', 'gauge', `Stage throughput over the last ${STAGE_WINDOW} runs`);
+    for (const [name, stage] of stages) {
+      const seconds = stage.window.reduce((sum, sample) => sum + sample.seconds, 0);
+      const bytes = stage.window.reduce((sum, sample) => sum + sample.bytes, 0);
+      output.sample('apk_stage_throughput_megabytes_per_second', seconds > 0 ? bytes / seconds / 1e6 : 0, { stage: name });
+    }
+
+    output.family('apk_stage_errors_total', 'counter', 'Conversion pipeline stages that failed');
+    for (const [name, stage] of stages) {
+      output.sample('apk_stage_errors_total', stage.errors, { stage: name });
+    }
+  }
+
+  async addQueueMetrics(output) {
+    const [jobStats, roundTripMs] = await Promise.all([
+      dbService.getJobStats(),
+      dbService.measureRoundTrip()
+    ]);
+    const queue = jobQueue.getStats();
+
+    output.family('apk_queue_depth', 'gauge', 'Jobs waiting for a worker slot')
+      .sample('apk_queue_depth', jobStats.queued);
+    output.family('apk_jobs_in_flight', 'gauge', 'Jobs running in this process')
+      .sample('apk_jobs_in_flight', queue.inFlight);
+    output.family('apk_worker_slots', 'gauge', 'Maximum concurrent jobs in this process')
+      .sample('apk_worker_slots', queue.maxWorkers);
+
+    output.family('apk_jobs', 'gauge', 'Jobs by status');
+    for (const status of ['queued', 'processing', 'completed', 'errors']) {
+      output.sample('apk_jobs', jobStats[status], { status: status === 'errors' ? 'error' : status });
+    }
+
+    output.family('apk_mongodb_up', 'gauge', 'Whether MongoDB is connected (0 means in-memory fallback)')
+      .sample('apk_mongodb_up', roundTripMs === null ? 0 : 1);
+    const circuit = dbService.getConnectionState();
+    output.family('apk_mongodb_circuit_open', 'gauge', 'Whether the database circuit breaker is open or half-open')
+      .sample('apk_mongodb_circuit_open', circuit.state === 'open' || circuit.state === 'half-open' ? 1 : 0);
+    if (roundTripMs !== null) {
+      output.family('apk_mongodb_round_trip_seconds', 'gauge', 'MongoDB ping round trip measured at scrape time')
+        .sample('apk_mongodb_round_trip_seconds', roundTripMs / 1000);
+    }
+  }
+
+  addJanitorMetrics(output) {
+    const stats = janitor.getStats();
+
+    output.family('apk_janitor_reclaimed_bytes_total', 'counter', 'Bytes removed from temp/ by the janitor');
+    for (const [reason, bytes] of Object.entries(stats.reclaimedBytes)) {
+      output.sample('apk_janitor_reclaimed_bytes_total', bytes, { reason });
+    }
+    output.family('apk_janitor_removed_files_total', 'counter', 'Files and directories removed from temp/ by the janitor');
+    for (const [reason, count] of Object.entries(stats.removedFiles)) {
+      output.sample('apk_janitor_removed_files_total', count, { reason });
+    }
+    output.family('apk_temp_disk_usage_bytes', 'gauge', 'Bytes in temp/uploads and temp/output after the last janitor sweep')
+      .sample('apk_temp_disk_usage_bytes', stats.diskUsageBytes);
+    output.family('apk_temp_disk_quota_bytes', 'gauge', 'Disk quota the janitor enforces on temp/uploads and temp/output')
+      .sample('apk_temp_disk_quota_bytes', stats.quotaBytes);
+    if (stats.lastSweepAt) {
+      output.family('apk_janitor_last_sweep_timestamp_seconds', 'gauge', 'Unix time of the last completed janitor sweep')
+        .sample('apk_janitor_last_sweep_timestamp_seconds', stats.lastSweepAt.getTime() / 1000);
+    }
+  }
+
+  addEventLoopMetrics(output) {
+    const lag = this.eventLoopLag;
+    output.family('nodejs_eventloop_lag_seconds', 'histogram', `Event loop lag, sampled every ${EVENT_LOOP_SAMPLE_MS}ms`);
+    EVENT_LOOP_LAG_BUCKETS.forEach((bound, i) => {
+      output.sample('nodejs_eventloop_lag_seconds_bucket', lag.buckets[i], { le: bound });
+    });
+    output.sample('nodejs_eventloop_lag_seconds_bucket', lag.count, { le: '+Inf' })
+      .sample('nodejs_eventloop_lag_seconds_sum', lag.sum)
+      .sample('nodejs_eventloop_lag_seconds_count', lag.count);
+  }
+
+  async render() {
+    const output = new MetricFamilies();
+    this.addStageMetrics(output);
+    await this.addQueueMetrics(output);
+    this.addJanitorMetrics(output);
+    this.addEventLoopMetrics(output);
+    return output.toString();
+  }
+}
+
+// Create singleton instance
+const metrics = new Metrics();
+
+export default metrics;
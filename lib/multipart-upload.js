@@ -0,0 +1,216 @@
+// Streaming multipart/form-data receiver for APK uploads
+// The file part is written straight to disk with backpressure while its size
+// limit, ZIP magic bytes and SHA-256 are checked in the same pass, so an
+// upload is never buffered in memory as a whole.
+
+import { createWriteStream, promises as fs } from 'fs';
+import { once } from 'events';
+import crypto from 'crypto';
+
+const ZIP_MAGIC = Buffer.from([0x50, 0x4b, 0x03, 0x04]);
+const HEADER_SEPARATOR = Buffer.from('\r\n\r\n');
+const MAX_HEADER_BYTES = 16 * 1024;
+
+export class UploadError extends Error {
+  constructor(message, status = 400) {
+    super(message);
+    this.name = 'UploadError';
+    this.status = status;
+  }
+}
+
+function getBoundary(contentType) {
+  const match = /boundary=(?:"([^"]+)"|([^;]+))/i.exec(contentType || '');
+  return match ? (match[1] || match[2]).trim() : null;
+}
+
+function parsePartHeaders(raw) {
+  const headers = {};
+  for (const line of raw.toString('utf8').split('\r\n')) {
+    const separator = line.indexOf(':');
+    if (separator > 0) {
+      headers[line.slice(0, separator).trim().toLowerCase()] = line.slice(separator + 1).trim();
+    }
+  }
+
+  const disposition = headers['content-disposition'] || '';
+  const name = /\bname="([^"]*)"/i.exec(disposition);
+  const fileName = /\bfilename="([^"]*)"/i.exec(disposition);
+  return {
+    name: name ? name[1] : null,
+    fileName: fileName ? fileName[1] : null
+  };
+}
+
+class FilePartWriter {
+  constructor(destination, maxBytes) {
+    this.destination = destination;
+    this.maxBytes = maxBytes;
+    this.stream = createWriteStream(destination);
+    this.hash = crypto.createHash('sha256');
+    this.size = 0;
+    this.head = Buffer.alloc(0);
+    this.streamError = null;
+    this.stream.on('error', (error) => {
+      this.streamError = error;
+    });
+  }
+
+  async write(chunk) {
+    if (chunk.length === 0) {
+      return;
+    }
+    if (this.streamError) {
+      throw this.streamError;
+    }
+
+    this.size += chunk.length;
+    if (this.size > this.maxBytes) {
+      throw new UploadError('File too large');
+    }
+
+    if (this.head.length < ZIP_MAGIC.length) {
+      this.head = Buffer.concat([this.head, chunk.subarray(0, ZIP_MAGIC.length - this.head.length)]);
+      if (!ZIP_MAGIC.subarray(0, this.head.length).equals(this.head)) {
+        throw new UploadError('Invalid file type');
+      }
+    }
+
+    this.hash.update(chunk);
+    if (!this.stream.write(chunk)) {
+      await once(this.stream, 'drain');
+    }
+  }
+
+  async finish() {
+    if (this.head.length < ZIP_MAGIC.length) {
+      throw new UploadError('Invalid file type');
+    }
+    this.stream.end();
+    await once(this.stream, 'finish');
+    if (this.streamError) {
+      throw this.streamError;
+    }
+    return { size: this.size, sha256: this.hash.digest('hex') };
+  }
+
+  async abort() {
+    this.stream.destroy();
+    await fs.rm(this.destination, { force: true });
+  }
+}
+
+/**
+ * Streams the `fieldName` file part of a multipart request to `destination`.
+ * Resolves with { fileName, size, sha256 }; rejects with an UploadError for
+ * missing, mistyped or oversized uploads, leaving no partial file behind.
+ */
+export async function receiveApkUpload(request, { destination, maxBytes, fieldName = 'apk' }) {
+  const boundary = getBoundary(request.headers.get('content-type'));
+  if (!boundary || !request.body) {
+    throw new UploadError('No APK file provided');
+  }
+
+  const declaredLength = parseInt(request.headers.get('content-length'), 10);
+  if (declaredLength > maxBytes + MAX_HEADER_BYTES * 4) {
+    throw new UploadError('File too large');
+  }
+
+  const delimiter = Buffer.from(`\r\n--${boundary}`);
+  // The first boundary has no leading CRLF; prepending one lets a single delimiter match all of them
+  let pending = Buffer.from('\r\n');
+  let state = 'preamble';
+  let part = null;
+  let writer = null;
+  let upload = null;
+  const reader = request.body.getReader();
+
+  try {
+    let done = false;
+    while (!done) {
+      const { value, done: finished } = await reader.read();
+      if (finished) {
+        break;
+      }
+      pending = pending.length > 0 ? Buffer.concat([pending, value]) : Buffer.from(value.buffer, value.byteOffset, value.byteLength);
+
+      let progressed = true;
+      while (progressed && !done) {
+        progressed = false;
+
+        if (state === 'preamble') {
+          const index = pending.indexOf(delimiter);
+          if (index === -1) {
+            pending = pending.subarray(Math.max(0, pending.length - delimiter.length + 1));
+          } else {
+            pending = pending.subarray(index + delimiter.length);
+            state = 'boundary';
+            progressed = true;
+          }
+        } else if (state === 'boundary' && pending.length >= 2) {
+          if (pending[0] === 0x2d && pending[1] === 0x2d) {
+            done = true;
+          } else {
+            pending = pending.subarray(2);
+            state = 'headers';
+            progressed = true;
+          }
+        } else if (state === 'headers') {
+          const index = pending.indexOf(HEADER_SEPARATOR);
+          if (index === -1) {
+            if (pending.length > MAX_HEADER_BYTES) {
+              throw new UploadError('Malformed multipart request');
+            }
+          } else {
+            part = parsePartHeaders(pending.subarray(0, index));
+            pending = pending.subarray(index + HEADER_SEPARATOR.length);
+            state = 'body';
+            progressed = true;
+
+            if (part.name === fieldName && part.fileName !== null && !upload) {
+              if (!part.fileName.endsWith('.apk')) {
+                throw new UploadError('Invalid file type');
+              }
+              writer = new FilePartWriter(destination, maxBytes);
+            }
+          }
+        } else if (state === 'body') {
+          const index = pending.indexOf(delimiter);
+          const end = index === -1 ? Math.max(0, pending.length - delimiter.length + 1) : index;
+
+          if (writer) {
+            await writer.write(pending.subarray(0, end));
+          }
+          pending = pending.subarray(index === -1 ? end : index + delimiter.length);
+
+          if (index !== -1) {
+            if (writer) {
+              upload = { fileName: part.fileName, ...(await writer.finish()) };
+              writer = null;
+            }
+            state = 'boundary';
+            progressed = true;
+          }
+        }
+      }
+    }
+
+    if (writer) {
+      throw new UploadError('Malformed multipart request');
+    }
+    if (!upload) {
+      throw new UploadError('No APK file provided');
+    }
+    return upload;
+  } catch (error) {
+    if (writer) {
+      await writer.abort();
+    } else if (upload) {
+      await fs.rm(destination, { force: true });
+    }
+    await reader.cancel().catch(() => {});
+    throw error;
+  } finally {
+    reader.releaseLock();
+  }
+}
@@ -0,0 +1,119 @@
+// Stage-based transform pipeline
+// Stages are registered with the context keys they read (inputs) and write
+// (outputs). A stage starts as soon as all of its inputs are available, so
+// stages that do not depend on each other run concurrently. Wall time, CPU
+// time and bytes processed are recorded for every stage.
+
+export class PipelineError extends Error {
+  constructor(message, cause, stages) {
+    super(message);
+    this.name = 'PipelineError';
+    this.cause = cause;
+    this.stages = stages;
+  }
+}
+
+export class Pipeline {
+  constructor() {
+    this.stages = [];
+  }
+
+  /**
+   * Registers a stage: { name, inputs, outputs, run(context, meter) }.
+   * run() resolves with an object holding every declared output and may add
+   * to meter.bytes. Any other fields (e.g. progress, label) are passed to
+   * the run hooks untouched.
+   */
+  register(stage) {
+    if (this.stages.some(existing => existing.name === stage.name)) {
+      throw new Error(`Pipeline stage ${stage.name} is already registered`);
+    }
+    this.stages.push({ inputs: [], outputs: [], ...stage });
+    return this;
+  }
+
+  async runStage(stage, context, hooks) {
+    const meter = { bytes: 0 };
+    const startedAt = new Date();
+    const startTime = process.hrtime.bigint();
+    const startCpu = process.cpuUsage();
+
+    let outputs = null;
+    let error = null;
+    try {
+      if (hooks.onStageStart) {
+        await hooks.onStageStart(stage);
+      }
+      outputs = (await stage.run(context, meter)) || {};
+      const missing = stage.outputs.filter(key => !(key in outputs));
+      if (missing.length > 0) {
+        throw new Error(`Stage ${stage.name} did not produce ${missing.join(', ')}`);
+      }
+    } catch (stageError) {
+      error = stageError;
+    }
+
+    // CPU time is process-wide, so it overlaps for stages that ran concurrently
+    const cpu = process.cpuUsage(startCpu);
+    const metric = {
+      name: stage.name,
+      startedAt,
+      wallMs: Number(process.hrtime.bigint() - startTime) / 1e6,
+      cpuMs: (cpu.user + cpu.system) / 1000,
+      bytes: meter.bytes,
+      status: error ? 'error' : 'completed'
+    };
+    return { stage, outputs, metric, error };
+  }
+
+  /**
+   * Runs every stage against `context`, which must already hold the inputs
+   * no stage produces. Outputs are merged into context as stages finish.
+   * Resolves with the per-stage metrics in completion order; on failure,
+   * waits for running stages and rejects with a PipelineError carrying them.
+   */
+  async run(context, hooks = {}) {
+    const available = new Set(Object.keys(context));
+    const pending = [...this.stages];
+    const running = new Map();
+    const metrics = [];
+    let failure = null;
+
+    while (pending.length > 0 || running.size > 0) {
+      if (!failure) {
+        for (const stage of pending.filter(candidate => candidate.inputs.every(key => available.has(key)))) {
+          pending.splice(pending.indexOf(stage), 1);
+          running.set(stage, this.runStage(stage, context, hooks));
+        }
+      }
+
+      if (running.size === 0) {
+        if (failure) {
+          break;
+        }
+        const blocked = pending.map(stage => `${stage.name} (needs ${stage.inputs.filter(key => !available.has(key)).join(', ')})`);
+        throw new PipelineError(`Pipeline cannot make progress: ${blocked.join('; ')}`, null, metrics);
+      }
+
+      const { stage, outputs, metric, error } = await Promise.race(running.values());
+      running.delete(stage);
+      metrics.push(metric);
+
+      if (error) {
+        failure = failure || { stage, error };
+      } else {
+        Object.assign(context, outputs);
+        stage.outputs.forEach(key => available.add(key));
+      }
+
+      if (hooks.onStageEnd) {
+        await hooks.onStageEnd(stage, metric, metrics);
+      }
+    }
+
+    if (failure) {
+      throw new PipelineError(failure.error.message, failure.error, metrics);
+    }
+    return metrics;
+  }
+}
@@ -0,0 +1,125 @@
+// Readiness state for /api/ready
+// Liveness (/api/health) only needs the process to answer; readiness says
+// whether this instance should receive new work. Pool state and in-flight jobs
+// are read from process state, while queue depth, free disk in temp/ and tool
+// availability come from a background probe, so the endpoint never waits on
+// MongoDB or the filesystem and a slow database sheds load instead of failing
+// the container's health check.
+
+import { promises as fs, constants as fsConstants } from 'fs';
+import dbService from './database.js';
+import jobQueue from './job-queue.js';
+import apkSigner from './apk-signer.js';
+
+const DEFAULT_PROBE_INTERVAL_MS = 10000;
+const PROBE_TIMEOUT_MS = 2000;
+const DEFAULT_MIN_FREE_DISK_BYTES = 1024 * 1024 * 1024; // 1GB, the largest upload is 100MB
+const DEFAULT_MAX_QUEUED_JOBS = 20;
+const STALE_PROBES = 3; // Probe results older than this many intervals no longer count
+
+function withTimeout(promise, ms) {
+  let timer;
+  const timeout = new Promise((_, reject) => {
+    timer = setTimeout(() => reject(new Error(`Probe timed out after ${ms}ms`)), ms);
+  });
+  return Promise.race([promise, timeout]).finally(() => clearTimeout(timer));
+}
+
+class Readiness {
+  constructor() {
+    this.probeIntervalMs = parseInt(process.env.READY_PROBE_INTERVAL_MS, 10) || DEFAULT_PROBE_INTERVAL_MS;
+    this.minFreeDiskBytes = parseInt(process.env.READY_MIN_FREE_DISK_BYTES, 10) || DEFAULT_MIN_FREE_DISK_BYTES;
+    this.maxQueuedJobs = parseInt(process.env.READY_MAX_QUEUED_JOBS, 10) || DEFAULT_MAX_QUEUED_JOBS;
+    this.tempDir = null;
+    this.timer = null;
+    this.probing = null;
+    this.probe = null;
+  }
+
+  // Starts the background probe of temp/ and the database
+  start({ tempDir }) {
+    this.tempDir = tempDir;
+
+    if (!this.timer) {
+      this.timer = setInterval(() => this.runProbe(), this.probeIntervalMs);
+      this.timer.unref();
+      this.runProbe();
+    }
+  }
+
+  async runProbe() {
+    if (this.probing) {
+      return this.probing;
+    }
+
+    this.probing = (async () => {
+      const [queue, freeDiskBytes, tempWritable] = await Promise.all([
+        // Counter read, a single document; a timeout marks the database unresponsive
+        withTimeout(dbService.getJobStats(), PROBE_TIMEOUT_MS)
+          .then(stats => ({ queued: stats.queued, responsive: stats.storage !== 'error' }))
+          .catch(() => ({ queued: null, responsive: false })),
+        fs.statfs(this.tempDir)
+          .then(stats => stats.bavail * stats.bsize)
+          .catch(() => null),
+        fs.access(this.tempDir, fsConstants.W_OK)
+          .then(() => true, () => false)
+      ]);
+
+      this.probe = { checkedAt: Date.now(), ...queue, freeDiskBytes, tempWritable };
+    })();
+
+    try {
+      await this.probing;
+    } finally {
+      this.probing = null;
+    }
+  }
+
+  getStatus() {
+    const probe = this.probe;
+    const probeAgeMs = probe ? Date.now() - probe.checkedAt : null;
+    const queue = jobQueue.getStats();
+    const signingKey = Boolean(apkSigner.privateKey);
+
+    const checks = {
+      probe: probe !== null && probeAgeMs <= this.probeIntervalMs * STALE_PROBES,
+      // Jobs saved to the in-memory fallback are invisible to other instances
+      database: dbService.backend === 'memory' || (dbService.isConnected && probe !== null && probe.responsive),
+      queue: probe === null || probe.queued === null || probe.queued < this.maxQueuedJobs,
+      disk: probe === null || probe.freeDiskBytes === null || probe.freeDiskBytes >= this.minFreeDiskBytes,
+      tools: signingKey && (probe === null || probe.tempWritable)
+    };
+
+    return {
+      ready: Object.values(checks).every(Boolean),
+      checks,
+      database: {
+        backend: dbService.backend,
+        connected: dbService.isConnected,
+        responsive: probe ? probe.responsive : null,
+        circuit: dbService.getConnectionState(),
+        pool: dbService.getPoolStats()
+      },
+      queue: {
+        queued: probe ? probe.queued : null,
+        maxQueued: this.maxQueuedJobs,
+        inFlight: queue.inFlight,
+        maxWorkers: queue.maxWorkers
+      },
+      disk: {
+        freeBytes: probe ? probe.freeDiskBytes : null,
+        minFreeBytes: this.minFreeDiskBytes
+      },
+      tools: {
+        signingKey,
+        tempWritable: probe ? probe.tempWritable : null
+      },
+      probeAgeMs
+    };
+  }
+}
+
+// Create singleton instance
+const readiness = new Readiness();
+
+export default readiness;
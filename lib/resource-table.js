@@ -0,0 +1,304 @@
+// resources.arsc (ResTable) editor
+// Appends new entries to an app's compiled resource table without decoding
+// the rest of it: strings are appended to the global and key pools, and the
+// typeSpec/default-config type chunks of each touched type get new slots at
+// the end. Every other chunk is copied byte-for-byte, so the work done is
+// proportional to the patch, not to the size of the table.
+
+import { StringPool, RES_STRING_POOL_TYPE } from './string-pool.js';
+
+const RES_TABLE_TYPE = 0x0002;
+const RES_TABLE_PACKAGE_TYPE = 0x0200;
+const RES_TABLE_TYPE_TYPE = 0x0201;
+const RES_TABLE_TYPE_SPEC_TYPE = 0x0202;
+
+const APP_PACKAGE_ID = 0x7f;
+const TYPE_HEADER_BASE_SIZE = 20; // chunk header, id, flags, reserved, entryCount, entriesStart
+const DEFAULT_CONFIG_SIZE = 64;
+const FLAG_SPARSE = 0x01;
+const FLAG_OFFSET16 = 0x02;
+const NO_ENTRY = 0xffffffff;
+const NO_ENTRY16 = 0xffff;
+const ENTRY_FLAG_COMPACT = 0x0008;
+
+// Res_value data types used for new entries
+const TYPE_STRING = 0x03;
+const TYPE_INT_BOOLEAN = 0x12;
+
+function readChunks(buffer, start, end) {
+  const chunks = [];
+  for (let offset = start; offset < end;) {
+    const type = buffer.readUInt16LE(offset);
+    const size = buffer.readUInt32LE(offset + 4);
+    if (size < 8 || offset + size > end) {
+      throw new Error('Invalid resources.arsc: corrupt chunk size');
+    }
+    chunks.push({ type, offset, data: buffer.subarray(offset, offset + size) });
+    offset += size;
+  }
+  return chunks;
+}
+
+function withSize(buffer) {
+  buffer.writeUInt32LE(buffer.length, 4);
+  return buffer;
+}
+
+// A type chunk holds the default configuration when every field after `size` is zero
+function isDefaultConfig(chunk) {
+  const config = chunk.subarray(TYPE_HEADER_BASE_SIZE, chunk.readUInt16LE(2));
+  return config.subarray(4).every(byte => byte === 0);
+}
+
+function readTypeEntries(chunk) {
+  const headerSize = chunk.readUInt16LE(2);
+  const flags = chunk[9];
+  const entryCount = chunk.readUInt32LE(12);
+  const entriesStart = chunk.readUInt32LE(16);
+  const offsets = new Map(); // entry index -> offset into entry data
+
+  for (let i = 0; i < entryCount; i++) {
+    if (flags & FLAG_SPARSE) {
+      offsets.set(chunk.readUInt16LE(headerSize + i * 4), chunk.readUInt16LE(headerSize + i * 4 + 2) * 4);
+    } else if (flags & FLAG_OFFSET16) {
+      const offset = chunk.readUInt16LE(headerSize + i * 2);
+      if (offset !== NO_ENTRY16) {
+        offsets.set(i, offset * 4);
+      }
+    } else {
+      const offset = chunk.readUInt32LE(headerSize + i * 4);
+      if (offset !== NO_ENTRY) {
+        offsets.set(i, offset);
+      }
+    }
+  }
+
+  return { headerSize, flags, entryCount, offsets, entryData: chunk.subarray(entriesStart) };
+}
+
+function encodeEntry(keyIndex, dataType, data) {
+  const entry = Buffer.alloc(16);
+  entry.writeUInt16LE(8, 0);
+  entry.writeUInt32LE(keyIndex, 4);
+  entry.writeUInt16LE(8, 8);
+  entry[11] = dataType;
+  entry.writeUInt32LE(data, 12);
+  return entry;
+}
+
+// Rebuilds a type chunk with new entries appended after its existing slots
+function appendTypeEntries(chunk, additions) {
+  const { headerSize, flags, entryCount, offsets, entryData } = readTypeEntries(chunk);
+  const newData = [];
+  let dataLength = entryData.length;
+  for (const addition of additions) {
+    offsets.set(addition.index, dataLength);
+    newData.push(addition.entry);
+    dataLength += addition.entry.length;
+  }
+
+  let offsetTable;
+  let newCount;
+  if (flags & FLAG_SPARSE) {
+    newCount = offsets.size;
+    offsetTable = Buffer.alloc(newCount * 4);
+    [...offsets].sort((a, b) => a[0] - b[0]).forEach(([index, offset], i) => {
+      offsetTable.writeUInt16LE(index, i * 4);
+      offsetTable.writeUInt16LE(offset / 4, i * 4 + 2);
+    });
+  } else {
+    newCount = Math.max(entryCount, ...additions.map(addition => addition.index + 1));
+    const width = flags & FLAG_OFFSET16 ? 2 : 4;
+    offsetTable = Buffer.alloc(Math.ceil((newCount * width) / 4) * 4, 0xff);
+    for (const [index, offset] of offsets) {
+      if (width === 2) {
+        if (offset / 4 >= NO_ENTRY16) {
+          throw new Error('Resource type too large for 16-bit entry offsets');
+        }
+        offsetTable.writeUInt16LE(offset / 4, index * 2);
+      } else {
+        offsetTable.writeUInt32LE(offset, index * 4);
+      }
+    }
+  }
+
+  const header = Buffer.from(chunk.subarray(0, headerSize));
+  header.writeUInt32LE(newCount, 12);
+  header.writeUInt32LE(headerSize + offsetTable.length, 16);
+  return withSize(Buffer.concat([header, offsetTable, entryData, ...newData]));
+}
+
+function createTypeSpec(typeId, entryCount) {
+  const chunk = Buffer.alloc(16 + entryCount * 4);
+  chunk.writeUInt16LE(RES_TABLE_TYPE_SPEC_TYPE, 0);
+  chunk.writeUInt16LE(16, 2);
+  chunk[8] = typeId;
+  chunk.writeUInt32LE(entryCount, 12);
+  return withSize(chunk);
+}
+
+function createDefaultType(typeId, configSize) {
+  const headerSize = TYPE_HEADER_BASE_SIZE + configSize;
+  const chunk = Buffer.alloc(headerSize);
+  chunk.writeUInt16LE(RES_TABLE_TYPE_TYPE, 0);
+  chunk.writeUInt16LE(headerSize, 2);
+  chunk[8] = typeId;
+  chunk.writeUInt32LE(headerSize, 16);
+  chunk.writeUInt32LE(configSize, TYPE_HEADER_BASE_SIZE);
+  return withSize(chunk);
+}
+
+function patchPackage(packageChunk, globalPool, resources) {
+  const headerSize = packageChunk.readUInt16LE(2);
+  const packageId = packageChunk.readUInt32LE(8);
+  const typeStringsOffset = packageChunk.readUInt32LE(268);
+  const keyStringsOffset = packageChunk.readUInt32LE(276);
+  const typeIdOffset = headerSize >= 288 ? packageChunk.readUInt32LE(284) : 0;
+
+  const children = readChunks(packageChunk, headerSize, packageChunk.length);
+  const typePool = StringPool.parse(packageChunk, typeStringsOffset);
+  const keyPool = StringPool.parse(packageChunk, keyStringsOffset);
+  const chunks = children
+    .filter(chunk => chunk.offset !== typeStringsOffset && chunk.offset !== keyStringsOffset)
+    .map(chunk => ({ type: chunk.type, data: chunk.data }));
+
+  const configSizes = chunks.filter(chunk => chunk.type === RES_TABLE_TYPE_TYPE)
+    .map(chunk => chunk.data.readUInt32LE(TYPE_HEADER_BASE_SIZE));
+  const configSize = configSizes.length > 0 ? configSizes[0] : DEFAULT_CONFIG_SIZE;
+
+  const ids = new Map();
+  const byType = new Map();
+  for (const resource of resources) {
+    if (!byType.has(resource.type)) {
+      byType.set(resource.type, []);
+    }
+    byType.get(resource.type).push(resource);
+  }
+
+  for (const [typeName, typeResources] of byType) {
+    let typeIndex = typePool.indexOf(typeName);
+    if (typeIndex === -1) {
+      typeIndex = typePool.append([typeName]);
+    }
+    const typeId = typeIndex + 1 + typeIdOffset;
+    if (typeId > 0xff) {
+      throw new Error('Resource table has no room for another type');
+    }
+
+    let specPosition = chunks.findIndex(chunk => chunk.type === RES_TABLE_TYPE_SPEC_TYPE && chunk.data[8] === typeId);
+    const specCreated = specPosition === -1;
+    if (specCreated) {
+      chunks.push({ type: RES_TABLE_TYPE_SPEC_TYPE, data: createTypeSpec(typeId, 0) });
+      specPosition = chunks.length - 1;
+    }
+
+    let typePosition = chunks.findIndex(chunk => (
+      chunk.type === RES_TABLE_TYPE_TYPE && chunk.data[8] === typeId && isDefaultConfig(chunk.data)
+    ));
+    if (typePosition === -1) {
+      let lastOfType = specPosition;
+      chunks.forEach((chunk, i) => {
+        if (chunk.type === RES_TABLE_TYPE_TYPE && chunk.data[8] === typeId) {
+          lastOfType = i;
+        }
+      });
+      chunks.splice(lastOfType + 1, 0, { type: RES_TABLE_TYPE_TYPE, data: createDefaultType(typeId, configSize) });
+      typePosition = lastOfType + 1;
+
+      // typesCount (0 in tables from older aapt) counts the type chunks following the spec
+      const spec = Buffer.from(chunks[specPosition].data);
+      const typesCount = spec.readUInt16LE(10);
+      if (typesCount > 0 || specCreated) {
+        spec.writeUInt16LE(typesCount + 1, 10);
+        chunks[specPosition] = { type: RES_TABLE_TYPE_SPEC_TYPE, data: spec };
+      }
+    }
+
+    // Entries already in the default configuration, by key, so re-patching reuses them
+    const defaultType = readTypeEntries(chunks[typePosition].data);
+    const existingKeys = new Map();
+    for (const [index, offset] of defaultType.offsets) {
+      const compact = defaultType.entryData.readUInt16LE(offset + 2) & ENTRY_FLAG_COMPACT;
+      existingKeys.set(compact ? defaultType.entryData.readUInt16LE(offset) : defaultType.entryData.readUInt32LE(offset + 4), index);
+    }
+
+    const spec = chunks[specPosition].data;
+    let nextIndex = spec.readUInt32LE(12);
+    const additions = [];
+    for (const resource of typeResources) {
+      let keyIndex = keyPool.indexOf(resource.name);
+      if (keyIndex !== -1 && existingKeys.has(keyIndex)) {
+        ids.set(`${typeName}/${resource.name}`, ((packageId << 24) | (typeId << 16) | existingKeys.get(keyIndex)) >>> 0);
+        continue;
+      }
+      if (keyIndex === -1) {
+        keyIndex = keyPool.append([resource.name]);
+      }
+
+      let dataType = TYPE_STRING;
+      let data;
+      if (resource.kind === 'bool') {
+        dataType = TYPE_INT_BOOLEAN;
+        data = resource.value ? 0xffffffff : 0;
+      } else {
+        data = globalPool.append([resource.value]);
+      }
+
+      additions.push({ index: nextIndex, entry: encodeEntry(keyIndex, dataType, data) });
+      ids.set(`${typeName}/${resource.name}`, ((packageId << 24) | (typeId << 16) | nextIndex) >>> 0);
+      nextIndex++;
+    }
+
+    if (additions.length > 0) {
+      const specCount = spec.readUInt32LE(12);
+      const newSpec = Buffer.concat([spec, Buffer.alloc((nextIndex - specCount) * 4)]);
+      newSpec.writeUInt32LE(nextIndex, 12);
+      chunks[specPosition] = { type: RES_TABLE_TYPE_SPEC_TYPE, data: withSize(newSpec) };
+      chunks[typePosition] = { type: RES_TABLE_TYPE_TYPE, data: appendTypeEntries(chunks[typePosition].data, additions) };
+    }
+  }
+
+  const typeStrings = typePool.toBuffer();
+  const keyStrings = keyPool.toBuffer();
+  const header = Buffer.from(packageChunk.subarray(0, headerSize));
+  header.writeUInt32LE(headerSize, 268);
+  header.writeUInt32LE(headerSize + typeStrings.length, 276);
+  return {
+    buffer: withSize(Buffer.concat([header, typeStrings, keyStrings, ...chunks.map(chunk => chunk.data)])),
+    ids
+  };
+}
+
+/**
+ * Adds resources to the app package of a compiled resources.arsc.
+ * Each resource is { type, name, kind, value } where kind is 'bool' for
+ * boolean values and 'string' otherwise (string values, and file paths such
+ * as res/xml/foo.xml for file-based types). Resources whose type/name already
+ * exist in the default configuration are left untouched.
+ * Returns { buffer, ids } with ids mapping "type/name" to the resource ID.
+ */
+export function addResources(buffer, resources) {
+  if (buffer.length < 12 || buffer.readUInt16LE(0) !== RES_TABLE_TYPE) {
+    throw new Error('Invalid resources.arsc: missing table header');
+  }
+
+  const headerSize = buffer.readUInt16LE(2);
+  const chunks = readChunks(buffer, headerSize, buffer.readUInt32LE(4));
+  const poolPosition = chunks.findIndex(chunk => chunk.type === RES_STRING_POOL_TYPE);
+  const packages = chunks.filter(chunk => chunk.type === RES_TABLE_PACKAGE_TYPE);
+  const appPackage = packages.find(chunk => chunk.data.readUInt32LE(8) === APP_PACKAGE_ID) || packages[0];
+  if (poolPosition === -1 || !appPackage) {
+    throw new Error('Invalid resources.arsc: missing string pool or package');
+  }
+
+  const globalPool = StringPool.parse(chunks[poolPosition].data);
+  const { buffer: packageBuffer, ids } = patchPackage(appPackage.data, globalPool, resources);
+
+  const output = chunks.map((chunk) => {
+    if (chunk === chunks[poolPosition]) return globalPool.toBuffer();
+    if (chunk === appPackage) return packageBuffer;
+    return chunk.data;
+  });
+  const table = withSize(Buffer.concat([buffer.subarray(0, headerSize), ...output]));
+  return { buffer: table, ids };
+}
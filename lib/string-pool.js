@@ -0,0 +1,213 @@
+// ResStringPool chunk reader/writer
+// Shared by the binary XML (AndroidManifest.xml) and resource table
+// (resources.arsc) editors. Existing string data is kept byte-for-byte; new
+// strings are appended to the data region and only the offset table grows.
+
+export const RES_STRING_POOL_TYPE = 0x0001;
+
+const HEADER_SIZE = 28;
+const SORTED_FLAG = 0x0001;
+const UTF8_FLAG = 0x0100;
+const NO_ENTRY = 0xffffffff;
+
+function padTo4(buffer) {
+  const padding = (4 - (buffer.length % 4)) % 4;
+  return padding ? Buffer.concat([buffer, Buffer.alloc(padding)]) : buffer;
+}
+
+function encodeLength8(length) {
+  return length > 0x7f ? [0x80 | (length >> 8), length & 0xff] : [length];
+}
+
+function decodeLength8(buffer, offset) {
+  const first = buffer[offset];
+  return first & 0x80
+    ? { length: ((first & 0x7f) << 8) | buffer[offset + 1], size: 2 }
+    : { length: first, size: 1 };
+}
+
+function encodeString(text, utf8) {
+  if (utf8) {
+    const bytes = Buffer.from(text, 'utf8');
+    return Buffer.concat([
+      Buffer.from([...encodeLength8(text.length), ...encodeLength8(bytes.length)]),
+      bytes,
+      Buffer.from([0])
+    ]);
+  }
+
+  const units = Buffer.from(text, 'utf16le');
+  const length = units.length / 2;
+  const prefix = length > 0x7fff ? Buffer.alloc(4) : Buffer.alloc(2);
+  if (length > 0x7fff) {
+    prefix.writeUInt16LE(0x8000 | (length >> 16), 0);
+    prefix.writeUInt16LE(length & 0xffff, 2);
+  } else {
+    prefix.writeUInt16LE(length, 0);
+  }
+  return Buffer.concat([prefix, units, Buffer.alloc(2)]);
+}
+
+export class StringPool {
+  constructor({ flags, stringOffsets, styleOffsets, stringData, styleData }) {
+    this.flags = flags;
+    this.stringOffsets = stringOffsets;
+    this.styleOffsets = styleOffsets;
+    this.stringData = stringData;
+    this.styleData = styleData;
+    this.cache = new Map();
+  }
+
+  // Parses the string pool chunk starting at offset in buffer
+  static parse(buffer, offset = 0) {
+    const type = buffer.readUInt16LE(offset);
+    const headerSize = buffer.readUInt16LE(offset + 2);
+    const size = buffer.readUInt32LE(offset + 4);
+    if (type !== RES_STRING_POOL_TYPE || headerSize < HEADER_SIZE) {
+      throw new Error('Invalid string pool chunk');
+    }
+
+    const stringCount = buffer.readUInt32LE(offset + 8);
+    const styleCount = buffer.readUInt32LE(offset + 12);
+    const flags = buffer.readUInt32LE(offset + 16);
+    const stringsStart = buffer.readUInt32LE(offset + 20);
+    const stylesStart = buffer.readUInt32LE(offset + 24);
+
+    const readOffsets = (start, count) => Array.from({ length: count }, (_, i) => buffer.readUInt32LE(start + i * 4));
+    const stringOffsets = readOffsets(offset + headerSize, stringCount);
+    const styleOffsets = readOffsets(offset + headerSize + stringCount * 4, styleCount);
+
+    const stringsEnd = styleCount > 0 ? stylesStart : size;
+    return new StringPool({
+      flags,
+      stringOffsets,
+      styleOffsets,
+      stringData: stringCount > 0 ? buffer.subarray(offset + stringsStart, offset + stringsEnd) : Buffer.alloc(0),
+      styleData: styleCount > 0 ? buffer.subarray(offset + stylesStart, offset + size) : Buffer.alloc(0)
+    });
+  }
+
+  get isUtf8() {
+    return (this.flags & UTF8_FLAG) !== 0;
+  }
+
+  get length() {
+    return this.stringOffsets.length;
+  }
+
+  get(index) {
+    if (index === NO_ENTRY || index >= this.stringOffsets.length) {
+      return null;
+    }
+    if (this.cache.has(index)) {
+      return this.cache.get(index);
+    }
+
+    const data = this.stringData;
+    let offset = this.stringOffsets[index];
+    let value;
+    if (this.isUtf8) {
+      offset += decodeLength8(data, offset).size;
+      const byteLength = decodeLength8(data, offset);
+      offset += byteLength.size;
+      value = data.toString('utf8', offset, offset + byteLength.length);
+    } else {
+      let length = data.readUInt16LE(offset);
+      offset += 2;
+      if (length & 0x8000) {
+        length = ((length & 0x7fff) << 16) | data.readUInt16LE(offset);
+        offset += 2;
+      }
+      value = data.toString('utf16le', offset, offset + length * 2);
+    }
+
+    this.cache.set(index, value);
+    return value;
+  }
+
+  indexOf(value) {
+    for (let i = 0; i < this.stringOffsets.length; i++) {
+      if (this.get(i) === value) {
+        return i;
+      }
+    }
+    return -1;
+  }
+
+  /**
+   * Inserts strings so the first lands at `index`; every existing string at or
+   * after `index` moves up by strings.length, and callers must remap their
+   * references with shiftIndex(). Style span names are remapped here.
+   */
+  insert(index, strings) {
+    const encoded = strings.map(text => encodeString(text, this.isUtf8));
+    const base = padTo4(this.stringData);
+    const newOffsets = [];
+    let position = base.length;
+    for (const buffer of encoded) {
+      newOffsets.push(position);
+      position += buffer.length;
+    }
+
+    this.stringData = Buffer.concat([base, ...encoded]);
+    this.stringOffsets.splice(index, 0, ...newOffsets);
+    this.cache.clear();
+    // Inserted strings are not in sort order
+    this.flags &= ~SORTED_FLAG;
+
+    if (index < this.stringOffsets.length - strings.length && this.styleData.length > 0) {
+      this.styleData = Buffer.from(this.styleData);
+      // Each style is a list of (name, firstChar, lastChar) spans ended by NO_ENTRY
+      for (let offset = 0; offset + 4 <= this.styleData.length;) {
+        const name = this.styleData.readUInt32LE(offset);
+        if (name === NO_ENTRY) {
+          offset += 4;
+          continue;
+        }
+        if (name >= index) {
+          this.styleData.writeUInt32LE(name + strings.length, offset);
+        }
+        offset += 12;
+      }
+    }
+
+    return index;
+  }
+
+  // Appends strings at the end of the pool and returns the index of the first one
+  append(strings) {
+    return this.insert(this.stringOffsets.length, strings);
+  }
+
+  toBuffer() {
+    const stringData = this.stringOffsets.length > 0 ? padTo4(this.stringData) : Buffer.alloc(0);
+    const offsetsSize = (this.stringOffsets.length + this.styleOffsets.length) * 4;
+    const stringsStart = this.stringOffsets.length > 0 ? HEADER_SIZE + offsetsSize : 0;
+    const stylesStart = this.styleOffsets.length > 0 ? HEADER_SIZE + offsetsSize + stringData.length : 0;
+    const size = HEADER_SIZE + offsetsSize + stringData.length + this.styleData.length;
+
+    const buffer = Buffer.alloc(size);
+    buffer.writeUInt16LE(RES_STRING_POOL_TYPE, 0);
+    buffer.writeUInt16LE(HEADER_SIZE, 2);
+    buffer.writeUInt32LE(size, 4);
+    buffer.writeUInt32LE(this.stringOffsets.length, 8);
+    buffer.writeUInt32LE(this.styleOffsets.length, 12);
+    buffer.writeUInt32LE(this.flags, 16);
+    buffer.writeUInt32LE(stringsStart, 20);
+    buffer.writeUInt32LE(stylesStart, 24);
+
+    let offset = HEADER_SIZE;
+    for (const value of [...this.stringOffsets, ...this.styleOffsets]) {
+      buffer.writeUInt32LE(value, offset);
+      offset += 4;
+    }
+    stringData.copy(buffer, offset);
+    this.styleData.copy(buffer, offset + stringData.length);
+    return buffer;
+  }
+}
+
+// Remaps a string reference after StringPool.insert(index, strings)
+export function shiftIndex(reference, index, count) {
+  return reference !== NO_ENTRY && reference >= index ? reference + count : reference;
+}
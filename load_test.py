@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""Load generator for the APK conversion API.
+
+Grown from backend_test.py: instead of one upload polled every 5 seconds it
+submits many synthetic APKs from a pool of concurrent clients at a fixed or
+Poisson arrival rate, then reports upload latency, time to completion, error
+rate and server throughput. Inputs are sized filler APKs (--sizes) or the
+representative profiles from tests/apk_corpus.py (--profiles). Results are
+written as JSON (summary plus every request) and/or CSV (one row per request)
+and can be compared to an earlier JSON run with --baseline.
+
+With --rate the load is open loop: every request gets its own client thread,
+so a slow server never delays arrivals, and latencies are measured from each
+request's scheduled arrival time. Any client-side delay before the upload
+starts is reported separately as dispatch lag. With --rate 0 (closed loop)
+--concurrency clients each submit the next request when their last one is done.
+
+Examples:
+    python load_test.py --requests 50 --concurrency 8 --rate 2 --sizes 64KB,1MB,10MB
+    python load_test.py --requests 10 --sizes 100MB --json run.json --baseline previous.json
+    python load_test.py --requests 20 --profiles typical,sdk-heavy,game-100mb
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+
+from backend_test import create_test_apk
+from tests.apk_corpus import load_apk, with_marker
+
+DEFAULT_BASE_URL = os.getenv('NEXT_PUBLIC_BASE_URL', 'http://localhost:3000')
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 * 1024, 'GB': 1024 * 1024 * 1024}
+PERCENTILES = (50, 95, 99)
+
+# Summary metrics compared against a baseline run; True means higher is better
+BASELINE_METRICS = {
+    'upload_seconds.p50': False,
+    'upload_seconds.p95': False,
+    'completion_seconds.p50': False,
+    'completion_seconds.p95': False,
+    'completion_seconds.p99': False,
+    'error_rate': False,
+    'throughput.jobs_per_second': True,
+    'throughput.megabytes_per_second': True,
+}
+
+
+def parse_size(text):
+    """Parse sizes like '64KB', '1.5MB' or '2048' into bytes"""
+    text = text.strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= SIZE_UNITS[unit]:
+            return f"{size / SIZE_UNITS[unit]:.1f}{unit}"
+    return f"{size}B"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile; None for an empty sample"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[min(len(ordered), rank) - 1]
+
+
+class PayloadCache:
+    """Random filler bytes per size and corpus APKs per profile, loaded once and shared by all clients"""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.payloads = {}
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+    def get(self, size):
+        with self.lock:
+            if size not in self.payloads:
+                self.payloads[size] = random.Random(self.seed + size).randbytes(size)
+            return self.payloads[size]
+
+    def get_profile(self, profile):
+        with self.lock:
+            if profile not in self.profiles:
+                self.profiles[profile] = load_apk(profile)
+            return self.profiles[profile]
+
+
+def create_sized_apk(size, request_index, payloads):
+    """The backend_test.py APK padded to roughly `size` bytes with a stored native library.
+
+    Every request also gets a unique marker entry so the server's artifact
+    cache never short-circuits a conversion.
+    """
+    base_apk = create_test_apk()
+    apk_buffer = BytesIO(base_apk)
+    apk_buffer.seek(0, os.SEEK_END)
+
+    with zipfile.ZipFile(apk_buffer, 'a') as apk:
+        apk.writestr('assets/load_test_id.txt', f"{request_index}-{time.time_ns()}")
+        padding = size - len(base_apk) - 512
+        if padding > 0:
+            apk.writestr(
+                zipfile.ZipInfo('lib/arm64-v8a/libloadtest.so'),
+                payloads.get(padding),
+                compress_type=zipfile.ZIP_STORED,
+            )
+
+    return apk_buffer.getvalue()
+
+
+def create_input_apk(apk_input, request_index, payloads):
+    """A corpus profile (str) or a sized filler APK (int), unique per request"""
+    if isinstance(apk_input, str):
+        return with_marker(payloads.get_profile(apk_input), f"load-test-{request_index}-{time.time_ns()}")
+    return create_sized_apk(apk_input, request_index, payloads)
+
+
+def run_request(index, apk_input, args, payloads, started_at, scheduled_at=None):
+    """Upload one APK and poll until its job finishes; returns a result row.
+
+    Latencies are measured from `scheduled_at` (the open-loop arrival time) so
+    time spent waiting to be dispatched is not omitted; closed-loop requests
+    have no schedule and are measured from when their client picks them up.
+    """
+    picked_up = time.monotonic()
+    apk_data = create_input_apk(apk_input, index, payloads)
+    submit_time = time.monotonic()
+    arrival = picked_up if scheduled_at is None else scheduled_at
+    result = {
+        'index': index,
+        'input': apk_input if isinstance(apk_input, str) else format_size(apk_input),
+        'input_bytes': len(apk_data),
+        'submitted_at': round(arrival - started_at, 3),
+        'dispatch_lag_seconds': round(submit_time - arrival, 4),
+        'http_status': None,
+        'upload_seconds': None,
+        'completion_seconds': None,
+        'status': 'upload_failed',
+        'error': '',
+    }
+
+    session = requests.Session()
+    try:
+        files = {'apk': (f"load_test_{index}.apk", apk_data, 'application/vnd.android.package-archive')}
+        response = session.post(f"{args.api_base}/convert", files=files, timeout=args.upload_timeout)
+        result['upload_seconds'] = round(time.monotonic() - arrival, 4)
+        result['http_status'] = response.status_code
+        if response.status_code != 200:
+            result['error'] = response.text[:200]
+            return result
+        job_id = response.json().get('jobId')
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    # Poll without logs; the job is done when it reaches a final status
+    deadline = submit_time + args.job_timeout
+    result['status'] = 'timeout'
+    while time.monotonic() < deadline:
+        try:
+            status_response = session.get(f"{args.api_base}/status/{job_id}?fields=progress", timeout=10)
+            status_data = status_response.json() if status_response.status_code == 200 else {}
+        except Exception as e:
+            result['error'] = str(e)
+            status_data = {}
+
+        status = status_data.get('status')
+        if status in ('completed', 'error'):
+            result['completion_seconds'] = round(time.monotonic() - arrival, 4)
+            result['status'] = status
+            result['error'] = status_data.get('error') or ''
+            break
+        time.sleep(args.poll_interval)
+
+    return result
+
+
+def build_schedule(args, inputs):
+    """(offset seconds, size or profile) for every request; offsets are 0 when --rate is 0 (closed loop)"""
+    rng = random.Random(args.seed)
+    schedule = []
+    offset = 0.0
+    for index in range(args.requests):
+        apk_input = inputs[index % len(inputs)] if not args.shuffle_sizes else rng.choice(inputs)
+        schedule.append((offset, apk_input))
+        if args.rate > 0:
+            offset += rng.expovariate(args.rate) if args.poisson else 1.0 / args.rate
+    return schedule
+
+
+def summarize(results, wall_seconds, args):
+    uploads = [r['upload_seconds'] for r in results if r['upload_seconds'] is not None]
+    dispatch_lags = [r['dispatch_lag_seconds'] for r in results]
+    completions = [r['completion_seconds'] for r in results if r['status'] == 'completed']
+    completed_bytes = sum(r['input_bytes'] for r in results if r['status'] == 'completed')
+    failures = [r for r in results if r['status'] != 'completed']
+
+    return {
+        'config': {
+            'api_base': args.api_base,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'poisson': args.poisson,
+            'sizes': args.sizes,
+            'profiles': args.profiles,
+        },
+        'wall_seconds': round(wall_seconds, 3),
+        'completed': len(completions),
+        'failed': len(failures),
+        'failures_by_status': {
+            status: sum(1 for r in failures if r['status'] == status)
+            for status in sorted({r['status'] for r in failures})
+        },
+        'error_rate': round(len(failures) / len(results), 4) if results else 0,
+        'dispatch_lag_seconds': {f"p{q}": percentile(dispatch_lags, q) for q in PERCENTILES},
+        'upload_seconds': {f"p{q}": percentile(uploads, q) for q in PERCENTILES},
+        'completion_seconds': {f"p{q}": percentile(completions, q) for q in PERCENTILES},
+        'throughput': {
+            'jobs_per_second': round(len(completions) / wall_seconds, 4) if wall_seconds else 0,
+            'megabytes_per_second': round(completed_bytes / SIZE_UNITS['MB'] / wall_seconds, 4) if wall_seconds else 0,
+        },
+    }
+
+
+def lookup(summary, dotted_key):
+    value = summary
+    for key in dotted_key.split('.'):
+        value = (value or {}).get(key)
+    return value
+
+
+def compare_to_baseline(summary, baseline, tolerance):
+    """Prints metric changes; returns the metrics that got worse by more than `tolerance`"""
+    print("\n📊 Comparison against baseline")
+    regressions = []
+    for metric, higher_is_better in BASELINE_METRICS.items():
+        current = lookup(summary, metric)
+        previous = lookup(baseline, metric)
+        if current is None or previous is None:
+            continue
+
+        change = (current - previous) / previous if previous else (0 if current == previous else float('inf'))
+        worse = -change if higher_is_better else change
+        marker = "❌" if worse > tolerance else "✅"
+        print(f"  {marker} {metric:.<40} {previous:>10.4f} → {current:>10.4f} ({change:+.1%})")
+        if worse > tolerance:
+            regressions.append(metric)
+    return regressions
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def print_summary(summary):
+    def seconds(value):
+        return "-" if value is None else f"{value:.3f}s"
+
+    print("\n" + "=" * 60)
+    print("📋 LOAD TEST SUMMARY")
+    print("=" * 60)
+    print(f"Requests completed: {summary['completed']}, failed: {summary['failed']} "
+          f"(error rate {summary['error_rate']:.1%}) in {summary['wall_seconds']:.1f}s")
+    if summary['failures_by_status']:
+        print(f"Failures by status: {summary['failures_by_status']}")
+    for name in ('dispatch_lag_seconds', 'upload_seconds', 'completion_seconds'):
+        values = ", ".join(f"{key} {seconds(value)}" for key, value in summary[name].items())
+        print(f"{name.replace('_', ' ').title():.<30} {values}")
+    print(f"Throughput: {summary['throughput']['jobs_per_second']:.3f} jobs/s, "
+          f"{summary['throughput']['megabytes_per_second']:.2f} MB/s of input")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the APK conversion API")
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help="Server URL (default: $NEXT_PUBLIC_BASE_URL or localhost:3000)")
+    parser.add_argument('--requests', type=int, default=20, help="Total number of uploads")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent clients with --rate 0; open-loop runs use one client per request")
+    parser.add_argument('--rate', type=float, default=0, help="Arrivals per second; 0 submits as fast as clients free up")
+    parser.add_argument('--poisson', action='store_true', help="Exponential inter-arrival times instead of a fixed interval")
+    parser.add_argument('--sizes', default='64KB,1MB,10MB', help="Comma-separated APK sizes, cycled through (e.g. 64KB,1MB,100MB)")
+    parser.add_argument('--profiles', help="Comma-separated tests/apk_corpus.py profiles to upload instead of --sizes")
+    parser.add_argument('--shuffle-sizes', action='store_true', help="Pick sizes or profiles at random instead of cycling")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for payloads, sizes and arrivals")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between status polls")
+    parser.add_argument('--upload-timeout', type=float, default=300, help="Upload request timeout in seconds")
+    parser.add_argument('--job-timeout', type=float, default=600, help="Seconds to wait for a job to finish")
+    parser.add_argument('--json', dest='json_path', help="Write summary and per-request results as JSON")
+    parser.add_argument('--csv', dest='csv_path', help="Write per-request results as CSV")
+    parser.add_argument('--baseline', help="JSON output of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed relative regression vs baseline (default 0.10)")
+    args = parser.parse_args(argv)
+    args.api_base = f"{args.base_url.rstrip('/')}/api"
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profiles:
+        inputs = [profile.strip() for profile in args.profiles.split(',') if profile.strip()]
+        described = f"profiles {', '.join(inputs)}"
+    else:
+        inputs = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+        described = f"sizes {', '.join(format_size(size) for size in inputs)}"
+    schedule = build_schedule(args, inputs)
+    payloads = PayloadCache(args.seed)
+
+    print("🧪 APK Debug Mode Converter - Load Test")
+    print("=" * 60)
+    print(f"🌐 API: {args.api_base}")
+    open_loop = args.rate > 0
+    # Open loop: enough clients that a busy one never holds back an arrival
+    clients = max(args.concurrency, args.requests) if open_loop else args.concurrency
+    print(f"📦 {args.requests} requests, {described}, "
+          f"{clients} clients, rate {args.rate or 'unbounded'}/s{' (Poisson)' if args.poisson else ''}")
+
+    results = []
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = []
+        for index, (offset, apk_input) in enumerate(schedule):
+            # Open-loop arrivals: submit on schedule even if clients are busy
+            scheduled_at = started_at + offset if open_loop else None
+            delay = started_at + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(run_request, index, apk_input, args, payloads, started_at, scheduled_at))
+
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            marker = "✅" if result['status'] == 'completed' else "❌"
+            completion = result['completion_seconds']
+            print(f"  {marker} #{result['index']:<4} {result['input']:>10} {format_size(result['input_bytes']):>8} {result['status']:<14} "
+                  f"{'' if completion is None else f'{completion:.2f}s'}")
+
+    summary = summarize(results, time.monotonic() - started_at, args)
+    print_summary(summary)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'summary': summary, 'results': results}, json_file, indent=2)
+        print(f"💾 JSON results written to {args.json_path}")
+    if args.csv_path and results:
+        write_csv(args.csv_path, results)
+        print(f"💾 CSV results written to {args.csv_path}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_to_baseline(summary, baseline.get('summary', baseline), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} metrics regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return False
+
+    return summary['failed'] == 0
+
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Load test interrupted by user")
+        sys.exit(1)
@@ -0,0 +1,107 @@
+// APK Signing Benchmark
+// Compares the in-process signer (v1 + v2 + v3, verified) against the old
+// keytool/jarsigner path on the same input. The jarsigner run is skipped when
+// no JDK is on the PATH.
+//
+// Usage: node sign-benchmark.mjs [path/to/app.apk] [iterations]
+
+import { promises as fs } from 'fs';
+import { spawnSync } from 'child_process';
+import os from 'os';
+import path from 'path';
+import apkSigner from './lib/apk-signer.js';
+
+const DEFAULT_APK = path.join('temp', 'uploads', '9ebd0067-97c3-48fb-a591-1c431f01db1f.apk');
+
+function hasCommand(command) {
+  return spawnSync(command, ['-help'], { stdio: 'ignore' }).error === undefined;
+}
+
+function run(command, args) {
+  const result = spawnSync(command, args, { encoding: 'utf8' });
+  if (result.status !== 0) {
+    throw new Error(`${command} failed: ${result.stderr || result.stdout}`);
+  }
+  return result.stdout;
+}
+
+function summarize(label, timings) {
+  const sorted = [...timings].sort((a, b) => a - b);
+  const mean = sorted.reduce((sum, value) => sum + value, 0) / sorted.length;
+  console.log(`${label.padEnd(34)} mean ${mean.toFixed(1)}ms  min ${sorted[0].toFixed(1)}ms  max ${sorted[sorted.length - 1].toFixed(1)}ms`);
+  return mean;
+}
+
+async function benchmarkSigning() {
+  const inputApk = process.argv[2] || DEFAULT_APK;
+  const iterations = parseInt(process.argv[3], 10) || 10;
+  const workDir = await fs.mkdtemp(path.join(os.tmpdir(), 'sign-benchmark-'));
+
+  console.log('🧪 APK signing benchmark');
+  console.log(`📦 Input: ${inputApk} (${Math.round((await fs.stat(inputApk)).size / 1024)}KB), ${iterations} iterations`);
+
+  try {
+    let start = process.hrtime.bigint();
+    await apkSigner.loadKey(path.join(workDir, 'key'));
+    console.log(`🔑 Key load/generation: ${(Number(process.hrtime.bigint() - start) / 1e6).toFixed(1)}ms (once per process)`);
+
+    const nativeTimings = [];
+    for (let i = 0; i < iterations; i++) {
+      const v1Path = path.join(workDir, `v1_${i}.apk`);
+      const signedPath = path.join(workDir, `signed_${i}.apk`);
+
+      start = process.hrtime.bigint();
+      await apkSigner.signJar(inputApk, v1Path);
+      await fs.rename(v1Path, signedPath);
+      const verified = await apkSigner.signApk(signedPath);
+      nativeTimings.push(Number(process.hrtime.bigint() - start) / 1e6);
+
+      if (!verified) {
+        throw new Error('In-process signature failed verification');
+      }
+    }
+    const nativeMean = summarize('In-process sign + verify', nativeTimings);
+
+    const { verified, schemes } = await apkSigner.verify(path.join(workDir, 'signed_0.apk'));
+    console.log(`✅ Independent verify: ${verified ? 'passed' : 'FAILED'} (${Object.keys(schemes).filter(scheme => schemes[scheme]).join(', ')})`);
+
+    if (!hasCommand('keytool') || !hasCommand('jarsigner')) {
+      console.log('⚠️  keytool/jarsigner not found, skipping the JVM comparison');
+      return;
+    }
+
+    const keystorePath = path.join(workDir, 'debug.keystore');
+    start = process.hrtime.bigint();
+    run('keytool', [
+      '-genkeypair', '-keystore', keystorePath, '-alias', 'debugkey',
+      '-storepass', 'debugpass', '-keypass', 'debugpass', '-keyalg', 'RSA', '-keysize', '2048',
+      '-validity', '365', '-dname', 'CN=Debug, OU=Debug, O=Debug, L=Debug, ST=Debug, C=US'
+    ]);
+    console.log(`🔑 keytool -genkeypair: ${(Number(process.hrtime.bigint() - start) / 1e6).toFixed(1)}ms`);
+
+    const jvmTimings = [];
+    for (let i = 0; i < iterations; i++) {
+      const signedPath = path.join(workDir, `jarsigner_${i}.apk`);
+      await fs.copyFile(inputApk, signedPath);
+
+      start = process.hrtime.bigint();
+      run('jarsigner', ['-verbose', '-keystore', keystorePath, '-storepass', 'debugpass', '-keypass', 'debugpass', signedPath, 'debugkey']);
+      const output = run('jarsigner', ['-verify', '-verbose', signedPath]);
+      jvmTimings.push(Number(process.hrtime.bigint() - start) / 1e6);
+
+      if (!output.includes('jar verified')) {
+        throw new Error('jarsigner failed to verify its own signature');
+      }
+    }
+    const jvmMean = summarize('jarsigner sign + verify (v1 only)', jvmTimings);
+
+    console.log(`🚀 In-process signing is ${(jvmMean / nativeMean).toFixed(1)}x faster`);
+  } finally {
+    await fs.rm(workDir, { recursive: true, force: true });
+  }
+}
+
+benchmarkSigning().catch((error) => {
+  console.error('❌ Benchmark failed:', error);
+  process.exit(1);
+});
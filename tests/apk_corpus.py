@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic APK corpus for benchmarks and load tests.
+
+create_test_apk() in backend_test.py builds a 5-file toy zip, which never
+reaches the slow paths of a conversion. The profiles here do: thousands of
+entries, large stored .so/.png files, binary AXML manifests and layouts, a
+real resources.arsc, and existing v1 (META-INF) and v2 (APK Signing Block)
+signatures. The same profile always produces the same bytes. Built APKs are
+cached in APK_CORPUS_DIR (default tests/.apk_corpus).
+
+Usage:
+    python tests/apk_corpus.py                 # build every profile
+    python tests/apk_corpus.py typical --force # rebuild one profile
+    python tests/apk_corpus.py --list
+"""
+
+import argparse
+import base64
+import os
+import random
+import struct
+import sys
+import zipfile
+from io import BytesIO
+
+# Bump whenever generated content changes so stale cached files are rebuilt
+CORPUS_VERSION = 1
+
+KB = 1024
+MB = 1024 * KB
+
+DEFAULT_CORPUS_DIR = os.getenv('APK_CORPUS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.apk_corpus'))
+
+ANDROID_NAMESPACE = 'http://schemas.android.com/apk/res/android'
+
+# Framework attribute resource IDs (android.R.attr)
+ATTR_IDS = {
+    'label': 0x01010001,
+    'icon': 0x01010002,
+    'name': 0x01010003,
+    'exported': 0x01010010,
+    'orientation': 0x010100c4,
+    'layout_width': 0x010100f4,
+    'layout_height': 0x010100f5,
+    'text': 0x0101014f,
+    'minSdkVersion': 0x0101020c,
+    'versionCode': 0x0101021b,
+    'versionName': 0x0101021c,
+    'targetSdkVersion': 0x01010270,
+}
+
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_BOOLEAN = 0x12
+
+APK_SIG_BLOCK_MAGIC = b'APK Sig Block 42'
+APK_SIGNATURE_SCHEME_V2_BLOCK_ID = 0x7109871a
+
+# Entry counts and sizes are loosely modelled on real apps of each kind.
+# native: (abi, library count, bytes per library); images/layouts/assets/metadata: (count, bytes each)
+PROFILES = {
+    'tiny': {
+        'description': 'Single-activity app with a text manifest',
+        'binary_manifest': False,
+        'dex': [64 * KB],
+        'native': [],
+        'images': (8, 2 * KB),
+        'layouts': 2,
+        'assets': (2, 4 * KB),
+        'stored_assets': False,
+        'metadata': (0, 0),
+        'activities': 1,
+        'permissions': 1,
+        'signed': False,
+    },
+    'typical': {
+        'description': 'Typical app: binary manifest, two DEX files, a few native libraries',
+        'binary_manifest': True,
+        'dex': [6 * MB, 2 * MB],
+        'native': [('arm64-v8a', 2, 1536 * KB), ('armeabi-v7a', 2, 1024 * KB)],
+        'images': (1200, 12 * KB),
+        'layouts': 400,
+        'assets': (20, 64 * KB),
+        'stored_assets': False,
+        'metadata': (200, 1 * KB),
+        'activities': 25,
+        'permissions': 12,
+        'signed': True,
+    },
+    'sdk-heavy': {
+        'description': 'Multidex app pulling in many SDKs: thousands of small entries',
+        'binary_manifest': True,
+        'dex': [8 * MB] * 8,
+        'native': [('arm64-v8a', 6, 800 * KB), ('armeabi-v7a', 6, 600 * KB), ('x86_64', 6, 800 * KB)],
+        'images': (2500, 6 * KB),
+        'layouts': 1500,
+        'assets': (60, 32 * KB),
+        'stored_assets': False,
+        'metadata': (2000, 512),
+        'activities': 120,
+        'permissions': 30,
+        'signed': True,
+    },
+    'game-100mb': {
+        'description': 'Game close to the 100MB upload limit: large stored libraries and assets',
+        'binary_manifest': True,
+        'dex': [3 * MB],
+        'native': [('arm64-v8a', 2, 28 * MB)],
+        'images': (150, 40 * KB),
+        'layouts': 20,
+        'assets': (10, 3 * MB),
+        'stored_assets': True,
+        'metadata': (10, 1 * KB),
+        'activities': 2,
+        'permissions': 4,
+        'signed': True,
+    },
+}
+
+
+def _utf8_length(length):
+    if length > 0x7f:
+        return bytes([(length >> 8) | 0x80, length & 0xff])
+    return bytes([length])
+
+
+def _chunk(chunk_type, header, body):
+    return struct.pack('<HHI', chunk_type, 8 + len(header), 8 + len(header) + len(body)) + header + body
+
+
+def build_string_pool(strings, utf8=True):
+    """ResStringPool chunk holding `strings` in order"""
+    data = bytearray()
+    offsets = []
+    for string in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = string.encode('utf-8')
+            data += _utf8_length(len(string)) + _utf8_length(len(encoded)) + encoded + b'\0'
+        else:
+            data += struct.pack('<H', len(string)) + string.encode('utf-16le') + b'\0\0'
+    data += b'\0' * (-len(data) % 4)
+
+    strings_start = 28 + 4 * len(strings)
+    header = struct.pack('<IIIII', len(strings), 0, 0x100 if utf8 else 0, strings_start, 0)
+    return _chunk(0x0001, header, b''.join(struct.pack('<I', offset) for offset in offsets) + bytes(data))
+
+
+class AxmlElement:
+    """Element for build_axml(); attributes are (name, kind, value), namespaced when the name is in ATTR_IDS"""
+
+    def __init__(self, name, attributes=(), children=()):
+        self.name = name
+        self.attributes = list(attributes)
+        self.children = list(children)
+
+
+def build_axml(root):
+    """Compiles an AxmlElement tree to binary XML the way aapt2 lays it out"""
+    mapped = set()
+    other = []
+
+    def collect(element):
+        for name, kind, value in element.attributes:
+            if name in ATTR_IDS:
+                mapped.add(name)
+            elif name not in other:
+                other.append(name)
+            if kind == 'string' and value not in other:
+                other.append(value)
+        if element.name not in other:
+            other.append(element.name)
+        for child in element.children:
+            collect(child)
+
+    collect(root)
+    # Attribute names with resource IDs come first so the resource map lines up with the pool
+    mapped_names = sorted(mapped, key=ATTR_IDS.get)
+    strings = mapped_names + ['android', ANDROID_NAMESPACE] + [s for s in other if s not in mapped]
+    index = {string: i for i, string in enumerate(strings)}
+
+    chunks = [
+        build_string_pool(strings),
+        _chunk(0x0180, b'', b''.join(struct.pack('<I', ATTR_IDS[name]) for name in mapped_names)),
+    ]
+    namespace = struct.pack('<II', index['android'], index[ANDROID_NAMESPACE])
+    node_header = struct.pack('<II', 1, 0xffffffff)
+
+    def encode_value(kind, value):
+        if kind == 'string':
+            return index[value], TYPE_STRING, index[value]
+        if kind == 'bool':
+            return 0xffffffff, TYPE_INT_BOOLEAN, 0xffffffff if value else 0
+        if kind == 'ref':
+            return 0xffffffff, TYPE_REFERENCE, value
+        return 0xffffffff, TYPE_INT_DEC, value & 0xffffffff
+
+    def emit(element):
+        attributes = sorted(element.attributes, key=lambda attribute: ATTR_IDS.get(attribute[0], 0xffffffff))
+        body = struct.pack('<IIHHHHHH', 0xffffffff, index[element.name], 20, 20, len(attributes), 0, 0, 0)
+        for name, kind, value in attributes:
+            raw, data_type, data = encode_value(kind, value)
+            ns = index[ANDROID_NAMESPACE] if name in ATTR_IDS else 0xffffffff
+            body += struct.pack('<IIIHBBI', ns, index[name], raw, 8, 0, data_type, data)
+        chunks.append(_chunk(0x0102, node_header, body))
+        for child in element.children:
+            emit(child)
+        chunks.append(_chunk(0x0103, node_header, struct.pack('<II', 0xffffffff, index[element.name])))
+
+    chunks.append(_chunk(0x0100, node_header, namespace))
+    emit(root)
+    chunks.append(_chunk(0x0101, node_header, namespace))
+    return _chunk(0x0003, b'', b''.join(chunks))
+
+
+def build_resource_table(package_name, types):
+    """resources.arsc with one 0x7f package; `types` is [(type name, [(key, file path)])] in type ID order"""
+    values = [path for _, entries in types for _, path in entries]
+    keys = [key for _, entries in types for key, _ in entries]
+    value_index = {value: i for i, value in enumerate(values)}
+    key_index = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+
+    type_chunks = []
+    for type_id, (_, entries) in enumerate(types, start=1):
+        type_chunks.append(_chunk(0x0202, struct.pack('<BBHI', type_id, 0, 1, len(entries)), b'\0' * 4 * len(entries)))
+        offsets = b''.join(struct.pack('<I', 16 * i) for i in range(len(entries)))
+        data = b''.join(
+            struct.pack('<HHIHBBI', 8, 0, key_index[key], 8, 0, TYPE_STRING, value_index[path])
+            for key, path in entries
+        )
+        config = struct.pack('<I', 64) + b'\0' * 60
+        header = struct.pack('<BBHII', type_id, 0, 0, len(entries), 8 + 12 + len(config) + len(offsets)) + config
+        type_chunks.append(_chunk(0x0201, header, offsets + data))
+
+    type_pool = build_string_pool([name for name, _ in types], utf8=False)
+    key_pool = build_string_pool(list(key_index))
+    header_size = 288
+    package_header = (
+        struct.pack('<I', 0x7f)
+        + package_name.encode('utf-16le').ljust(256, b'\0')
+        + struct.pack('<IIIII', header_size, len(types), header_size + len(type_pool), len(key_index), 0)
+    )
+    package = _chunk(0x0200, package_header, type_pool + key_pool + b''.join(type_chunks))
+    return _chunk(0x0002, struct.pack('<I', 1), build_string_pool(values) + package)
+
+
+def build_text_manifest(package_name, activities, permissions):
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<manifest xmlns:android="http://schemas.android.com/apk/res/android"',
+        f'    package="{package_name}"',
+        '    android:versionCode="1"',
+        '    android:versionName="1.0">',
+        '    <uses-sdk android:minSdkVersion="21" android:targetSdkVersion="33" />',
+    ]
+    lines += [f'    <uses-permission android:name="{permission}" />' for permission in permissions]
+    lines.append('    <application android:label="Corpus App" android:icon="@drawable/icon_0">')
+    for i, activity in enumerate(activities):
+        if i == 0:
+            lines += [
+                f'        <activity android:name="{activity}" android:exported="true">',
+                '            <intent-filter>',
+                '                <action android:name="android.intent.action.MAIN" />',
+                '                <category android:name="android.intent.category.LAUNCHER" />',
+                '            </intent-filter>',
+                '        </activity>',
+            ]
+        else:
+            lines.append(f'        <activity android:name="{activity}" android:exported="false" />')
+    lines += ['    </application>', '</manifest>']
+    return '\n'.join(lines).encode('utf-8')
+
+
+def build_binary_manifest(package_name, activities, permissions, icon_id):
+    activity_elements = []
+    for i, activity in enumerate(activities):
+        children = []
+        if i == 0:
+            children = [AxmlElement('intent-filter', children=[
+                AxmlElement('action', [('name', 'string', 'android.intent.action.MAIN')]),
+                AxmlElement('category', [('name', 'string', 'android.intent.category.LAUNCHER')]),
+            ])]
+        activity_elements.append(AxmlElement('activity', [('name', 'string', activity), ('exported', 'bool', i == 0)], children))
+
+    return build_axml(AxmlElement('manifest', [
+        ('versionCode', 'int', 1),
+        ('versionName', 'string', '1.0'),
+        ('package', 'string', package_name),
+    ], [
+        AxmlElement('uses-sdk', [('minSdkVersion', 'int', 21), ('targetSdkVersion', 'int', 33)]),
+        *[AxmlElement('uses-permission', [('name', 'string', permission)]) for permission in permissions],
+        AxmlElement('application', [('label', 'string', 'Corpus App'), ('icon', 'ref', icon_id)], activity_elements),
+    ]))
+
+
+def build_layout(rng):
+    texts = [AxmlElement('TextView', [
+        ('layout_width', 'int', -1),
+        ('layout_height', 'int', -2),
+        ('text', 'string', f"Label {rng.randrange(1 << 20)}"),
+    ]) for _ in range(rng.randint(2, 8))]
+    return build_axml(AxmlElement('LinearLayout', [
+        ('orientation', 'int', 1),
+        ('layout_width', 'int', -1),
+        ('layout_height', 'int', -1),
+    ], texts))
+
+
+def _dex_bytes(rng, size):
+    # Half random, half repetitive: deflates to roughly the ratio real DEX files get
+    random_part = rng.randbytes(size // 2)
+    return (b'dex\n035\0' + random_part + (b'\x12\x34\x6e\x20' * (size // 8 + 1)))[:size]
+
+
+def _text_bytes(rng, size):
+    words = [b'debug', b'config', b'version', b'enabled', b'value', b'service', b'module', b'feature']
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words) + b' ' + str(rng.randrange(10000)).encode() + b'\n'
+    return bytes(out[:size])
+
+
+def _signature_files(entry_names, rng):
+    """META-INF v1 signature files in the shape jarsigner writes (digests are random)"""
+    manifest = ['Manifest-Version: 1.0', 'Created-By: 1.0 (Android)', '']
+    signature = ['Signature-Version: 1.0', 'Created-By: 1.0 (Android)', 'SHA-256-Digest-Manifest: '
+                 + base64.b64encode(rng.randbytes(32)).decode(), '']
+    for name in entry_names:
+        manifest += [f'Name: {name}', 'SHA-256-Digest: ' + base64.b64encode(rng.randbytes(32)).decode(), '']
+        signature += [f'Name: {name}', 'SHA-256-Digest: ' + base64.b64encode(rng.randbytes(32)).decode(), '']
+    return {
+        'META-INF/MANIFEST.MF': '\r\n'.join(manifest).encode(),
+        'META-INF/CERT.SF': '\r\n'.join(signature).encode(),
+        'META-INF/CERT.RSA': b'\x30\x82' + rng.randbytes(1200),
+    }
+
+
+def _insert_signing_block(apk_data, rng):
+    """Places an APK Signing Block with a (random) v2 signature before the central directory"""
+    end = len(apk_data) - 22
+    central_directory_offset = struct.unpack_from('<I', apk_data, end + 16)[0]
+
+    value = rng.randbytes(2048)
+    pairs = struct.pack('<QI', 4 + len(value), APK_SIGNATURE_SCHEME_V2_BLOCK_ID) + value
+    block_size = len(pairs) + 8 + len(APK_SIG_BLOCK_MAGIC)
+    block = struct.pack('<Q', block_size) + pairs + struct.pack('<Q', block_size) + APK_SIG_BLOCK_MAGIC
+
+    eocd = bytearray(apk_data[end:])
+    struct.pack_into('<I', eocd, 16, central_directory_offset + len(block))
+    return apk_data[:central_directory_offset] + block + apk_data[central_directory_offset:end] + bytes(eocd)
+
+
+def with_marker(apk_data, marker):
+    """Copy of an APK with `marker` as its ZIP comment, so identical inputs hash differently"""
+    comment = marker.encode('utf-8')[:0xffff]
+    comment_length = struct.unpack_from('<H', apk_data, len(apk_data) - 2)[0]
+    if comment_length != 0 or apk_data[-22:-18] != b'PK\x05\x06':
+        raise ValueError('Expected an APK without a ZIP comment')
+    return apk_data[:-2] + struct.pack('<H', len(comment)) + comment
+
+
+def build_apk(profile_name):
+    """Generates the APK for a profile; the same profile always yields the same bytes"""
+    profile = PROFILES[profile_name]
+    rng = random.Random(f"{profile_name}:{CORPUS_VERSION}")
+    package_name = f"com.corpus.{profile_name.replace('-', '_')}"
+    entries = []  # (name, data, compress_type)
+
+    image_count, image_size = profile['images']
+    images = [(f"icon_{i}", f"res/drawable-xxhdpi-v4/icon_{i}.png") for i in range(image_count)]
+    layouts = [(f"view_{i}", f"res/layout/view_{i}.xml") for i in range(profile['layouts'])]
+    types = [('drawable', images), ('layout', layouts)]
+
+    activities = [f"{package_name}.ui.Screen{i}Activity" for i in range(profile['activities'])]
+    permissions = [f"android.permission.CORPUS_PERMISSION_{i}" for i in range(profile['permissions'])]
+    icon_id = 0x7f010000  # drawable/icon_0
+    if profile['binary_manifest']:
+        manifest = build_binary_manifest(package_name, activities, permissions, icon_id)
+    else:
+        manifest = build_text_manifest(package_name, activities, permissions)
+    entries.append(('AndroidManifest.xml', manifest, zipfile.ZIP_DEFLATED))
+
+    for i, size in enumerate(profile['dex']):
+        name = 'classes.dex' if i == 0 else f"classes{i + 1}.dex"
+        entries.append((name, _dex_bytes(rng, size), zipfile.ZIP_DEFLATED))
+
+    entries.append(('resources.arsc', build_resource_table(package_name, types), zipfile.ZIP_STORED))
+
+    for abi, count, size in profile['native']:
+        for i in range(count):
+            entries.append((f"lib/{abi}/libcorpus{i}.so", b'\x7fELF' + rng.randbytes(size - 4), zipfile.ZIP_STORED))
+
+    for _, path in images:
+        entries.append((path, b'\x89PNG\r\n\x1a\n' + rng.randbytes(image_size - 8), zipfile.ZIP_STORED))
+    for _, path in layouts:
+        entries.append((path, build_layout(rng), zipfile.ZIP_DEFLATED))
+
+    asset_count, asset_size = profile['assets']
+    for i in range(asset_count):
+        if profile['stored_assets']:
+            entries.append((f"assets/data_{i}.pak", rng.randbytes(asset_size), zipfile.ZIP_STORED))
+        else:
+            entries.append((f"assets/config_{i}.json", _text_bytes(rng, asset_size), zipfile.ZIP_DEFLATED))
+
+    metadata_count, metadata_size = profile['metadata']
+    for i in range(metadata_count):
+        entries.append((f"META-INF/com.corpus_sdk{i}.version", _text_bytes(rng, metadata_size), zipfile.ZIP_DEFLATED))
+
+    if profile['signed']:
+        for name, data in _signature_files([name for name, _, _ in entries], rng).items():
+            entries.append((name, data, zipfile.ZIP_DEFLATED))
+
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as apk:
+        for name, data, compress_type in entries:
+            # Fixed timestamps keep the output byte-for-byte reproducible
+            apk.writestr(zipfile.ZipInfo(name), data, compress_type=compress_type)
+
+    apk_data = buffer.getvalue()
+    if profile['signed']:
+        apk_data = _insert_signing_block(apk_data, rng)
+    return apk_data
+
+
+def corpus_path(profile_name, corpus_dir=None, force=False):
+    """Path of the cached APK for a profile, building it first when missing"""
+    if profile_name not in PROFILES:
+        raise KeyError(f"Unknown corpus profile {profile_name!r} (choose from {', '.join(PROFILES)})")
+
+    corpus_dir = corpus_dir or DEFAULT_CORPUS_DIR
+    path = os.path.join(corpus_dir, f"{profile_name}-v{CORPUS_VERSION}.apk")
+    if force or not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as apk_file:
+            apk_file.write(build_apk(profile_name))
+        os.replace(temp_path, path)
+    return path
+
+
+def load_apk(profile_name, corpus_dir=None):
+    with open(corpus_path(profile_name, corpus_dir), 'rb') as apk_file:
+        return apk_file.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the synthetic APK corpus")
+    parser.add_argument('profiles', nargs='*', help=f"Profiles to build (default: all of {', '.join(PROFILES)})")
+    parser.add_argument('--dir', default=DEFAULT_CORPUS_DIR, help="Cache directory")
+    parser.add_argument('--force', action='store_true', help="Rebuild even when cached")
+    parser.add_argument('--list', action='store_true', help="List profiles and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, profile in PROFILES.items():
+            print(f"  {name:<12} {profile['description']}")
+        return True
+
+    for name in args.profiles or PROFILES:
+        path = corpus_path(name, args.dir, force=args.force)
+        with zipfile.ZipFile(path) as apk:
+            entry_count = len(apk.infolist())
+        print(f"📦 {name:<12} {os.path.getsize(path) / MB:>7.1f}MB {entry_count:>6} entries  {path}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
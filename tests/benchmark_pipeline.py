@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the conversion pipeline with a regression gate.
+
+Starts the app locally on a local database backend (DB_BACKEND=memory by
+default, or the embedded MongoDB stand-in with a simulated round trip via
+--db-backend embedded --db-latency-ms 40), converts every tests/apk_corpus.py profile through
+POST /api/convert a few times, and records per profile:
+
+  - median and p95 conversion time (upload to `completed`)
+  - peak RSS of the server process tree while the profile ran
+  - bytes the server wrote to disk per conversion (it only writes to temp/)
+
+Results are compared against the committed baseline and the run fails when a
+metric regresses by more than the threshold, or when there is no baseline
+recorded for the same corpus version and database (pass
+--allow-missing-baseline to only report numbers). RSS and disk writes are
+read from /proc, so they are only reported on Linux.
+
+Usage:
+    yarn build
+    python tests/benchmark_pipeline.py --update-baseline   # record a baseline on this machine
+    python tests/benchmark_pipeline.py                     # compare against it
+    python tests/benchmark_pipeline.py --allow-missing-baseline --base-url http://localhost:3000
+    python tests/benchmark_pipeline.py --db-backend embedded --db-latency-ms 40 --output atlas-rtt.json
+    python tests/benchmark_pipeline.py --base-url http://localhost:3000 --server-pid 1234
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tests.apk_corpus import PROFILES, CORPUS_VERSION, load_apk, with_marker  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'tests', 'benchmark_baseline.json')
+DEFAULT_SERVER_CMD = 'yarn start --port {port}'
+DEFAULT_PORT = 3100
+
+# Metrics gated against the baseline (all lower is better)
+GATED_METRICS = ('median_seconds', 'p95_seconds', 'peak_rss_mb', 'bytes_written_per_run')
+
+
+def percentile(values, q):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[min(len(ordered), rank) - 1]
+
+
+def process_tree(root_pid):
+    """root_pid and all of its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                # The command name may contain spaces; fields after it are fixed
+                ppid = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def read_proc_value(path, key):
+    try:
+        with open(path) as proc_file:
+            for line in proc_file:
+                if line.startswith(key):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+class ServerProbe:
+    """Samples RSS and disk writes of a server process tree"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.available = pid is not None and os.path.exists(f"/proc/{pid}")
+        self.peak_rss_kb = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def rss_kb(self):
+        values = [read_proc_value(f"/proc/{pid}/status", 'VmRSS:') for pid in process_tree(self.pid)]
+        return sum(value for value in values if value)
+
+    def write_bytes(self):
+        if not self.available:
+            return None
+        values = [read_proc_value(f"/proc/{pid}/io", 'write_bytes:') for pid in process_tree(self.pid)]
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    def _sample(self):
+        while not self.stop_event.is_set():
+            self.peak_rss_kb = max(self.peak_rss_kb, self.rss_kb())
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.peak_rss_kb = 0
+        self.stop_event.clear()
+        if self.available:
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        return round(self.peak_rss_kb / 1024, 1) if self.available else None
+
+
+def start_server(command, port, log_path, db_env):
+    """Starts the app on a local database backend; returns the process once /api/stats answers"""
+    env = {key: value for key, value in os.environ.items() if key != 'MONGO_URL'}
+    env.update(db_env)
+    env['PORT'] = str(port)
+    log_file = open(log_path, 'w')
+    process = subprocess.Popen(
+        shlex.split(command.format(port=port)),
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}, see {log_path}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/stats", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+    stop_server(process)
+    raise RuntimeError(f"Server did not become ready within 180s, see {log_path}")
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def convert(api_base, apk_data, name, poll_interval, timeout):
+    """Uploads one APK and waits for the job; returns seconds from upload to completion"""
+    start = time.monotonic()
+    files = {'apk': (f"{name}.apk", apk_data, 'application/vnd.android.package-archive')}
+    response = requests.post(f"{api_base}/convert", files=files, timeout=timeout)
+    response.raise_for_status()
+    job_id = response.json()['jobId']
+
+    while time.monotonic() - start < timeout:
+        status = requests.get(f"{api_base}/status/{job_id}?fields=progress", timeout=10).json()
+        if status.get('status') == 'completed':
+            return time.monotonic() - start
+        if status.get('status') == 'error':
+            raise RuntimeError(f"Conversion of {name} failed: {status.get('error')}")
+        time.sleep(poll_interval)
+    raise RuntimeError(f"Conversion of {name} timed out after {timeout}s")
+
+
+def benchmark_profile(name, args, probe):
+    apk_data = load_apk(name)
+
+    # Warm-up runs load code paths and the signing key; they are not measured
+    for i in range(args.warmup):
+        convert(args.api_base, with_marker(apk_data, f"warmup-{i}-{time.time_ns()}"), name, args.poll_interval, args.timeout)
+
+    timings = []
+    writes_before = probe.write_bytes()
+    probe.start()
+    try:
+        for i in range(args.runs):
+            # A unique ZIP comment per run keeps the artifact cache out of the measurement
+            marked = with_marker(apk_data, f"benchmark-{i}-{time.time_ns()}")
+            timings.append(convert(args.api_base, marked, name, args.poll_interval, args.timeout))
+    finally:
+        peak_rss_mb = probe.stop()
+    writes_after = probe.write_bytes()
+
+    return {
+        'input_bytes': len(apk_data),
+        'runs': args.runs,
+        'median_seconds': round(statistics.median(timings), 4),
+        'p95_seconds': round(percentile(timings, 95), 4),
+        'peak_rss_mb': peak_rss_mb,
+        'bytes_written_per_run': (
+            None if writes_before is None or writes_after is None
+            else (writes_after - writes_before) // args.runs
+        ),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold, min_delta_seconds):
+    """Prints each gated metric against the baseline; returns the regressions"""
+    regressions = []
+    print("\n📊 Comparison against baseline")
+    for name, metrics in results.items():
+        previous_metrics = baseline.get('profiles', {}).get(name)
+        if not previous_metrics:
+            print(f"  ⚠️  {name}: not in baseline")
+            continue
+        for metric in GATED_METRICS:
+            current = metrics.get(metric)
+            previous = previous_metrics.get(metric)
+            if current is None or previous is None:
+                continue
+
+            change = (current - previous) / previous if previous else 0
+            regressed = change > threshold
+            if regressed and metric.endswith('_seconds') and current - previous < min_delta_seconds:
+                # Sub-threshold absolute changes on fast profiles are timer noise
+                regressed = False
+            marker = "❌" if regressed else "✅"
+            print(f"  {marker} {name + ' ' + metric:.<45} {previous:>12} → {current:>12} ({change:+.1%})")
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def baseline_problem(path, run):
+    """Why the baseline at `path` cannot gate this run, or None when it can"""
+    if not os.path.exists(path):
+        return f"No baseline at {path}"
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('corpus_version') != run['corpus_version']:
+        return (f"Baseline was recorded with corpus v{baseline.get('corpus_version')}, "
+                f"this run used v{run['corpus_version']}")
+    if baseline.get('database') != run['database']:
+        return f"Baseline database was {baseline.get('database')}, this run used {run['database']}"
+    return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /api/convert end-to-end against a stored baseline")
+    parser.add_argument('--profiles', default=','.join(PROFILES), help="Comma-separated corpus profiles")
+    parser.add_argument('--runs', type=int, default=5, help="Measured conversions per profile")
+    parser.add_argument('--warmup', type=int, default=1, help="Unmeasured conversions per profile")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port for the locally started server")
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help="Command that starts the app ({port} is substituted)")
+    parser.add_argument('--db-backend', choices=['memory', 'embedded'], default='memory',
+                        help="DB_BACKEND for the locally started server")
+    parser.add_argument('--db-latency-ms', type=float, default=0,
+                        help="Simulated database round trip per operation (embedded backend)")
+    parser.add_argument('--db-latency-jitter-ms', type=float, default=0,
+                        help="Random extra latency added to each simulated round trip")
+    parser.add_argument('--base-url', help="Use an already running server instead of starting one")
+    parser.add_argument('--server-pid', type=int, help="PID of the server given by --base-url, for RSS and disk writes")
+    parser.add_argument('--poll-interval', type=float, default=0.05, help="Seconds between status polls")
+    parser.add_argument('--timeout', type=float, default=600, help="Seconds allowed per conversion")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Write this run as the new baseline")
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help="Pass when there is no comparable baseline instead of failing")
+    parser.add_argument('--threshold', type=float, default=0.20, help="Allowed relative regression (default 0.20)")
+    parser.add_argument('--min-delta-seconds', type=float, default=0.05, help="Ignore timing regressions smaller than this")
+    parser.add_argument('--output', help="Also write this run's results to a JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiles = [profile.strip() for profile in args.profiles.split(',') if profile.strip()]
+
+    print("⏱️  APK Debug Mode Converter - Pipeline Benchmark")
+    print("=" * 60)
+    print("📦 Preparing corpus...")
+    for name in profiles:
+        load_apk(name)
+
+    server = None
+    if args.base_url:
+        args.api_base = f"{args.base_url.rstrip('/')}/api"
+        server_pid = args.server_pid
+    else:
+        log_path = os.path.join(tempfile.gettempdir(), 'apk_benchmark_server.log')
+        print(f"🚀 Starting server: {args.server_cmd.format(port=args.port)} (log: {log_path})")
+        db_env = {
+            'DB_BACKEND': args.db_backend,
+            'DB_LATENCY_MS': str(args.db_latency_ms),
+            'DB_LATENCY_JITTER_MS': str(args.db_latency_jitter_ms),
+        }
+        server = start_server(args.server_cmd, args.port, log_path, db_env)
+        args.api_base = f"http://127.0.0.1:{args.port}/api"
+        server_pid = server.pid
+
+    probe = ServerProbe(server_pid)
+    if not probe.available:
+        print("⚠️  Server process not visible in /proc; RSS and disk writes will not be recorded")
+
+    results = {}
+    try:
+        for name in profiles:
+            print(f"\n🔄 {name}: {args.warmup} warm-up + {args.runs} measured conversions")
+            results[name] = benchmark_profile(name, args, probe)
+            metrics = results[name]
+            print(f"  ✅ median {metrics['median_seconds']:.3f}s, p95 {metrics['p95_seconds']:.3f}s, "
+                  f"peak RSS {metrics['peak_rss_mb']}MB, {metrics['bytes_written_per_run']} bytes written per run")
+    finally:
+        if server:
+            stop_server(server)
+
+    run = {
+        'corpus_version': CORPUS_VERSION,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'database': None if args.base_url else f"{args.db_backend}, {args.db_latency_ms:g}±{args.db_latency_jitter_ms:g}ms",
+        'runs': args.runs,
+        'profiles': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(run, output_file, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(run, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f"💾 Baseline written to {args.baseline}")
+        return True
+
+    problem = baseline_problem(args.baseline, run)
+    if problem:
+        marker = "⚠️ " if args.allow_missing_baseline else "❌"
+        print(f"\n{marker} {problem}; re-record it with --update-baseline")
+        return args.allow_missing_baseline
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('machine') != run['machine']:
+        print(f"\n⚠️  Baseline was recorded on {baseline.get('machine')}, this run is on {run['machine']}")
+
+    regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta_seconds)
+    if regressions:
+        print(f"\n❌ {len(regressions)} metrics regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return False
+
+    print("\n🎉 No regressions against the baseline")
+    return True
+
+
+if __name__ == "__main__":
+    try:
+        success = main()
+        sys.exit(0 if success else 1)
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Benchmark interrupted by user")
+        sys.exit(1)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Runs ES module snippets against lib/ with the repo's Node.js.
+
+The byte-level parsers and writers and the database service are plain ES
+modules, so the tests drive them directly instead of going through a running
+server: run_module() writes a snippet to a temporary .mjs file, runs it with
+node and returns what it printed as its last line, parsed as JSON. (A file
+rather than `--input-type=module -e`, which worker threads would inherit.)
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+LIB_DIR = REPO_ROOT / 'lib'
+
+
+def lib_url(module_name):
+    """file:// URL of a lib/ module, for use in import statements"""
+    return (LIB_DIR / module_name).as_uri()
+
+
+def run_module(source, env=None, timeout=300):
+    """Runs `source` as an ES module and returns its last stdout line parsed as JSON"""
+    with tempfile.TemporaryDirectory() as script_dir:
+        script_path = os.path.join(script_dir, 'script.mjs')
+        with open(script_path, 'w') as script_file:
+            script_file.write(source)
+        result = subprocess.run(
+            ['node', '--no-warnings', script_path],
+            cwd=REPO_ROOT,
+            env={**os.environ, **(env or {})},
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    if result.returncode != 0:
+        raise AssertionError(f"node exited with {result.returncode}:\n{result.stderr}")
+
+    lines = [line for line in result.stdout.splitlines() if line.strip()]
+    if not lines:
+        raise AssertionError(f"node printed no result:\n{result.stderr}")
+    return json.loads(lines[-1])
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Round-trips corpus APKs through the rewrite and signing path.
+
+For a tests/apk_corpus.py profile with a binary manifest and an existing
+signature, the test runs the same lib/ calls as the conversion pipeline:
+adds the network security config to resources.arsc, patches <application>
+in the binary manifest, rewrites the archive without the old signature and
+signs it with v1, v2 and v3. apkSigner.verify() must accept the result, and
+the output is then checked independently here: ZIP CRCs, v1 MANIFEST.MF
+digests, alignment of stored entries, the APK Signing Block and the patched
+manifest attributes.
+
+Usage:
+    python -m unittest tests.test_apk_roundtrip
+    python tests/test_apk_roundtrip.py
+"""
+
+import base64
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import zipfile
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tests.apk_corpus import APK_SIG_BLOCK_MAGIC, corpus_path  # noqa: E402
+from tests.node_module import lib_url, run_module  # noqa: E402
+
+ROUNDTRIP_PROFILES = ('typical',)
+
+NETWORK_CONFIG_NAME = 'apk_debug_network_security_config'
+NETWORK_CONFIG_PATH = f"res/xml/{NETWORK_CONFIG_NAME}.xml"
+
+# android.R.attr IDs of the attributes the debug edits set on <application>
+ATTR_DEBUGGABLE = 0x0101000f
+ATTR_USES_CLEARTEXT_TRAFFIC = 0x010104ec
+ATTR_NETWORK_SECURITY_CONFIG = 0x01010527
+
+TYPE_REFERENCE = 0x01
+TYPE_INT_BOOLEAN = 0x12
+
+SIGNATURE_FILES = {'META-INF/MANIFEST.MF', 'META-INF/CERT.SF', 'META-INF/CERT.RSA'}
+
+ROUNDTRIP_SCRIPT = f"""
+import {{ ApkArchive, rewriteApk }} from '{lib_url('apk-archive.js')}';
+import apkSigner, {{ isJarSignatureEntry }} from '{lib_url('apk-signer.js')}';
+import {{ setElementAttributes, compileXml }} from '{lib_url('binary-xml.js')}';
+import {{ binaryAttributeEdits }} from '{lib_url('manifest-transformer.js')}';
+import {{ addResources }} from '{lib_url('resource-table.js')}';
+
+const {{ input, unsigned, signed, keyDir }} = JSON.parse(process.env.ROUNDTRIP_PATHS);
+
+const archive = await ApkArchive.open(input);
+const {{ buffer: table, ids }} = addResources(await archive.read('resources.arsc'), [
+  {{ type: 'xml', name: '{NETWORK_CONFIG_NAME}', kind: 'string', value: '{NETWORK_CONFIG_PATH}' }}
+]);
+const networkSecurityConfigId = ids.get('xml/{NETWORK_CONFIG_NAME}');
+const edits = binaryAttributeEdits('application', {{
+  resourceIds: {{ 'xml/network_security_config': networkSecurityConfigId }}
+}});
+const {{ buffer: manifest, applied }} = setElementAttributes(await archive.read('AndroidManifest.xml'), 'application', edits);
+
+const config = '<?xml version="1.0" encoding="utf-8"?><network-security-config>'
+  + '<base-config cleartextTrafficPermitted="true"/></network-security-config>';
+const stats = await rewriteApk(archive, unsigned, {{
+  drop: isJarSignatureEntry,
+  replace: new Map([['resources.arsc', table], ['AndroidManifest.xml', manifest]]),
+  add: new Map([['{NETWORK_CONFIG_PATH}', compileXml(config)]])
+}});
+await archive.close();
+
+await apkSigner.loadKey(keyDir);
+const jarSignature = await apkSigner.signJar(unsigned, signed);
+const signedAndVerified = await apkSigner.signApk(signed);
+const {{ verified, schemes }} = await apkSigner.verify(signed);
+
+console.log(JSON.stringify({{
+  applied, networkSecurityConfigId, stats, entriesSigned: jarSignature.entriesSigned,
+  signedAndVerified, verified, schemes
+}}));
+process.exit(0);
+"""
+
+
+def read_string_pool(data, offset):
+    """Strings of a ResStringPool chunk starting at offset"""
+    header_size, = struct.unpack_from('<H', data, offset + 2)
+    count, _, flags, strings_start = struct.unpack_from('<IIII', data, offset + 8)
+    utf8 = bool(flags & 0x100)
+    strings = []
+    for index in range(count):
+        position = offset + strings_start + struct.unpack_from('<I', data, offset + header_size + 4 * index)[0]
+        if utf8:
+            position += 2 if data[position] & 0x80 else 1  # UTF-16 length
+            length = data[position]
+            if length & 0x80:
+                length = ((length & 0x7f) << 8) | data[position + 1]
+                position += 1
+            position += 1
+            strings.append(data[position:position + length].decode('utf-8'))
+        else:
+            length, = struct.unpack_from('<H', data, position)
+            if length & 0x8000:
+                length = ((length & 0x7fff) << 16) | struct.unpack_from('<H', data, position + 2)[0]
+                position += 2
+            position += 2
+            strings.append(data[position:position + 2 * length].decode('utf-16-le'))
+    return strings
+
+
+def element_attributes(axml, element_name):
+    """{attribute resource ID: (data type, data)} of the first element named element_name"""
+    strings, resource_ids = [], []
+    offset = struct.unpack_from('<H', axml, 2)[0]
+    while offset < len(axml):
+        chunk_type, header_size, chunk_size = struct.unpack_from('<HHI', axml, offset)
+        if chunk_type == 0x0001:
+            strings = read_string_pool(axml, offset)
+        elif chunk_type == 0x0180:
+            resource_ids = list(struct.unpack_from(f"<{(chunk_size - header_size) // 4}I", axml, offset + header_size))
+        elif chunk_type == 0x0102:
+            _, name, attribute_start, attribute_size, attribute_count = struct.unpack_from('<IIHHH', axml, offset + header_size)
+            if strings[name] == element_name:
+                attributes = {}
+                for index in range(attribute_count):
+                    position = offset + header_size + attribute_start + index * attribute_size
+                    _, attribute_name, _, _, _, data_type, data = struct.unpack_from('<IIIHBBI', axml, position)
+                    if attribute_name < len(resource_ids):
+                        attributes[resource_ids[attribute_name]] = (data_type, data)
+                return attributes
+        offset += chunk_size
+    raise AssertionError(f"<{element_name}> not found in the manifest")
+
+
+def data_offset(apk_data, info):
+    """Offset of an entry's data, read from its local file header"""
+    name_length, extra_length = struct.unpack_from('<HH', apk_data, info.header_offset + 26)
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def parse_manifest_digests(manifest):
+    """Name -> SHA-256-Digest from the per-entry sections of a v1 MANIFEST.MF"""
+    digests = {}
+    for section in manifest.decode('utf-8').split('\r\n\r\n')[1:]:
+        # Long lines are wrapped at 72 bytes with a leading space on the continuation
+        attributes = dict(line.split(': ', 1) for line in section.replace('\r\n ', '').split('\r\n') if line)
+        if 'Name' in attributes:
+            digests[attributes['Name']] = attributes['SHA-256-Digest']
+    return digests
+
+
+class ApkRoundTripTest(unittest.TestCase):
+    def roundtrip(self, profile_name):
+        input_path = corpus_path(profile_name)
+        with tempfile.TemporaryDirectory() as work_dir:
+            paths = {
+                'input': input_path,
+                'unsigned': os.path.join(work_dir, 'unsigned.apk'),
+                'signed': os.path.join(work_dir, 'signed.apk'),
+                'keyDir': os.path.join(work_dir, 'keystore'),
+            }
+            result = run_module(ROUNDTRIP_SCRIPT, env={'ROUNDTRIP_PATHS': json.dumps(paths)})
+            with open(paths['signed'], 'rb') as apk_file:
+                signed_data = apk_file.read()
+        with open(input_path, 'rb') as apk_file:
+            input_data = apk_file.read()
+        return result, input_data, signed_data
+
+    def check_profile(self, profile_name):
+        result, input_data, signed_data = self.roundtrip(profile_name)
+
+        self.assertTrue(result['signedAndVerified'])
+        self.assertTrue(result['verified'], result['schemes'])
+        self.assertEqual(result['schemes'], {'v1': True, 'v2': True, 'v3': True})
+
+        with zipfile.ZipFile(BytesIO(input_data)) as original, zipfile.ZipFile(BytesIO(signed_data)) as signed:
+            self.assertIsNone(signed.testzip())
+            original_names = set(original.namelist())
+            signed_names = set(signed.namelist())
+
+            # Old signature files are replaced; every other entry is carried over byte for byte
+            untouched = original_names - SIGNATURE_FILES - {'AndroidManifest.xml', 'resources.arsc'}
+            self.assertEqual(signed_names, untouched | SIGNATURE_FILES | {'AndroidManifest.xml', 'resources.arsc', NETWORK_CONFIG_PATH})
+            for name in untouched:
+                self.assertEqual(signed.read(name), original.read(name), name)
+
+            # v1: MANIFEST.MF lists a correct digest for every other entry
+            digests = parse_manifest_digests(signed.read('META-INF/MANIFEST.MF'))
+            self.assertEqual(set(digests), signed_names - SIGNATURE_FILES)
+            self.assertEqual(result['entriesSigned'], len(digests))
+            for name, digest in digests.items():
+                self.assertEqual(digest, base64.b64encode(hashlib.sha256(signed.read(name)).digest()).decode(), name)
+            self.assertIn(b'X-Android-APK-Signed: 2, 3', signed.read('META-INF/CERT.SF'))
+
+            # Stored entries are aligned: 4 bytes, 4KB for native libraries
+            stored = [info for info in signed.infolist() if info.compress_type == zipfile.ZIP_STORED]
+            self.assertTrue(any(info.filename.endswith('.so') for info in stored))
+            for info in stored:
+                alignment = 4096 if info.filename.endswith('.so') else 4
+                self.assertEqual(data_offset(signed_data, info) % alignment, 0, info.filename)
+
+            # The patched manifest references the config added to resources.arsc
+            config_id = result['networkSecurityConfigId']
+            self.assertEqual(config_id >> 24, 0x7f)
+            self.assertIn('debuggable', result['applied'])
+            attributes = element_attributes(signed.read('AndroidManifest.xml'), 'application')
+            self.assertEqual(attributes[ATTR_DEBUGGABLE], (TYPE_INT_BOOLEAN, 0xffffffff))
+            self.assertEqual(attributes[ATTR_USES_CLEARTEXT_TRAFFIC], (TYPE_INT_BOOLEAN, 0xffffffff))
+            self.assertEqual(attributes[ATTR_NETWORK_SECURITY_CONFIG], (TYPE_REFERENCE, config_id))
+            table = signed.read('resources.arsc')
+            self.assertGreater(len(table), len(original.read('resources.arsc')))
+            self.assertTrue(NETWORK_CONFIG_PATH.encode('utf-8') in table or NETWORK_CONFIG_PATH.encode('utf-16-le') in table)
+
+        # v2/v3: an APK Signing Block sits right before the central directory
+        eocd = signed_data.rindex(b'PK\x05\x06')
+        central_directory_offset, = struct.unpack_from('<I', signed_data, eocd + 16)
+        self.assertEqual(signed_data[central_directory_offset - 16:central_directory_offset], APK_SIG_BLOCK_MAGIC)
+
+    def test_profiles_roundtrip_and_verify(self):
+        for profile_name in ROUNDTRIP_PROFILES:
+            with self.subTest(profile=profile_name):
+                self.check_profile(profile_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Tests for the job progress/log write-behind buffer in lib/database.js.
+
+Runs DatabaseService on the embedded MongoDB stand-in (DB_BACKEND=embedded)
+and injects failures into the jobs collection's updateOne. A buffered update
+whose flush fails must be retried and land in the database; only when every
+attempt fails is it kept in the in-memory fallback, where readers still see it.
+Failures that mean the server is unreachable also count towards opening the
+connection circuit breaker.
+
+Usage:
+    python -m unittest tests.test_write_behind
+    python tests/test_write_behind.py
+"""
+
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tests.node_module import lib_url, run_module  # noqa: E402
+
+FLAKY_FLUSH_SCRIPT = """
+import dbService from '{database}';
+
+await dbService.connect();
+await dbService.saveJob('job-1', {{ status: 'processing', progress: 0, currentStep: 'Queued', logs: [] }});
+
+// Fail the first {failures} job updates with a {error_name}
+const jobs = dbService.db.collection('jobs');
+const updateOne = jobs.updateOne;
+let calls = 0;
+jobs.updateOne = function (...args) {{
+  calls++;
+  if (calls <= {failures}) {{
+    const error = new Error('{error_message}');
+    error.name = '{error_name}';
+    return Promise.reject(error);
+  }}
+  return updateOne.apply(this, args);
+}};
+
+await dbService.updateJobProgress('job-1', 40, 'Signing APK...', ['first line']);
+await dbService.addJobLog('job-1', 'second line');
+await dbService.flushJobWrites('job-1');
+jobs.updateOne = updateOne;
+
+const stored = await jobs.findOne({{ _id: 'job-1' }});
+const storedLogs = await dbService.db.collection('job_logs').find({{ jobId: 'job-1' }}).sort({{ seq: 1 }}).toArray();
+const status = await dbService.getJobStatus('job-1', 0);
+console.log(JSON.stringify({{
+  calls,
+  stored: {{ progress: stored.progress, currentStep: stored.currentStep, logCount: stored.logCount }},
+  storedLogs: storedLogs.map(entry => [entry.seq, entry.message]),
+  inMemory: dbService.inMemoryJobs.has('job-1'),
+  breaker: dbService.getConnectionState().state,
+  status: {{ progress: status.progress, currentStep: status.currentStep, logs: status.logs.map(entry => entry.message) }}
+}}));
+process.exit(0);
+"""
+
+
+# A rejected write says nothing about connectivity; a network error does
+WRITE_ERROR = ('MongoWriteConcernError', 'waiting for replication timed out')
+NETWORK_ERROR = ('MongoNetworkError', 'connection reset by peer')
+
+
+def run_flaky_flush(failures, error=WRITE_ERROR):
+    error_name, error_message = error
+    source = FLAKY_FLUSH_SCRIPT.format(
+        database=lib_url('database.js'),
+        failures=failures,
+        error_name=error_name,
+        error_message=error_message,
+    )
+    return run_module(source, env={
+        'DB_BACKEND': 'embedded',
+        'DB_BREAKER_FAILURE_THRESHOLD': '2',
+        # Keeps the breaker open for the rest of the script once it trips
+        'DB_RECONNECT_BASE_MS': '600000',
+        'DB_RECONNECT_MAX_MS': '600000',
+        'LOG_FLUSH_INTERVAL_MS': '20',
+    })
+
+
+class WriteBehindRetryTest(unittest.TestCase):
+    def test_failed_flush_is_retried(self):
+        result = run_flaky_flush(failures=1)
+
+        self.assertEqual(result['calls'], 2)
+        self.assertEqual(result['stored'], {'progress': 40, 'currentStep': 'Signing APK...', 'logCount': 2})
+        self.assertEqual(result['storedLogs'], [[0, 'first line'], [1, 'second line']])
+        self.assertFalse(result['inMemory'])
+        self.assertEqual(result['breaker'], 'closed')
+        self.assertEqual(result['status']['logs'], ['first line', 'second line'])
+
+    def test_update_kept_in_memory_after_last_attempt(self):
+        result = run_flaky_flush(failures=3)
+
+        self.assertEqual(result['calls'], 3)
+        self.assertEqual(result['stored']['progress'], 0)
+        self.assertTrue(result['inMemory'])
+        self.assertEqual(result['breaker'], 'closed')
+        self.assertEqual(result['status']['progress'], 40)
+        self.assertEqual(result['status']['currentStep'], 'Signing APK...')
+        self.assertEqual(result['status']['logs'], ['first line', 'second line'])
+
+    def test_network_errors_open_the_breaker(self):
+        result = run_flaky_flush(failures=3, error=NETWORK_ERROR)
+
+        # The second failure reaches the threshold; the last attempt goes to the fallback store
+        self.assertEqual(result['calls'], 2)
+        self.assertEqual(result['breaker'], 'open')
+        self.assertTrue(result['inMemory'])
+        self.assertEqual(result['status']['progress'], 40)
+        self.assertEqual(result['status']['logs'], ['first line', 'second line'])
+
+
+if __name__ == "__main__":
+    unittest.main()